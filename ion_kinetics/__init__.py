@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Ion kinetics: Markov-chain tools for selectivity-filter occupancy models.
+
+The drawing modules only need numpy, so that network_v2.1.2.py runs in the
+Python of Inkscape. The modules needing scipy are imported on first use of
+one of their names.
+"""
+
+import importlib
+
+from .drawing import (NetworkScene, colormap, drawCircles, drawConnections,
+                      drawOccupancy, network, useBackend)
+from .instrument import JsonLinesCollector, MemoryCollector, NullCollector
+from .svg import SVGDocument
+from .blocks import BlockNetwork
+from .layout import (forceLayout, ionCounts, layeredLayout, layout,
+                     spectralLayout)
+
+# the names of the modules needing scipy, imported by __getattr__
+_LAZY_MODULES = {
+    'montecarlo': ('KineticMonteCarlo', 'monteCarloSim', 'offDiagonalRates'),
+    'ratematrix': ('asepRateMatrix', 'conductionMatrix', 'encodeMicrostates',
+                   'filterMicrostates', 'filterRateMatrix',
+                   'microstateDigits'),
+    'propagator': ('Propagator', 'propagate'),
+    'counting': ('ProbMatrix', 'countMatrix', 'pairValues', 'runLengths',
+                 'stateDurations'),
+    'streaming': ('StreamingAnalysis', 'iterChunks'),
+    'replicates': ('ReplicateResult', 'runReplicates', 'stateObservables',
+                   'threeStateEstimates'),
+    'estimators': ('RateNetwork', 'ReactiveFlux', 'committor', 'mfpt',
+                   'reactiveFlux', 'stationaryDistribution'),
+    'microstates': ('Microstates',),
+    'current': ('ConductionTrace', 'ionicCurrent'),
+    'sweep': ('SteadyStateSolver', 'voltageRates', 'voltageSweep'),
+    'validation': ('LagAnalysis', 'impliedTimescales', 'rateTimescales',
+                   'transitionMatrix'),
+    'pruning': ('bundleEdges', 'fluxCoverEdges', 'netFlux', 'pruneEdges',
+                'topKEdges'),
+    'lumping': ('LumpedModel', 'committorMemberships', 'lumpModel',
+                'pccaMemberships'),
+}
+_LAZY = {name: module for module, names in _LAZY_MODULES.items()
+         for name in names}
+__all__ = ['NetworkScene', 'colormap', 'drawCircles', 'drawConnections',
+           'drawOccupancy', 'network', 'useBackend', 'JsonLinesCollector',
+           'MemoryCollector', 'NullCollector', 'SVGDocument', 'BlockNetwork',
+           'forceLayout', 'ionCounts', 'layeredLayout', 'layout',
+           'spectralLayout'] + list(_LAZY)
+
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    module = importlib.import_module('.' + _LAZY[name], __name__)
+    value = globals()[name] = getattr(module, name)
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
@@ -0,0 +1,497 @@
+# -*- coding: utf-8 -*-
+"""
+Animations of population relaxation, as plots and on network drawings.
+
+markov_chain_stuff.ipynb animates P_ii(t) with ``FuncAnimation``, whose
+``update`` re-slices the arrays and redraws the whole figure on every
+frame before ``ani.save(writer="pillow")`` collects all frames. Here the
+populations are propagated once (``relaxationPopulations``, one
+``Propagator``), and ``RelaxationAnimation`` draws the axes, legend and
+equilibrium lines once into a background. Every frame restores that
+background and only draws the growing curves (blitting).
+
+Frame ranges are rendered on a process pool, with a bounded number of
+chunks in flight. The frames are written in order to an encoder as soon
+as they arrive. ffmpeg encodes GIF, APNG and MP4 from a pipe, so no frame
+is kept. Without ffmpeg, Pillow writes GIF and APNG, but it has to keep
+the frames until the file is closed.
+
+``networkFrames`` and ``animateNodeFill`` color the nodes of a
+``NetworkScene`` by the same populations. They do this either frame by
+frame with ``restyleNodes``, which only touches nodes whose color
+changes, or as one SVG whose circles animate their fill.
+
+matplotlib is only imported when a figure is set up, and Pillow only
+without ffmpeg.
+"""
+
+import collections
+import os
+import shutil
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .drawing import colormap
+from .propagator import Propagator
+
+_worker = {} # per-process animation
+
+# ffmpeg output options per file extension
+FFMPEG_OPTIONS = {
+    '.mp4': ['-vcodec', 'libx264', '-pix_fmt', 'yuv420p',
+             '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2'],
+    '.gif': ['-vf', 'split[a][b];[a]palettegen[p];[b][p]paletteuse',
+             '-loop', '0'],
+    '.png': ['-f', 'apng', '-plays', '0'],
+    '.apng': ['-f', 'apng', '-plays', '0']}
+
+
+def relaxationPopulations(rateMatrix, times, states=None, p0=None,
+                          method='auto'):
+    """
+    Function for the populations to animate, from one propagator.
+
+    Parameters
+    ----------
+    rateMatrix : numpy array or scipy sparse matrix (states, states)
+        The rate matrix Q.
+    times : numpy array (times,)
+        The time points.
+    states : list of int, optional
+        The tracked states. The default is None, all states.
+    p0 : numpy array (states,), optional
+        A start distribution. The default is None, P_ii(t) of every
+        tracked state when starting in it, as in the notebook.
+    method : str, optional
+        Passed to ``Propagator``. The default is 'auto'.
+
+    Returns
+    -------
+    populations : numpy array (times, tracked)
+
+    """
+    propagator = Propagator(rateMatrix, method=method)
+    numStates = propagator.Q.shape[0]
+    states = np.arange(numStates) if states is None \
+        else np.asarray(states, dtype=np.int64)
+    if p0 is not None:
+        return propagator.evolve(p0, times)[:, states]
+    starts = np.zeros((states.shape[0], numStates))
+    starts[np.arange(states.shape[0]), states] = 1
+    pt = propagator.evolve(starts, times) # (times, tracked, states)
+    return pt[:, np.arange(states.shape[0]), states]
+
+
+class RelaxationAnimation:
+    """
+    A blitted animation of populations over time.
+
+    Parameters
+    ----------
+    times : numpy array (times,)
+        The time points.
+    populations : numpy array (times, curves)
+        E.g. from ``relaxationPopulations``.
+    labels : list of str, optional
+        The legend entry of every curve. The default is None, no legend.
+    equilibrium : list of float, optional
+        Dashed lines at the stationary populations. The default is None.
+    stride : int, optional
+        Time points added per frame, the ``frame*5`` of the notebook. The
+        default is 5.
+    colors : list of str, optional
+        The curve colors. The default is None, the matplotlib cycle.
+    figsize : tuple, optional
+        In inches. The default is (3.25, 2.5).
+    dpi : float, optional
+        The default is 150.
+    ylim : tuple, optional
+        The default is (0, 1.1).
+    xlabel, ylabel : str, optional
+        The axis labels.
+
+    """
+
+    def __init__(self, times, populations, labels=None, equilibrium=None,
+                 stride=5, colors=None, figsize=(3.25, 2.5), dpi=150,
+                 ylim=(0, 1.1), xlabel='time (s)',
+                 ylabel=r'P$_{\it{i}}$(t)'):
+        self.times = np.asarray(times, dtype=float)
+        self.populations = np.asarray(populations, dtype=float).reshape(
+            self.times.shape[0], -1)
+        self.settings = dict(labels=labels, equilibrium=equilibrium,
+                             stride=stride, colors=colors, figsize=figsize,
+                             dpi=dpi, ylim=ylim, xlabel=xlabel, ylabel=ylabel)
+        self.stride = stride
+        # the last frame shows the last time point
+        self.numFrames = -(-(self.times.shape[0] - 1) // stride) + 1
+        self._canvas = None
+
+    def setup(self):
+        """
+        Function to draw the static part of the figure once and keep it as
+        the background of every frame. Called on first use.
+        """
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        s = self.settings
+        fig = Figure(figsize=s['figsize'], dpi=s['dpi'])
+        canvas = FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+        numCurves = self.populations.shape[1]
+        labels = s['labels'] or [None] * numCurves
+        colors = s['colors'] or [None] * numCurves
+        self._lines = [ax.plot([], [], '-', label=label, color=color,
+                               animated=True)[0]
+                       for label, color in zip(labels, colors)]
+        if s['equilibrium'] is not None:
+            for line, value in zip(self._lines, s['equilibrium']):
+                ax.axhline(value, color=line.get_color(), alpha=0.4,
+                           linestyle=(0, (5, 5)))
+        ax.set_xlim(self.times[0], self.times[-1])
+        ax.set_ylim(*s['ylim'])
+        ax.set_xlabel(s['xlabel'])
+        ax.set_ylabel(s['ylabel'])
+        if s['labels']:
+            ax.legend(ncols=2)
+        canvas.draw() # everything but the animated curves
+        self._background = canvas.copy_from_bbox(fig.bbox)
+        self._axes = ax
+        self._canvas = canvas
+
+    def frameSize(self):
+        """
+        Returns the (width, height) of a frame in pixels.
+        """
+        if self._canvas is None:
+            self.setup()
+        return self._canvas.get_width_height()
+
+    def frame(self, index):
+        """
+        Function to render one frame.
+
+        Parameters
+        ----------
+        index : int
+            The frame, it shows the time points up to index * stride.
+
+        Returns
+        -------
+        rgba : numpy array of uint8 (height, width, 4)
+
+        """
+        if self._canvas is None:
+            self.setup()
+        end = min(index * self.stride, self.times.shape[0] - 1) + 1
+        self._canvas.restore_region(self._background)
+        for k, line in enumerate(self._lines):
+            line.set_data(self.times[:end], self.populations[:end, k])
+            self._axes.draw_artist(line)
+        return np.array(self._canvas.buffer_rgba())
+
+    def renderChunks(self, maxWorkers=1, chunkFrames=16):
+        """
+        Function yielding the frames in order, in lists of up to
+        chunkFrames frames.
+
+        Parameters
+        ----------
+        maxWorkers : int, optional
+            Number of processes, None for one per CPU. The default is 1,
+            render in this process.
+        chunkFrames : int, optional
+            Frames per task. At most two tasks per worker are in flight,
+            which bounds the memory. The default is 16.
+
+        """
+        ranges = [(start, min(start + chunkFrames, self.numFrames))
+                  for start in range(0, self.numFrames, chunkFrames)]
+        if maxWorkers == 1:
+            for start, stop in ranges:
+                yield [self.frame(f) for f in range(start, stop)]
+            return
+        workers = maxWorkers or os.cpu_count() or 1
+        with ProcessPoolExecutor(
+                max_workers=workers, initializer=_initWorker,
+                initargs=(self.times, self.populations,
+                          self.settings)) as pool:
+            pending = collections.deque()
+            for frames in ranges:
+                pending.append(pool.submit(_renderTask, frames))
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def save(self, path, fps=50, maxWorkers=1, chunkFrames=16):
+        """
+        Function to encode the animation to a file.
+
+        Parameters
+        ----------
+        path : str
+            A .gif, .png/.apng or .mp4 file, see ``openWriter``.
+        fps : float, optional
+            Frames per second, the default 50 is the ``interval=20`` of the
+            notebook.
+        maxWorkers : int, optional
+            See ``renderChunks``. The default is 1.
+        chunkFrames : int, optional
+            See ``renderChunks``. The default is 16.
+
+        Returns
+        -------
+        numFrames : int
+
+        """
+        writer = openWriter(path, fps, self.frameSize())
+        try:
+            for frames in self.renderChunks(maxWorkers=maxWorkers,
+                                            chunkFrames=chunkFrames):
+                for rgba in frames:
+                    writer.write(rgba)
+        finally:
+            writer.close()
+        return self.numFrames
+
+
+def _initWorker(times, populations, settings):
+    _worker['animation'] = RelaxationAnimation(times, populations, **settings)
+
+
+def _renderTask(frames):
+    animation = _worker['animation']
+    return [animation.frame(f) for f in range(*frames)]
+
+
+class FFmpegWriter:
+    """
+    Streams RGBA frames to an ffmpeg process, which encodes the file.
+
+    Parameters
+    ----------
+    path : str
+        The output file, its extension one of ``FFMPEG_OPTIONS``.
+    fps : float
+        Frames per second.
+    size : tuple
+        (width, height) of the frames in pixels.
+    ffmpeg : str, optional
+        The executable. The default is 'ffmpeg'.
+
+    """
+
+    def __init__(self, path, fps, size, ffmpeg='ffmpeg'):
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in FFMPEG_OPTIONS:
+            raise ValueError(f'cannot encode {extension} files')
+        width, height = size
+        command = [ffmpeg, '-y', '-loglevel', 'error', '-f', 'rawvideo',
+                   '-pix_fmt', 'rgba', '-s', f'{width}x{height}',
+                   '-r', str(fps), '-i', '-'] \
+            + FFMPEG_OPTIONS[extension] + [path]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+
+    def write(self, rgba):
+        self.process.stdin.write(np.ascontiguousarray(rgba).tobytes())
+
+    def close(self):
+        self.process.stdin.close()
+        if self.process.wait():
+            raise RuntimeError(f'ffmpeg failed with exit code '
+                               f'{self.process.returncode}')
+
+
+class PillowWriter:
+    """
+    Collects frames for Pillow, GIF frames as 256-color palette images, and
+    writes the file on ``close``.
+
+    Parameters
+    ----------
+    path : str
+        A .gif or .png/.apng file.
+    fps : float
+        Frames per second.
+
+    """
+
+    def __init__(self, path, fps):
+        from PIL import Image
+        self.Image = Image
+        self.path = path
+        self.fps = fps
+        self.gif = os.path.splitext(path)[1].lower() == '.gif'
+        self.frames = []
+
+    def write(self, rgba):
+        image = self.Image.fromarray(np.asarray(rgba, dtype=np.uint8), 'RGBA')
+        self.frames.append(image.convert('RGB').quantize() if self.gif
+                           else image)
+
+    def close(self):
+        if self.frames:
+            self.frames[0].save(self.path, save_all=True,
+                                append_images=self.frames[1:],
+                                duration=1000 / self.fps, loop=0)
+        self.frames = []
+
+
+def openWriter(path, fps, size):
+    """
+    Function to choose the encoder of an animation file: ffmpeg when it is
+    on the PATH, else Pillow for GIF and APNG.
+
+    Parameters
+    ----------
+    path : str
+        A .gif, .png/.apng or .mp4 file.
+    fps : float
+        Frames per second.
+    size : tuple
+        (width, height) of the frames in pixels.
+
+    Returns
+    -------
+    writer : FFmpegWriter or PillowWriter
+        With ``write(rgba)`` and ``close()``.
+
+    """
+    extension = os.path.splitext(path)[1].lower()
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is not None:
+        return FFmpegWriter(path, fps, size, ffmpeg=ffmpeg)
+    if extension in ('.gif', '.png', '.apng'):
+        return PillowWriter(path, fps)
+    raise RuntimeError(f'writing {extension} files needs ffmpeg')
+
+
+def saveRelaxation(rateMatrix, times, path, states=None, labels=None,
+                   equilibrium=None, fps=50, maxWorkers=1, **kw):
+    """
+    Function to propagate and animate the relaxation of a rate matrix in
+    one call, the notebook animation cells.
+
+    Parameters
+    ----------
+    rateMatrix : numpy array or scipy sparse matrix (states, states)
+        The rate matrix Q.
+    times : numpy array (times,)
+        The time points.
+    path : str
+        The animation file, see ``openWriter``.
+    states : list of int, optional
+        The tracked states, see ``relaxationPopulations``.
+    labels : list of str, optional
+        Their legend entries.
+    equilibrium : list of float, optional
+        Their stationary populations.
+    fps : float, optional
+        Frames per second. The default is 50.
+    maxWorkers : int, optional
+        See ``RelaxationAnimation.renderChunks``. The default is 1.
+    **kw
+        Further ``RelaxationAnimation`` keywords.
+
+    Returns
+    -------
+    animation : RelaxationAnimation
+
+    """
+    populations = relaxationPopulations(rateMatrix, times, states=states)
+    animation = RelaxationAnimation(times, populations, labels=labels,
+                                    equilibrium=equilibrium, **kw)
+    animation.save(path, fps=fps, maxWorkers=maxWorkers)
+    return animation
+
+
+def fillColors(populations, colors=('#ffffff', '#0000ff'), vmin=0,
+               vmax=None):
+    """
+    Returns the node fill of every frame, ``colormap`` over the whole
+    (frames, nodes) array at once so that all frames share one scale.
+    """
+    return colormap(populations, colors=colors, vmin=vmin, vmax=vmax)
+
+
+def networkFrames(scene, populations, write, stride=1,
+                  colors=('#ffffff', '#0000ff'), vmin=0, vmax=None):
+    """
+    Function to color the nodes of a drawn network frame by frame.
+
+    Parameters
+    ----------
+    scene : NetworkScene
+        The drawn network, see ``network``.
+    populations : numpy array (times, nodes)
+        E.g. from ``relaxationPopulations``.
+    write : callable
+        Called with the frame index after each restyle, e.g.
+        ``lambda f: doc.write(f'frames/{f:04d}.svg')``.
+    stride : int, optional
+        Time points per frame. The default is 1.
+    colors : list of str, optional
+        The color stops, see ``colormap``. The default is white to blue.
+    vmin, vmax : float, optional
+        The populations of the first and last stop. The default is 0 and
+        the maximum population.
+
+    Returns
+    -------
+    numFrames : int
+
+    """
+    fills = fillColors(np.asarray(populations)[::stride], colors=colors,
+                       vmin=vmin, vmax=vmax)
+    for index, frameFills in enumerate(fills):
+        scene.restyleNodes(frameFills)
+        write(index)
+    return fills.shape[0]
+
+
+def animateNodeFill(scene, populations, duration=10, stride=1,
+                    colors=('#ffffff', '#0000ff'), vmin=0, vmax=None,
+                    repeat=True):
+    """
+    Function to animate the node fill of a network drawn into an
+    ``SVGDocument``: every node circle gets an SVG ``animate`` element
+    running through its colors, so one SVG file holds the animation.
+
+    Parameters
+    ----------
+    scene : NetworkScene
+        A network drawn with the ``SVGDocument`` backend.
+    populations : numpy array (times, nodes)
+        E.g. from ``relaxationPopulations``.
+    duration : float, optional
+        Seconds for all time points. The default is 10.
+    stride : int, optional
+        Time points per color step. The default is 1.
+    colors : list of str, optional
+        The color stops, see ``colormap``. The default is white to blue.
+    vmin, vmax : float, optional
+        See ``networkFrames``.
+    repeat : bool, optional
+        Loop the animation. The default is True.
+
+    Returns
+    -------
+    scene : NetworkScene
+
+    """
+    from .svg import Element
+    fills = fillColors(np.asarray(populations)[::stride], colors=colors,
+                       vmin=vmin, vmax=vmax)
+    for node, nodeFills in zip(scene.objs, fills.T):
+        circle = node[0]
+        attrs = {'attributeName': 'fill', 'values': ';'.join(nodeFills),
+                 'dur': f'{duration}s', 'calcMode': 'discrete'}
+        if repeat:
+            attrs['repeatCount'] = 'indefinite'
+        else:
+            attrs['fill'] = 'freeze'
+        circle.append(Element(circle.doc, 'animate', attrs=attrs))
+    return scene
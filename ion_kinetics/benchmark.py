@@ -0,0 +1,354 @@
+# -*- coding: utf-8 -*-
+"""
+Scaling benchmarks of the kinetics and drawing hot paths.
+
+Every stage is run on synthetic models of increasing size and its wall
+time, peak memory (``tracemalloc``, in a separate run so the timing is not
+slowed down) and object/edge counts are recorded. Each stage runs once
+before it is timed, so imports and first-call caches do not end up in the
+times of the smallest size::
+
+    python -m ion_kinetics.benchmark --out bench.json
+    python -m ion_kinetics.benchmark --out new.json --compare bench.json
+
+The state spaces are the 3-state chain of markov_chain_stuff.ipynb, the
+V/W/K filter with 5 and 10 sites (243 and 59049 states) and the ASEP with
+8 and 12 sites (256 and 4096 states). The kinetics stages are the
+rule-based Q building (``filterRateMatrix``/``asepRateMatrix``, the
+replacement of the ``isallowedTransition`` loop), ``monteCarloSim``,
+``countMatrix`` and the time grid of ``propagate``. The drawing stages,
+``network`` over tiled networks of 1 to 10 blocks and ``drawOccupancy``,
+draw into an ``SVGDocument``, so no Inkscape is needed, and ``write``
+serializes the network to a temporary SVG file. The results are
+written as JSON together with the versions and the git commit, so runs of
+different commits can be compared.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import scipy
+import scipy.sparse
+
+from . import drawing
+from .blocks import BlockNetwork
+from .counting import countMatrix
+from .drawing import drawOccupancy, network, useBackend
+from .microstates import Microstates
+from .montecarlo import monteCarloSim
+from .propagator import Propagator, propagate
+from .ratematrix import asepRateMatrix, filterRateMatrix
+from .svg import SVGDocument
+
+# benchmarked state space sizes
+SIZES = (3, 243, 256, 4096, 59049)
+# filter rates of the synthetic V/W/K models
+FILTER_RATES = {'K': {'forward': 2.0, 'backward': 1.0, 'enterLeft': 1.0,
+                      'exitLeft': 0.2, 'enterRight': 0.1, 'exitRight': 1.0},
+                'W': {'forward': 1.0, 'backward': 1.0, 'enterLeft': 1.0,
+                      'exitLeft': 1.0, 'enterRight': 1.0, 'exitRight': 1.0}}
+# up to this many states the full P(t) is propagated, above one start state
+DENSE_PROPAGATE = 256
+
+
+def syntheticRateMatrix(numStates):
+    """
+    Function for the synthetic rate matrix of a benchmark size.
+
+    Parameters
+    ----------
+    numStates : int
+        3, 3**sites (V/W/K filter) or 2**sites (ASEP).
+
+    Returns
+    -------
+    Q : scipy.sparse.csr_matrix (numStates, numStates)
+
+    """
+    if numStates == 3:
+        return scipy.sparse.csr_matrix(np.array([[-1.0, 1.0, 0.0],
+                                                 [0.5, -1.0, 0.5],
+                                                 [0.0, 0.2, -0.2]]))
+    sites = round(np.log(numStates) / np.log(3))
+    if 3**sites == numStates:
+        return filterRateMatrix(sites, FILTER_RATES)[0]
+    sites = round(np.log2(numStates))
+    if 2**sites == numStates:
+        return asepRateMatrix(sites, 1.0, 0.5, 1.0, 0.2)[0]
+    raise ValueError(f'no synthetic model with {numStates} states')
+
+
+def syntheticUnitCell(numStates=26, seed=0):
+    """
+    Function for a synthetic flux unit cell and its coordinates, a chain of
+    numStates states with random shortcuts and couplings to the next
+    block, shaped like the networks of network_v2.1.2.py.
+
+    Returns
+    -------
+    intraBlock : scipy.sparse.csr_matrix (numStates, numStates)
+    coupling : scipy.sparse.csr_matrix (numStates, numStates)
+    coords : numpy array (numStates, 2)
+
+    """
+    rng = np.random.default_rng(seed)
+    states = np.arange(numStates - 1)
+    rows = np.concatenate((states, rng.integers(numStates, size=numStates)))
+    cols = np.concatenate((states + 1, rng.integers(numStates, size=numStates)))
+    keep = rows != cols
+    intraBlock = scipy.sparse.csr_matrix(
+        (rng.random(keep.sum()) * 0.3, (rows[keep], cols[keep])),
+        shape=(numStates, numStates))
+    ends = rng.integers(numStates, size=3)
+    coupling = scipy.sparse.csr_matrix(
+        (rng.random(3) * 0.3, (ends, rng.integers(numStates, size=3))),
+        shape=(numStates, numStates))
+    angle = np.linspace(0, 2 * np.pi, numStates, endpoint=False)
+    coords = np.column_stack((30 * np.cos(angle), 30 * np.sin(angle)))
+    return (intraBlock, coupling, coords)
+
+
+def measure(stage, fn, memory=True, warmup=True):
+    """
+    Function to time one stage and measure its peak memory.
+
+    Parameters
+    ----------
+    stage : str
+        The stage name.
+    fn : callable
+        Runs the stage and returns a dict of counts.
+    memory : bool, optional
+        Run the stage again under ``tracemalloc`` for the peak of the
+        memory it allocates. The default is True.
+    warmup : bool, optional
+        Run the stage once before timing it. The default is True.
+
+    Returns
+    -------
+    result : dict
+        stage, seconds, peakBytes (None without memory) and the counts.
+
+    """
+    if warmup:
+        fn()
+    start = time.perf_counter()
+    counts = fn()
+    seconds = time.perf_counter() - start
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            fn()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return {'stage': stage, 'seconds': seconds, 'peakBytes': peak,
+            'counts': counts}
+
+
+def kineticsStages(numStates, steps=10**5, seed=0):
+    """
+    Returns (name, fn) of the kinetics stages of one state space size.
+    """
+    Q = syntheticRateMatrix(numStates)
+    holder = {}
+
+    def build():
+        holder['Q'] = syntheticRateMatrix(numStates)
+        return {'states': numStates, 'nnz': int(holder['Q'].nnz)}
+
+    def simulate():
+        holder['traj'] = monteCarloSim(numStates, Q, steps, start=0,
+                                       seed=seed)
+        return {'steps': steps}
+
+    def count():
+        traj = holder['traj'][:, 1].astype(np.int64)
+        counts = countMatrix(numStates, traj, lagtime=[1, 10, 100])
+        return {'steps': steps, 'pairs': int(sum(c.nnz for c in counts))}
+
+    def evolve():
+        times = np.linspace(0, 10, 50)
+        if numStates <= DENSE_PROPAGATE:
+            propagate(Q, times)
+            return {'times': times.shape[0], 'method': 'matrix'}
+        # P(t) has numStates**2 entries, only evolve one start state
+        p0 = np.zeros(numStates)
+        p0[0] = 1
+        Propagator(Q, method='krylov').evolve(p0, times)
+        return {'times': times.shape[0], 'method': 'krylov'}
+
+    return [('rateMatrix', build), ('monteCarloSim', simulate),
+            ('countMatrix', count), ('propagate', evolve)]
+
+
+def drawingStages(blocks, unitStates=26, occupancySites=5):
+    """
+    Returns (name, fn) of the drawing stages of a tiled network.
+    """
+    intraBlock, coupling, unitCoords = syntheticUnitCell(unitStates)
+    blockNet = BlockNetwork(unitStates, blocks, intraBlock=intraBlock,
+                            couplings={1: coupling})
+    coords = blockNet.nodePositions(unitCoords, (80, 0))
+    adjacency = blockNet.adjacency()
+    microstates = Microstates(occupancySites)
+    occupancies = microstates.decode(np.arange(blockNet.numNodes)
+                                     % microstates.numStates)
+    holder = {}
+
+    def drawNetwork():
+        doc = holder['doc'] = SVGDocument()
+        useBackend(doc)
+        scene = network(blockNet.numNodes, np.ones(blockNet.numNodes),
+                        coords, adjacency, circleSize=4)
+        return {'nodes': blockNet.numNodes, 'edges': len(scene.edges),
+                'objects': countElements(doc.root),
+                'borders': sum(len(b) for b in scene.borders),
+                'markers': len(drawing.markerDefs)}
+
+    def write():
+        with tempfile.TemporaryFile('w', encoding='utf-8') as f:
+            holder['doc'].write(f)
+            return {'bytes': f.tell()}
+
+    def drawOccupancies():
+        doc = SVGDocument()
+        useBackend(doc)
+        for state in occupancies:
+            drawOccupancy(state.split())
+        return {'drawings': len(occupancies), 'glyphs': len(drawing.glyphDefs),
+                'objects': countElements(doc.root)}
+
+    return [('network', drawNetwork), ('write', write),
+            ('drawOccupancy', drawOccupancies)]
+
+
+def countElements(element):
+    """
+    Helper function for the number of SVG elements below an element.
+    """
+    return sum(1 + countElements(child) for child in element.children)
+
+
+def gitCommit():
+    """
+    Returns the commit of the working tree, None outside of git.
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'],
+                              cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def runBenchmarks(sizes=SIZES, blocks=range(1, 11), steps=10**5, memory=True,
+                  log=print):
+    """
+    Function to run all stages.
+
+    Parameters
+    ----------
+    sizes : list of int, optional
+        State space sizes of the kinetics stages. The default is ``SIZES``.
+    blocks : list of int, optional
+        Block counts of the tiled drawing stages. The default is 1 to 10.
+    steps : int, optional
+        Monte Carlo steps. The default is 10**5.
+    memory : bool, optional
+        Measure the peak memory, see ``measure``. The default is True.
+    log : callable, optional
+        Called with one line per result. The default is print.
+
+    Returns
+    -------
+    report : dict
+        'meta' (versions, platform, commit, date) and 'results', one dict
+        per stage and size.
+
+    """
+    results = []
+    for numStates in sizes:
+        for stage, fn in kineticsStages(numStates, steps=steps):
+            result = measure(stage, fn, memory=memory)
+            result['size'] = numStates
+            results.append(result)
+            log(formatResult(result))
+    for numBlocks in blocks:
+        for stage, fn in drawingStages(numBlocks):
+            result = measure(stage, fn, memory=memory)
+            result['size'] = numBlocks
+            results.append(result)
+            log(formatResult(result))
+    meta = {'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'commit': gitCommit(), 'python': platform.python_version(),
+            'numpy': np.__version__, 'scipy': scipy.__version__,
+            'platform': platform.platform(), 'cpus': os.cpu_count()}
+    return {'meta': meta, 'results': results}
+
+
+def formatResult(result, reference=None):
+    """
+    Helper function for one line of the benchmark output.
+    """
+    peak = result['peakBytes']
+    line = (f"{result['stage']:<14} {result['size']:>6} "
+            f"{result['seconds']:10.4f} s "
+            + (f"{peak / 2**20:9.1f} MiB" if peak is not None else ' ' * 13))
+    if reference is not None and reference['seconds'] > 0:
+        line += f"  x{result['seconds'] / reference['seconds']:.2f}"
+    return line
+
+
+def compareReports(report, reference):
+    """
+    Function to print the results of a report with their time ratio to a
+    reference report (e.g. of another commit).
+    """
+    old = {(r['stage'], r['size']): r for r in reference['results']}
+    for result in report['results']:
+        reference = old.get((result['stage'], result['size']))
+        print(formatResult(result, reference))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark the kinetics and drawing stages over '
+                    'increasing model sizes.')
+    parser.add_argument('--out', default='benchmark.json',
+                        help='JSON results (default: benchmark.json)')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES),
+                        help='state space sizes (default: %(default)s)')
+    parser.add_argument('--blocks', type=int, nargs='+',
+                        default=list(range(1, 11)),
+                        help='block counts of the tiled networks')
+    parser.add_argument('--steps', type=int, default=10**5,
+                        help='Monte Carlo steps (default: 100000)')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='skip the tracemalloc runs')
+    parser.add_argument('--compare', help='reference JSON of an earlier run')
+    args = parser.parse_args(argv)
+    report = runBenchmarks(args.sizes, args.blocks, steps=args.steps,
+                           memory=not args.no_memory,
+                           log=print if args.compare is None else
+                           (lambda line: None))
+    if args.compare is not None:
+        with open(args.compare) as f:
+            compareReports(report, json.load(f))
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=1)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""
+Networks made of repeated blocks of one unit cell.
+
+The figures show the filter model as a chain of blocks, copies of the same
+microstates, where a conduction event moves into the neighbouring block.
+``BlockNetwork`` describes that chain by the unit cell alone: the edges
+within a block and the couplings to blocks at a given offset. The nodes and
+edges of the whole chain are generated from it on demand, node k being
+state ``k % numStates`` of block ``k // numStates`` as in
+``np.tile(np.arange(numStates), blocks)``. A network without edges, as
+``drawCondition`` uses for the node bookkeeping, does not need scipy.
+"""
+
+import numpy as np
+
+
+class BlockNetwork:
+    """
+    A chain of blocks sharing one unit cell.
+
+    Parameters
+    ----------
+    numStates : int
+        The number of states of the unit cell.
+    blocks : int
+        The number of blocks.
+    intraBlock : scipy sparse matrix or numpy array, optional
+        (numStates, numStates) edge weights within a block. The default is
+        None, no edges.
+    couplings : dict, optional
+        {offset: matrix (numStates, numStates)}, the weight of the edge from
+        state i of block b to state j of block b + offset. The default is
+        None, no couplings.
+    periodic : bool, optional
+        Wrap couplings around the ends of the chain. The default is False,
+        couplings leaving the chain are dropped.
+
+    """
+
+    def __init__(self, numStates, blocks, intraBlock=None, couplings=None,
+                 periodic=False):
+        self.numStates = numStates
+        self.blocks = blocks
+        self.periodic = periodic
+        self.couplings = {}
+        if intraBlock is not None or couplings:
+            import scipy.sparse
+            if intraBlock is None:
+                intraBlock = (numStates, numStates)
+            self.couplings[0] = scipy.sparse.coo_matrix(intraBlock)
+            for offset, matrix in (couplings or {}).items():
+                if offset:
+                    self.couplings[int(offset)] = \
+                        scipy.sparse.coo_matrix(matrix)
+
+    @classmethod
+    def fromMatrix(cls, matrix, numStates, reference=None, periodic=False):
+        """
+        Function to read the unit cell out of a tiled matrix.
+
+        Parameters
+        ----------
+        matrix : numpy array or scipy sparse matrix (nodes, nodes)
+            A matrix over all blocks, e.g. the tiled major_flux.
+        numStates : int
+            The number of states of the unit cell.
+        reference : int, optional
+            The block whose rows define the unit cell. The default is None,
+            the middle block.
+        periodic : bool, optional
+            See ``BlockNetwork``. The default is False.
+
+        Returns
+        -------
+        blockNetwork : BlockNetwork
+            Its ``adjacency`` equals the matrix.
+
+        Raises
+        ------
+        ValueError
+            If the matrix is not made of copies of the reference block.
+
+        """
+        import scipy.sparse
+        matrix = scipy.sparse.csr_matrix(matrix)
+        blocks = matrix.shape[0] // numStates
+        if reference is None:
+            reference = blocks // 2
+        rows = matrix[reference * numStates:(reference + 1) * numStates]
+        couplings = {}
+        for block in range(blocks):
+            part = rows[:, block * numStates:(block + 1) * numStates]
+            if part.nnz or block == reference:
+                couplings[block - reference] = part
+        intraBlock = couplings.pop(0)
+        blockNetwork = cls(numStates, blocks, intraBlock=intraBlock,
+                           couplings=couplings, periodic=periodic)
+        if matrix.shape != (blockNetwork.numNodes, blockNetwork.numNodes) \
+                or (blockNetwork.adjacency() != matrix).nnz:
+            raise ValueError(f'the matrix is not a tiling of block '
+                             f'{reference} with {numStates} states')
+        return blockNetwork
+
+    @property
+    def numNodes(self):
+        return self.numStates * self.blocks
+
+    def nodeStates(self):
+        """
+        Returns the unit cell state of every node.
+        """
+        return np.arange(self.numNodes) % self.numStates
+
+    def nodeBlocks(self):
+        """
+        Returns the block of every node.
+        """
+        return np.arange(self.numNodes) // self.numStates
+
+    def nodeValues(self, values):
+        """
+        Function to spread per state values (populations, committors, ...)
+        over all nodes.
+
+        Parameters
+        ----------
+        values : array like (numStates, ...)
+
+        Returns
+        -------
+        nodeValues : numpy array (numNodes, ...)
+
+        """
+        return np.asarray(values)[self.nodeStates()]
+
+    def blockEdges(self, block):
+        """
+        Function for the edges starting in one block.
+
+        Parameters
+        ----------
+        block : int
+
+        Returns
+        -------
+        i, j : numpy array of int (edges,)
+            Node indices.
+        w : numpy array (edges,)
+            Edge weights.
+
+        """
+        n = self.numStates
+        parts = []
+        for offset, matrix in self.couplings.items():
+            target = block + offset
+            if self.periodic:
+                target %= self.blocks
+            elif not 0 <= target < self.blocks:
+                continue
+            parts.append((matrix.row + block * n, matrix.col + target * n,
+                          matrix.data))
+        if not parts:
+            return (np.zeros(0, dtype=int), np.zeros(0, dtype=int),
+                    np.zeros(0))
+        return tuple(np.concatenate(p) for p in zip(*parts))
+
+    def iterEdges(self):
+        """
+        Yields the ``blockEdges`` of one block after the other.
+        """
+        for block in range(self.blocks):
+            yield self.blockEdges(block)
+
+    def adjacency(self, blocks=None):
+        """
+        Function for the sparse matrix over all (or some) blocks.
+
+        Parameters
+        ----------
+        blocks : list of int, optional
+            Only include the edges starting in these blocks. The default is
+            None, all blocks.
+
+        Returns
+        -------
+        A : scipy.sparse.csr_matrix (numNodes, numNodes)
+
+        """
+        import scipy.sparse
+        if blocks is None:
+            blocks = range(self.blocks)
+        edges = [self.blockEdges(b) for b in blocks]
+        if not edges:
+            return scipy.sparse.csr_matrix((self.numNodes, self.numNodes))
+        i, j, w = (np.concatenate(p) for p in zip(*edges))
+        return scipy.sparse.csr_matrix((w, (i, j)),
+                                       shape=(self.numNodes, self.numNodes))
+
+    def nodePositions(self, unitCoords, shift):
+        """
+        Function to place the blocks next to each other.
+
+        Parameters
+        ----------
+        unitCoords : numpy array (numStates, 2)
+            The node coordinates of one block.
+        shift : tuple
+            The (x, y) displacement from one block to the next.
+
+        Returns
+        -------
+        coords : numpy array (numNodes, 2)
+
+        """
+        return self.nodeValues(unitCoords) \
+            + self.nodeBlocks()[:, np.newaxis] * np.asarray(shift)
+
+    def blockCommittor(self, committor, block=None):
+        """
+        Function for the committor of the whole chain when crossing one
+        block: 0 before it, the unit cell committor inside and 1 after it.
+
+        Parameters
+        ----------
+        committor : numpy array (numStates,)
+            The committor of the unit cell.
+        block : int, optional
+            The block being crossed. The default is None, the middle one.
+
+        Returns
+        -------
+        q : numpy array (numNodes,)
+
+        """
+        if block is None:
+            block = self.blocks // 2
+        nodeBlocks = self.nodeBlocks()
+        return np.where(nodeBlocks < block, 0.0,
+                        np.where(nodeBlocks > block, 1.0,
+                                 self.nodeValues(committor)))
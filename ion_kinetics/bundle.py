@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+"""
+Versioned on-disk model bundles that open memory-mapped.
+
+A bundle is a directory (by convention ``model.bundle`` inside a condition
+directory) holding a header and one ``.npy`` file per array block::
+
+    header.json              format, version, scalar attributes, entries
+    <name>.npy               dense array
+    <name>.data.npy          \\
+    <name>.indices.npy        } CSR matrix, the shape is in the header
+    <name>.indptr.npy        /
+    <name>.offsets.npy       \\ string table: string i is the utf-8 bytes
+    <name>.bytes.npy         /  bytes[offsets[i]:offsets[i+1]]
+
+``header.json`` looks like::
+
+    {"format": "ion-kinetics-bundle", "version": 1,
+     "attrs": {"numStates": 26},
+     "entries": {"rateMatrix": {"kind": "csr", "shape": [26, 26],
+                                "dtype": "<f8"},
+                 "occuList": {"kind": "strings", "count": 26},
+                 "positions": {"kind": "array", "shape": [130, 2],
+                               "dtype": "<f8"}}}
+
+``np.save`` pads the ``.npy`` header so the data starts 64-byte aligned,
+every block is opened with ``np.load(mmap_mode='r')`` and only the pages
+that are used get read. The header is written last, so a bundle is only
+valid once it is complete. Readers refuse newer versions than
+``BUNDLE_VERSION``.
+"""
+
+import argparse
+import json
+import os
+import pickle as pkl
+
+import numpy as np
+
+BUNDLE_FORMAT = 'ion-kinetics-bundle'
+BUNDLE_VERSION = 1
+BUNDLE_NAME = 'model.bundle' # bundle directory inside a condition directory
+
+# pickles of a condition directory written by the analysis scripts
+CONDITION_FILES = {'model': 'microstates_5site_package_rates.pkl',
+                   'coords': 'network_coords.pkl',
+                   'flux': 'fluxs_5bs_convention_0_7.pkl'}
+
+
+class StringTable:
+    """
+    Read-only list of strings stored as utf-8 bytes plus offsets.
+
+    Parameters
+    ----------
+    offsets : numpy array of int (count + 1,)
+    data : numpy array of uint8
+
+    """
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return self.offsets.shape[0] - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('string table index out of range')
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return bytes(self.data[start:end]).decode('utf-8')
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def stringTable(strings):
+    """
+    Function to pack strings into the offsets and bytes of a string table.
+
+    Parameters
+    ----------
+    strings : list of str
+
+    Returns
+    -------
+    offsets : numpy array of int64 (len(strings) + 1,)
+    data : numpy array of uint8
+
+    """
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded])
+    data = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    return (offsets, data)
+
+
+def saveBundle(path, attrs=None, **entries):
+    """
+    Function to write a bundle.
+
+    Parameters
+    ----------
+    path : str
+        The bundle directory, created if needed.
+    attrs : dict, optional
+        Scalar attributes (numbers, strings) kept in the header. The
+        default is None.
+    **entries
+        The named blocks: scipy sparse matrices are stored as CSR, lists of
+        str as string tables and everything else as a dense array.
+
+    Returns
+    -------
+    None.
+
+    """
+    import scipy.sparse
+    os.makedirs(path, exist_ok=True)
+    header = {'format': BUNDLE_FORMAT, 'version': BUNDLE_VERSION,
+              'attrs': dict(attrs or {}), 'entries': {}}
+
+    def save(name, array):
+        np.save(os.path.join(path, name + '.npy'), np.ascontiguousarray(array))
+
+    for name, value in entries.items():
+        if scipy.sparse.issparse(value):
+            value = scipy.sparse.csr_matrix(value)
+            value.sort_indices()
+            save(f'{name}.data', value.data)
+            save(f'{name}.indices', value.indices)
+            save(f'{name}.indptr', value.indptr)
+            header['entries'][name] = {'kind': 'csr', 'shape': list(value.shape),
+                                       'dtype': value.dtype.str}
+        elif isinstance(value, (list, tuple)) and all(
+                isinstance(s, str) for s in value):
+            offsets, data = stringTable(value)
+            save(f'{name}.offsets', offsets)
+            save(f'{name}.bytes', data)
+            header['entries'][name] = {'kind': 'strings', 'count': len(value)}
+        else:
+            value = np.asarray(value)
+            if value.dtype == object:
+                raise TypeError(f'{name} cannot be stored as an array')
+            save(name, value)
+            header['entries'][name] = {'kind': 'array',
+                                       'shape': list(value.shape),
+                                       'dtype': value.dtype.str}
+    # the header goes last, a bundle without it is incomplete
+    tmp = os.path.join(path, 'header.json.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(header, f, indent=1)
+    os.replace(tmp, os.path.join(path, 'header.json'))
+
+
+class ModelBundle:
+    """
+    A bundle opened for reading. Blocks are memory-mapped on first access.
+
+    Parameters
+    ----------
+    path : str
+        The bundle directory.
+    mmap : bool, optional
+        Memory-map the blocks instead of reading them. The default is True.
+
+    Attributes
+    ----------
+    attrs : dict
+        The scalar attributes of the header.
+    version : int
+        The format version the bundle was written with.
+
+    """
+
+    def __init__(self, path, mmap=True):
+        self.path = path
+        self.mmapMode = 'r' if mmap else None
+        with open(os.path.join(path, 'header.json')) as f:
+            header = json.load(f)
+        if header.get('format') != BUNDLE_FORMAT:
+            raise ValueError(f'{path} is not a model bundle')
+        if header['version'] > BUNDLE_VERSION:
+            raise ValueError(f'{path} has bundle version {header["version"]}, '
+                             f'this reader supports up to {BUNDLE_VERSION}')
+        self.version = header['version']
+        self.attrs = header['attrs']
+        self.entries = header['entries']
+        self._cache = {}
+
+    def load(self, name):
+        return np.load(os.path.join(self.path, name + '.npy'),
+                       mmap_mode=self.mmapMode)
+
+    def keys(self):
+        return list(self.entries)
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def __getitem__(self, name):
+        """
+        Returns a block: a (memory-mapped) array, a CSR matrix over
+        memory-mapped arrays or a ``StringTable``.
+        """
+        if name not in self._cache:
+            entry = self.entries[name]
+            if entry['kind'] == 'csr':
+                import scipy.sparse
+                value = scipy.sparse.csr_matrix(
+                    (self.load(f'{name}.data'), self.load(f'{name}.indices'),
+                     self.load(f'{name}.indptr')), shape=tuple(entry['shape']),
+                    copy=False)
+            elif entry['kind'] == 'strings':
+                value = StringTable(self.load(f'{name}.offsets'),
+                                    self.load(f'{name}.bytes'))
+            elif entry['kind'] == 'array':
+                value = self.load(name)
+            else:
+                raise ValueError(f'unknown bundle entry kind {entry["kind"]}')
+            self._cache[name] = value
+        return self._cache[name]
+
+
+def loadBundle(path, mmap=True):
+    """
+    Returns the ``ModelBundle`` at path.
+    """
+    return ModelBundle(path, mmap=mmap)
+
+
+def readConditionPickles(directory):
+    """
+    Function to load the pickles of one condition.
+
+    Parameters
+    ----------
+    directory : str
+        The condition directory.
+
+    Returns
+    -------
+    model : dict
+        numStates, occuList, stationary_dist, rateMatrix and committor of
+        the microstate model, positions of the (tiled) network nodes and
+        the major_flux matrix between them.
+
+    """
+    with open(os.path.join(directory, CONDITION_FILES['model']), 'rb') as f:
+        numStates, occuList, stationary_dist, rateMatrix, committor = \
+            pkl.load(f)
+    with open(os.path.join(directory, CONDITION_FILES['coords']), 'rb') as f:
+        positions = pkl.load(f)
+    with open(os.path.join(directory, CONDITION_FILES['flux']), 'rb') as f:
+        major_flux = pkl.load(f)
+    return {'numStates': numStates, 'occuList': occuList,
+            'stationary_dist': np.asarray(stationary_dist),
+            'rateMatrix': rateMatrix, 'committor': committor,
+            'positions': np.asarray(positions),
+            'major_flux': np.asarray(major_flux, dtype=float)}
+
+
+def convertCondition(directory, path=None):
+    """
+    Function to convert the pickles of a condition directory into a bundle.
+
+    The rate and flux matrices are stored as CSR, the occupancies as a
+    string table and numStates as an attribute.
+
+    Parameters
+    ----------
+    directory : str
+        The condition directory.
+    path : str, optional
+        The bundle directory. The default is ``BUNDLE_NAME`` inside the
+        condition directory.
+
+    Returns
+    -------
+    path : str
+        The bundle directory.
+
+    """
+    import scipy.sparse
+    if path is None:
+        path = os.path.join(directory, BUNDLE_NAME)
+    model = readConditionPickles(directory)
+    saveBundle(path, attrs={'numStates': int(model['numStates'])},
+               occuList=list(model['occuList']),
+               stationary_dist=model['stationary_dist'],
+               rateMatrix=scipy.sparse.csr_matrix(model['rateMatrix']),
+               committor=model['committor'], positions=model['positions'],
+               major_flux=scipy.sparse.csr_matrix(model['major_flux']))
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Convert the pickles of condition directories into '
+                    'model bundles.')
+    parser.add_argument('conditions', nargs='+',
+                        help='condition directories')
+    args = parser.parse_args(argv)
+    for directory in args.conditions:
+        print(convertCondition(directory))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+Transition counts and dwell statistics of discrete-state trajectories.
+
+These replace the notebook versions of ``countMatrix``, ``ProbMatrix`` and
+``stateDurations`` that walk the trajectory frame by frame. A trajectory is
+an integer array of states; every function also takes a list of them.
+"""
+
+import numpy as np
+import scipy.sparse
+
+# above this many (i, j)-pairs counting sorts instead of using a dense bincount
+DENSE_PAIRS = 2**22
+
+
+def asTrajectories(trajs):
+    """
+    Helper function to accept a single trajectory or a list of them.
+
+    Parameters
+    ----------
+    trajs : array like (steps,) or list of array like
+        Discrete-state trajectories.
+
+    Returns
+    -------
+    trajs : list of numpy arrays of int
+
+    """
+    if isinstance(trajs, np.ndarray) and trajs.ndim == 1:
+        return [trajs]
+    if isinstance(trajs, (list, tuple)) and len(trajs) \
+            and np.ndim(trajs[0]) == 0:
+        return [np.asarray(trajs)]
+    return [np.asarray(traj) for traj in trajs]
+
+
+def countPairs(uniqueStates, starts, ends):
+    """
+    Helper function to count (i, j)-pairs into a sparse matrix.
+
+    Parameters
+    ----------
+    uniqueStates : int
+        The number of states.
+    starts, ends : numpy array of int (pairs,)
+        The states at time t and t + lagtime.
+
+    Returns
+    -------
+    counts : scipy.sparse.csr_matrix (uniqueStates, uniqueStates)
+
+    """
+    codes = starts.astype(np.int64) * uniqueStates + ends
+    if uniqueStates**2 <= DENSE_PAIRS:
+        counts = np.bincount(codes, minlength=uniqueStates**2)
+        return scipy.sparse.csr_matrix(counts.reshape(uniqueStates,
+                                                      uniqueStates))
+    codes, counts = np.unique(codes, return_counts=True)
+    return scipy.sparse.csr_matrix(
+        (counts, (codes // uniqueStates, codes % uniqueStates)),
+        shape=(uniqueStates, uniqueStates))
+
+
+def pairValues(matrix, starts, ends):
+    """
+    Helper function to look up matrix[starts, ends] for many pairs at once in
+    a sparse matrix, e.g. the conduction label of every jump.
+
+    Parameters
+    ----------
+    matrix : scipy sparse matrix (states, states)
+        The lookup table, missing entries count as 0.
+    starts, ends : numpy array of int (pairs,)
+        The (i, j)-pairs.
+
+    Returns
+    -------
+    values : numpy array (pairs,)
+
+    """
+    matrix = scipy.sparse.csr_matrix(matrix)
+    matrix.sort_indices()
+    numStates = matrix.shape[1]
+    rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+    keys = rows.astype(np.int64) * numStates + matrix.indices
+    codes = np.asarray(starts, dtype=np.int64) * numStates + ends
+    if not keys.shape[0]:
+        return np.zeros(codes.shape, dtype=matrix.dtype)
+    pos = np.minimum(np.searchsorted(keys, codes), keys.shape[0] - 1)
+    return np.where(keys[pos] == codes, matrix.data[pos], 0)
+
+
+def countMatrix(uniqueStates, trajs, lagtime=1, includeSelf=False):
+    """
+    returns count matrix where element i,j is the counts
+    of i to j jumps
+
+    Parameters
+    ----------
+    uniqueStates : int
+        The number of states.
+    trajs : array like (steps,) or list of array like
+        One or more discrete-state trajectories.
+    lagtime : int or list of int, optional
+        Lag time(s) in frames, counted with a sliding window, each at
+        least 1. The default is 1.
+    includeSelf : bool, optional
+        Count i -> i pairs as well. The default is False, as in the
+        notebook version.
+
+    Returns
+    -------
+    counts : scipy.sparse.csr_matrix (uniqueStates, uniqueStates)
+        The counts summed over all trajectories. A list of lag times gives
+        a list of count matrices, one per lag time.
+
+    """
+    trajs = asTrajectories(trajs)
+    lagtimes = np.atleast_1d(lagtime)
+    if not np.issubdtype(lagtimes.dtype, np.integer) or np.any(lagtimes < 1):
+        raise ValueError(f'lag times must be integers of at least 1 frame, '
+                         f'got {lagtime}')
+    result = []
+    for lag in lagtimes:
+        starts = np.concatenate([traj[:-lag] for traj in trajs])
+        ends = np.concatenate([traj[lag:] for traj in trajs])
+        counts = countPairs(uniqueStates, starts, ends)
+        if not includeSelf:
+            counts.setdiag(0)
+        counts.eliminate_zeros()
+        result.append(counts)
+    return result[0] if np.ndim(lagtime) == 0 else result
+
+
+def ProbMatrix(uniqueStates, trajs, lagtime=1, includeSelf=False):
+    """
+    Returns a sparse matrix of shape (uniqueStates, uniqueStates)
+    where elements i,j are the probabilities of jump from i to j
+
+    Parameters
+    ----------
+    uniqueStates : int
+        The number of states.
+    trajs : array like (steps,) or list of array like
+        One or more discrete-state trajectories.
+    lagtime : int or list of int, optional
+        Lag time(s) in frames. The default is 1.
+    includeSelf : bool, optional
+        Passed to ``countMatrix``. The default is False.
+
+    Returns
+    -------
+    probs : scipy.sparse.csr_matrix (uniqueStates, uniqueStates)
+        The row-normalized counts, rows without counts stay zero. A list of
+        lag times gives a list of matrices.
+
+    """
+    counts = countMatrix(uniqueStates, trajs, lagtime=lagtime,
+                         includeSelf=includeSelf)
+    result = []
+    for countMat in ([counts] if np.ndim(lagtime) == 0 else counts):
+        countSum = np.asarray(countMat.sum(axis=1)).ravel()
+        invCountSum = np.divide(1, countSum, out=np.zeros(uniqueStates),
+                                where=countSum > 0)
+        result.append(scipy.sparse.csr_matrix(
+            scipy.sparse.diags(invCountSum) @ countMat))
+    return result[0] if np.ndim(lagtime) == 0 else result
+
+
+def runLengths(traj, includeLast=False):
+    """
+    Helper function for the run-length encoding of a trajectory.
+
+    Parameters
+    ----------
+    traj : numpy array of int (steps,)
+        A discrete-state trajectory.
+    includeLast : bool, optional
+        Also return the final run, which is cut off by the end of the
+        trajectory. The default is False.
+
+    Returns
+    -------
+    states : numpy array of int (runs,)
+        The state of each run.
+    lengths : numpy array of int (runs,)
+        The number of frames of each run.
+
+    """
+    ends = np.flatnonzero(traj[1:] != traj[:-1]) + 1 # first frame of next run
+    if includeLast and traj.shape[0]:
+        ends = np.append(ends, traj.shape[0])
+    lengths = np.diff(ends, prepend=0)
+    return (traj[ends - 1], lengths)
+
+
+def stateDurations(uniqueStates, trajs, includeLast=False):
+    """
+    returns the durations spent in each state from the
+    discrete time discrete state trajectory
+
+    Parameters
+    ----------
+    uniqueStates : int
+        The number of states.
+    trajs : array like (steps,) or list of array like
+        One or more discrete-state trajectories.
+    includeLast : bool, optional
+        Keep the final, cut off, run of every trajectory. The default is
+        False, as in the notebook version.
+
+    Returns
+    -------
+    durations : numpy array of int (runs,)
+        All run lengths in frames, grouped by state.
+    offsets : numpy array of int (uniqueStates + 1,)
+        The durations of state i are ``durations[offsets[i]:offsets[i+1]]``.
+
+    """
+    runs = [runLengths(traj, includeLast=includeLast)
+            for traj in asTrajectories(trajs)]
+    states = np.concatenate([run[0] for run in runs]).astype(np.int64)
+    lengths = np.concatenate([run[1] for run in runs])
+    order = np.argsort(states, kind='stable')
+    offsets = np.concatenate(
+        ([0], np.cumsum(np.bincount(states, minlength=uniqueStates))))
+    return (lengths[order], offsets)
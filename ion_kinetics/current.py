@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+Ionic current from conduction events along a trajectory.
+
+asep_model.ipynb calls ``isConduction`` for every consecutive pair of a
+trajectory. ``ConductionTrace`` looks up the net charge of all jumps at
+once in a sparse conduction table (``conductionMatrix`` or
+``Microstates.conductions``) and keeps only the jumps that carry charge,
+from which the cumulative conductions, the current per time window and a
+block-averaged current with its error are computed.
+
+Both trajectory layouts of ``ion_kinetics.streaming`` are understood: an
+integer array of states from ``MSM.simulate`` (one frame per timestep) and
+the (time, State) rows of ``monteCarloSim``, where a jump happens at the
+end of every dwell.
+"""
+
+import numpy as np
+
+from .counting import pairValues
+
+
+class ConductionTrace:
+    """
+    The conduction events of one trajectory.
+
+    Parameters
+    ----------
+    traj : numpy array (steps,) or (steps, 2)
+        Discrete-time states or continuous-time (time, State) rows.
+    conductions : scipy sparse matrix (states, states)
+        Net charge carried by every i -> j jump.
+    timestep : float, optional
+        Time per frame of discrete-time trajectories. The default is 1.
+
+    Attributes
+    ----------
+    times : numpy array (events,)
+        The time of every jump that carries charge.
+    charges : numpy array (events,)
+        Its net charge.
+    totalTime : float
+        The length of the trajectory, steps * timestep or the summed
+        dwells, as in ``StreamingAnalysis``.
+
+    """
+
+    def __init__(self, traj, conductions, timestep=1.0):
+        traj = np.asarray(traj)
+        if traj.ndim == 2:
+            dwells, states = traj[:, 0], traj[:, 1].astype(np.int64)
+            jumpTimes = np.cumsum(dwells)[:-1] # end of every dwell but the last
+            self.totalTime = float(dwells.sum())
+        else:
+            states = traj.astype(np.int64)
+            jumpTimes = timestep * np.arange(1, states.shape[0])
+            self.totalTime = float(timestep * states.shape[0])
+        charges = pairValues(conductions, states[:-1], states[1:])
+        events = charges != 0
+        self.times = jumpTimes[events]
+        self.charges = charges[events]
+
+    @property
+    def netConductions(self):
+        return self.charges.sum()
+
+    def current(self):
+        """
+        Returns the mean current, net conductions per unit time.
+        """
+        return self.netConductions / self.totalTime
+
+    def cumulative(self):
+        """
+        Function for the running count of net conductions.
+
+        Returns
+        -------
+        times : numpy array (events,)
+            The event times.
+        netConductions : numpy array (events,)
+            The net conductions up to and including each event.
+
+        """
+        return (self.times, np.cumsum(self.charges))
+
+    def windowed(self, window):
+        """
+        Function for the current in consecutive time windows.
+
+        Parameters
+        ----------
+        window : float
+            The window length. A last, partial window is dropped.
+
+        Returns
+        -------
+        starts : numpy array (windows,)
+            The start time of every window.
+        current : numpy array (windows,)
+            Net conductions in the window divided by its length.
+
+        """
+        numWindows = int(self.totalTime // window)
+        index = (self.times // window).astype(np.int64)
+        inside = index < numWindows
+        counts = np.bincount(index[inside], weights=self.charges[inside],
+                             minlength=numWindows)
+        return (window * np.arange(numWindows), counts / window)
+
+    def blockAverage(self, numBlocks=10):
+        """
+        Function for the current with a block-averaged standard error: the
+        trajectory is cut into numBlocks blocks of equal time and the spread
+        of their currents gives the error of the mean.
+
+        Parameters
+        ----------
+        numBlocks : int, optional
+            The number of blocks. The default is 10.
+
+        Returns
+        -------
+        current : float
+            The mean current over the whole trajectory.
+        error : float
+            The standard error of the mean, nan for a single block.
+        blockCurrents : numpy array (numBlocks,)
+
+        """
+        blockLength = self.totalTime / numBlocks
+        index = np.minimum((self.times // blockLength).astype(np.int64),
+                           numBlocks - 1)
+        blockCurrents = np.bincount(index, weights=self.charges,
+                                    minlength=numBlocks) / blockLength
+        if numBlocks > 1:
+            error = blockCurrents.std(ddof=1) / np.sqrt(numBlocks)
+        else:
+            error = np.nan
+        return (self.current(), error, blockCurrents)
+
+
+def ionicCurrent(traj, conductions, timestep=1.0, numBlocks=10):
+    """
+    Function for the mean current of a trajectory and its block-averaged
+    error, see ``ConductionTrace.blockAverage``.
+
+    Parameters
+    ----------
+    traj : numpy array (steps,) or (steps, 2)
+        Discrete-time states or continuous-time (time, State) rows.
+    conductions : scipy sparse matrix (states, states)
+        Net charge carried by every i -> j jump.
+    timestep : float, optional
+        Time per frame of discrete-time trajectories. The default is 1.
+    numBlocks : int, optional
+        The number of blocks. The default is 10.
+
+    Returns
+    -------
+    current : float
+    error : float
+
+    """
+    current, error, blockCurrents = ConductionTrace(
+        traj, conductions, timestep=timestep).blockAverage(numBlocks)
+    return (current, error)
@@ -0,0 +1,1117 @@
+# -*- coding: utf-8 -*-
+"""
+Drawing of rate networks and filter occupancies.
+
+The functions draw with the primitives of the Simple Inkscape Scripting
+extension (``circle``, ``connector``, ``group``, ``layer``, ``marker``,
+``all_shapes``, the path commands, ...). Which implementation of these is
+used is chosen with ``useBackend``: the ``globals()`` of a simple-script
+draw into the open Inkscape document (see network_v2.1.2.py), an
+``SVGDocument`` from ``ion_kinetics.svg`` draws without Inkscape.
+
+``network`` reports the time and counters of its stages to a collector of
+``ion_kinetics.instrument`` and logs every edge at the DEBUG level of the
+``ion_kinetics.drawing`` logger.
+"""
+
+import logging
+import sys
+
+import numpy as np
+
+from .instrument import NullCollector
+from .layout import layout
+
+logger = logging.getLogger(__name__)
+
+# the drawing primitives a backend has to provide
+PRIMITIVES = ('circle', 'ellipse', 'path', 'text', 'group', 'layer', 'marker',
+              'connector', 'clone', 'all_shapes', 'Move', 'Line', 'Curve',
+              'Horz', 'Vert', 'ZoneClose', 'move', 'curve', 'inkex')
+
+markerDefs = {} # (awheadType, fill, ref, orient) -> marker, filled on first use
+glyphDefs = {} # glyph name -> definition shared by all its clones
+
+
+def useBackend(backend):
+    """
+    Function to choose where the drawing functions draw. Starts a new
+    document, i.e., the shared markers and glyphs are defined again.
+
+    Parameters
+    ----------
+    backend : dict or object
+        Provides the primitives listed in ``PRIMITIVES``, either the
+        ``globals()`` of a simple-script running in Inkscape or an
+        ``SVGDocument``.
+
+    Returns
+    -------
+    None.
+
+    """
+    for name in PRIMITIVES:
+        if isinstance(backend, dict):
+            globals()[name] = backend.get(name)
+        else:
+            globals()[name] = getattr(backend, name, None)
+    markerDefs.clear()
+    glyphDefs.clear()
+
+
+def network(states, prob, coords, adjacencyMatrix, 
+            circleSize=6, circleAlpha=1, fontSize=2.5,
+            awheadType=0, colorInto='#000000', colorOut='#000000', colorSelf='#000000',
+            collector=None, layoutOptions=None):
+    """
+    Function to draw nodes and attach connections between those nodes based
+    on the adjacencyMatrix.
+
+    Parameters
+    ----------
+    states : int or list or numpy array, (states,)
+        The number of nodes to draw.
+    prob : numpy array (states,)
+        The probabilities of each state/node.
+    coords : numpy array (states, 2) or (2, states), or str
+        The node positions, or the ``layout`` method ('spectral', 'force'
+        or 'layered') to compute them from the adjacencyMatrix. 'layered'
+        needs layers or occupancies in layoutOptions.
+    adjacencyMatrix : numpy array or scipy sparse matrix (states, states)
+        The connection matrix of the (i,j)-pairs, e.g.
+        ``BlockNetwork.adjacency()``.
+    circleSize : TYPE, optional
+        DESCRIPTION. The default is 6.
+    circleAlpha : TYPE, optional
+        DESCRIPTION. The default is 1.
+    fontSize : TYPE, optional
+        DESCRIPTION. The default is 2.5.
+    awheadType : TYPE, optional
+        DESCRIPTION. The default is 0.
+    colorInto : TYPE, optional
+        DESCRIPTION. The default is '#000000'.
+    colorOut : TYPE, optional
+        DESCRIPTION. The default is '#000000'.
+    colorSelf : TYPE, optional
+        DESCRIPTION. The default is '#000000'.
+    collector : NullCollector, optional
+        Receives the elapsed time and counters of the 'layout', 'circles',
+        'borders', 'connectors' and 'layers' stages, e.g. a
+        ``MemoryCollector``. The default is None, drop them.
+    layoutOptions : dict, optional
+        Keywords of ``layout`` when coords is a method, e.g.
+        {'occupancies': occuList} or {'seed': 1}. The default is None.
+
+    Returns
+    -------
+    scene : NetworkScene
+        The drawn network, unpacks as ``Layers, objs``, the list of layer
+        objects and the list of node groups.
+
+    """
+    if collector is None:
+        collector = NullCollector()
+    if isinstance(coords, str):
+        with collector.stage('layout', method=coords):
+            coords = layout(adjacencyMatrix, method=coords,
+                            **(layoutOptions or {}))
+    if isinstance(states, list) or isinstance(states, np.ndarray):
+        numStates = len(states)
+    else:
+        numStates = states
+    logger.debug('network of %d states, coords %s', numStates, coords.shape)
+    with collector.stage('circles', nodes=numStates):
+        objs = drawCircles(states, prob, coords, circleSize=circleSize,
+                           fs=fontSize, alpha=circleAlpha) # a list of group
+                                                           # objects
+    states = numStates
+    circleSize = np.broadcast_to(circleSize, (states,))
+    if coords.shape == (states, 2):
+        x_pos = coords[:, 0]
+        y_pos = coords[:, 1]
+    elif coords.shape == (2, states):
+        x_pos = coords[0]
+        y_pos = coords[1]
+    x, y, strokeScales = matrixEntries(adjacencyMatrix) # make connection 
+                                                          # between pairs that 
+                                                          # are defined in matrix
+    scene = NetworkScene(objs, x_pos, y_pos, circleSize, awheadType=awheadType,
+                         colorInto=colorInto, colorOut=colorOut,
+                         colorSelf=colorSelf, collector=collector)
+    conList = scene.drawEdges(x, y, strokeScales) # connections per i state
+    # perform the layering
+    Layers = []
+    with collector.stage('layers') as counts:
+        for i, obj in enumerate(objs): # only the node groups of this network
+            newLayer = layer(f'State {i}')
+            newLayer.append(obj)
+            Layers.append(newLayer) # add all layers to the list whose
+                                    # index is related to the state index
+            if len(conList[i]):
+                # only appends the arrows to this layer if this state has
+                # connections
+                for con in conList[i]:
+                    newLayer.append(con)
+        counts['layers'] = len(Layers)
+    scene.layers = Layers
+    return scene
+
+def isSparse(matrix):
+    """
+    Helper function to test for a scipy sparse matrix without importing
+    scipy, which the Python of Inkscape usually lacks. A sparse matrix
+    can only exist if scipy.sparse has been imported already.
+    """
+    sparse = sys.modules.get('scipy.sparse')
+    return sparse is not None and sparse.issparse(matrix)
+
+def matrixEntries(matrix):
+    """
+    Helper function for the non-zero (i, j)-pairs of a dense or sparse
+    matrix in row order, as ``np.where``.
+
+    Returns
+    -------
+    x, y : numpy array of int (pairs,)
+    values : numpy array (pairs,)
+
+    """
+    if isSparse(matrix):
+        # only the stored entries are visited
+        matrix = matrix.tocsr(copy=True)
+        matrix.sort_indices()
+        matrix.eliminate_zeros()
+        matrix = matrix.tocoo()
+        return (matrix.row, matrix.col, matrix.data)
+    matrix = np.asarray(matrix)
+    x, y = np.where(matrix != 0)
+    return (x, y, matrix[x, y])
+
+class NetworkScene:
+    """
+    A drawn network as returned by ``network``. It keeps the node groups,
+    their layers, the hidden border circles and the connection of every
+    (i,j)-pair, so that new weights, colors or edges only touch the
+    objects that change. Unpacks as ``Layers, objs``.
+
+    Attributes
+    ----------
+    objs : list
+        The node group objects.
+    layers : list
+        The layer of every node, holding its group and outgoing arrows.
+    edges : dict
+        (i, j) -> [connection, strokeScale, indexi, indexj], the indices
+        being the border circles in the node groups.
+    weights : dict
+        (i, j) -> strokeScale of every known pair, drawn or not.
+    collector : NullCollector
+        Receives the 'borders' and 'connectors' stages of every
+        ``drawEdges``, also the ones of later updates.
+
+    """
+
+    def __init__(self, objs, x_pos, y_pos, circleSize, awheadType=0,
+                 colorInto='#000000', colorOut='#000000',
+                 colorSelf='#000000', collector=None):
+        self.objs = objs
+        self.layers = []
+        self.x_pos = x_pos
+        self.y_pos = y_pos
+        self.circleSize = circleSize
+        self.awheadType = awheadType
+        self.colors = (colorInto, colorOut, colorSelf)
+        self.collector = collector if collector is not None \
+            else NullCollector()
+        self.borders = [{} for obj in objs] # index in group -> border radius
+        self.edges = {}
+        self.weights = {}
+        self.hidden = set() # pairs taken out with removeEdges
+        self.fills = [None] * len(objs)
+
+    def __iter__(self):
+        return iter((self.layers, self.objs))
+
+    def endRadii(self, x, y, strokeScales):
+        """
+        Helper function for the border radius each connection wants at both
+        of its ends.
+        """
+        desiredCSi = self.circleSize[x] + 0.8
+        desiredCSj = self.circleSize[y] + 0.8 + (strokeScales / 0.1) * 0.3 # the 
+                                                                # offest is 
+                                                                # based on the 
+                                                                # length from the 
+                                                                # placement of 
+                                                                # arrow head on 
+                                                                # the line to 
+                                                                # the tip
+        return (desiredCSi, desiredCSj)
+
+    def borderIndices(self, nodes, radii, tols):
+        """
+        Helper function returning the border circle of each connection end.
+        Existing borders within the tolerance are reused, the remaining ends
+        are clustered by ``borderClusters`` with one new circle per cluster.
+        """
+        ends = np.full(len(nodes), -1)
+        if any(self.borders):
+            for k, (node, r, tol) in enumerate(zip(nodes.tolist(),
+                                                   radii.tolist(),
+                                                   tols.tolist())):
+                if self.borders[node]:
+                    index, radius = min(self.borders[node].items(),
+                                        key=lambda b: abs(b[1] - r))
+                    if abs(radius - r) / r <= tol:
+                        ends[k] = index
+        new = ends < 0
+        labels, borderNodes, borderRadii = borderClusters(nodes[new],
+                                                          radii[new], tols[new])
+        # exactly one hidden border circle per cluster
+        borderIndex = np.empty(len(borderNodes), dtype=int)
+        for k, (node, radius) in enumerate(zip(borderNodes, borderRadii)):
+            newCircle = circle((self.x_pos[node], self.y_pos[node]), radius,
+                               conn_avoid=False, display='none', stroke='none')
+            self.objs[node].append(newCircle)
+            borderIndex[k] = len(self.objs[node]) - 1 # location of new circle
+                                                      # in group
+            self.borders[node][borderIndex[k]] = radius
+        ends[new] = borderIndex[labels]
+        logger.debug('%d connection ends, %d new border circles', len(nodes),
+                     len(borderNodes))
+        return ends
+
+    def drawEdges(self, x, y, strokeScales):
+        """
+        Function to draw the connections of (i,j)-pairs.
+
+        Parameters
+        ----------
+        x, y : numpy array of int (pairs,)
+            The start and end nodes.
+        strokeScales : numpy array (pairs,)
+            The stroke widths.
+
+        Returns
+        -------
+        conList : list
+            The new connections of each node i.
+
+        """
+        x, y = np.asarray(x, dtype=int), np.asarray(y, dtype=int)
+        strokeScales = np.asarray(strokeScales, dtype=float)
+        conList = [[] for obj in self.objs]
+        if not len(x):
+            return conList
+        selfCon = x == y # self connections only use a border at the i end
+        desiredCSi, desiredCSj = self.endRadii(x, y, strokeScales)
+        nodes = np.concatenate((x, y[~selfCon]))
+        radii = np.concatenate((desiredCSi, desiredCSj[~selfCon]))
+        tols = np.concatenate((np.full(x.shape, 0.22), 
+                               np.full(np.sum(~selfCon), 0.09)))
+        with self.collector.stage('borders', ends=len(nodes)) as counts:
+            numBorders = sum(len(b) for b in self.borders)
+            ends = self.borderIndices(nodes, radii, tols)
+            counts['hidden'] = sum(len(b) for b in self.borders) - numBorders
+        indicesi = ends[:len(x)]
+        indicesj = np.zeros(len(x), dtype=int)
+        indicesj[~selfCon] = ends[len(x):]
+        debug = logger.isEnabledFor(logging.DEBUG) # checked once, not per edge
+        with self.collector.stage('connectors', edges=len(x)) as counts:
+            markers = len(markerDefs)
+            for i, j, strokeScale, indexi, indexj in zip(
+                    x.tolist(), y.tolist(), strokeScales.tolist(),
+                    indicesi.tolist(), indicesj.tolist()):
+                if debug:
+                    logger.debug('edge %d -> %d: group sizes %d %d, borders '
+                                 '%d %d', i, j, len(self.objs[i]),
+                                 len(self.objs[j]), indexi, indexj)
+                con = self.drawEdge(i, j, strokeScale, indexi, indexj)
+                conList[i].append(con) # one connection arrow is added to each
+                                       # i state to its j state pair
+                if self.layers:
+                    self.layers[i].append(con)
+            counts['markers'] = len(markerDefs) - markers
+        return conList
+
+    def drawEdge(self, i, j, strokeScale, indexi, indexj):
+        """
+        Helper function to draw and register one connection.
+        """
+        colorInto, colorOut, colorSelf = self.colors
+        objs = self.objs
+        # curve = ['polyline', 'polyline', 'orthogonal']
+        # strenght = [0, 25, 50, 75, 100]
+        if i < j:
+            # out of state
+            con = drawConnections(objs[i][indexi], objs[j][indexj],
+                                  strokeScale=strokeScale,
+                                  awheadType=self.awheadType, 
+                                  c=colorOut, alpha=0.5, 
+                                  curveType='polyline',
+                                  curveStrength=0)
+        elif i > j:
+            # into state
+            con = drawConnections(objs[i][indexi], objs[j][indexj],
+                                  strokeScale=strokeScale,
+                                  awheadType=self.awheadType,
+                                  c=colorInto, alpha=0.5, 
+                                  curveType='polyline',
+                                  curveStrength=0)
+        else:
+            con = drawConnections(objs[i][0], objs[j][indexi], 
+                                  strokeScale=strokeScale,
+                                  awheadType=self.awheadType,
+                                  c=colorSelf, alpha=0.5, 
+                                  curveType='polyline', 
+                                  curveStrength=0)
+        self.edges[(i, j)] = [con, strokeScale, indexi, indexj]
+        self.weights[(i, j)] = strokeScale
+        return con
+
+    def drawPairs(self, pairs):
+        """
+        Helper function to draw the known weights of a list of pairs.
+        """
+        if not pairs:
+            return
+        x, y = (np.array(p) for p in zip(*pairs))
+        self.drawEdges(x, y, np.array([self.weights[p] for p in pairs]))
+
+    def erasePairs(self, pairs):
+        """
+        Helper function to delete the connections of a list of pairs.
+        """
+        for pair in pairs:
+            self.edges.pop(pair)[0].remove()
+
+    def updateEdgeWeights(self, adjacencyMatrix):
+        """
+        Function to change the connection widths to a new matrix. Changed
+        widths are restyled in place, a connection is only redrawn when its
+        arrow head no longer fits its border circle. Pairs that became zero
+        are deleted and new pairs are drawn, except the ones taken out with
+        ``removeEdges``.
+
+        Parameters
+        ----------
+        adjacencyMatrix : numpy array or scipy sparse matrix (states, states)
+            The new connection matrix.
+
+        Returns
+        -------
+        self : NetworkScene
+
+        """
+        x, y, strokeScales = matrixEntries(adjacencyMatrix)
+        self.weights = dict(zip(zip(x.tolist(), y.tolist()),
+                                strokeScales.tolist()))
+        self.erasePairs([p for p in self.edges if p not in self.weights])
+        redraw = []
+        for pair, strokeScale in self.weights.items():
+            if pair in self.hidden:
+                continue
+            if pair not in self.edges:
+                redraw.append(pair)
+                continue
+            edge = self.edges[pair]
+            if edge[1] == strokeScale:
+                continue
+            i, j = pair
+            desiredCSj = self.endRadii(i, j, strokeScale)[1]
+            if i != j and abs(self.borders[j][edge[3]] - desiredCSj) \
+                    / desiredCSj > 0.09:
+                redraw.append(pair)
+                continue
+            edge[0].style(stroke_width=strokeScale)
+            edge[1] = strokeScale
+        self.erasePairs([p for p in redraw if p in self.edges])
+        self.drawPairs(redraw)
+        return self
+
+    def removeEdges(self, mask):
+        """
+        Function to delete the drawn connections where mask is True.
+
+        Parameters
+        ----------
+        mask : numpy array or scipy sparse matrix of bool (states, states)
+
+        Returns
+        -------
+        self : NetworkScene
+
+        """
+        x, y, values = matrixEntries(mask)
+        pairs = set(zip(x.tolist(), y.tolist()))
+        self.hidden |= pairs
+        self.erasePairs([p for p in pairs if p in self.edges])
+        return self
+
+    def addEdges(self, mask):
+        """
+        Function to draw the known, not yet drawn, connections where mask is
+        True, e.g. to bring back ones taken out with ``removeEdges``.
+
+        Parameters
+        ----------
+        mask : numpy array or scipy sparse matrix of bool (states, states)
+
+        Returns
+        -------
+        self : NetworkScene
+
+        """
+        x, y, values = matrixEntries(mask)
+        pairs = set(zip(x.tolist(), y.tolist()))
+        self.hidden -= pairs
+        self.drawPairs(sorted(p for p in pairs if p in self.weights
+                              and p not in self.edges))
+        return self
+
+    def restyleNodes(self, colors, stroke='#000000'):
+        """
+        Function to change the node fill colors, only nodes whose color
+        changes are touched.
+
+        Parameters
+        ----------
+        colors : list of str or dict
+            A color per node, or {node: color}.
+        stroke : str, optional
+            The circle stroke color. The default is '#000000'.
+
+        Returns
+        -------
+        self : NetworkScene
+
+        """
+        if not isinstance(colors, dict):
+            colors = dict(enumerate(colors))
+        for i, color in colors.items():
+            if self.fills[i] != color:
+                self.objs[i][0].style(stroke=stroke, fill=color)
+                self.fills[i] = color
+        return self
+
+def colormap(values, colors=('#ff0000', '#ffffff', '#0000ff'), vmin=None,
+             vmax=None):
+    """
+    Function to map values onto colors, linearly between evenly spaced
+    color stops, e.g. committors from red (0) over white to blue (1).
+
+    Parameters
+    ----------
+    values : numpy array (nodes,)
+        The values, e.g. committors or fluxes.
+    colors : list of str, optional
+        The color stops as '#rrggbb'. The default is red, white, blue.
+    vmin, vmax : float, optional
+        The values of the first and last stop. The default is None, the
+        minimum/maximum of values.
+
+    Returns
+    -------
+    colors : numpy array of str (nodes,)
+        The '#rrggbb' color of each value.
+
+    """
+    values = np.asarray(values, dtype=float)
+    vmin = values.min() if vmin is None else vmin
+    vmax = values.max() if vmax is None else vmax
+    scaled = np.clip((values - vmin) / ((vmax - vmin) or 1), 0, 1)
+    stops = np.array([[int(c[k:k + 2], 16) for k in (1, 3, 5)]
+                      for c in colors], dtype=float)
+    where = np.linspace(0, 1, len(colors))
+    rgb = np.stack([np.interp(scaled, where, stops[:, k]) for k in range(3)],
+                   axis=-1)
+    rgb = np.rint(rgb).astype(int)
+    hexTable = np.array([f'{k:02x}' for k in range(256)])
+    return np.char.add(np.char.add(np.char.add('#', hexTable[rgb[..., 0]]),
+                                   hexTable[rgb[..., 1]]),
+                       hexTable[rgb[..., 2]])
+
+def borderClusters(nodes, radii, tols):
+    """
+    Helper function to group the border radii wanted by the connections of
+    each node, so that connections of similar size share one border circle.
+
+    Parameters
+    ----------
+    nodes : numpy array (ends,)
+        The node of each connection end.
+    radii : numpy array (ends,)
+        The desired border radius of each connection end.
+    tols : numpy array (ends,)
+        The relative radius difference each end accepts, 0.22 for the
+        start of an arrow and 0.09 for the arrow head.
+
+    Returns
+    -------
+    labels : numpy array (ends,)
+        The cluster of each connection end.
+    clusterNodes : list
+        The node of each cluster.
+    clusterRadii : list
+        The border radius of each cluster.
+
+    """
+    labels = np.empty(len(nodes), dtype=int)
+    clusterNodes = []
+    clusterRadii = []
+    # every end accepts a border radius in [r (1 - tol), r (1 + tol)], walking
+    # the radii of a node in increasing order a new border is only needed once
+    # this range no longer overlaps the one shared by the current cluster
+    order = np.lexsort((radii, nodes))
+    lows = radii * (1 - tols)
+    highs = radii * (1 + tols)
+    lo = hi = 0
+    for k, node, low, high in zip(order.tolist(), nodes[order].tolist(),
+                                  lows[order].tolist(), highs[order].tolist()):
+        if not clusterNodes or clusterNodes[-1] != node or low > hi:
+            if clusterNodes:
+                clusterRadii.append((lo + hi) / 2)
+            clusterNodes.append(node)
+            lo, hi = low, high
+        else:
+            lo, hi = max(lo, low), min(hi, high)
+        labels[k] = len(clusterNodes) - 1
+    if clusterNodes:
+        clusterRadii.append((lo + hi) / 2)
+    return (labels, clusterNodes, clusterRadii)
+
+def drawConnections(obj1, obj2, strokeScale, awheadType=1, c='#000000', 
+                    alpha=1, curveType='orthogonal', curveStrength=0):
+    """
+    Helper function to add connection between two nodes
+    Parameters
+    ----------
+    obj1 : TYPE
+        DESCRIPTION.
+    obj2 : TYPE
+        DESCRIPTION.
+    strokeScale : TYPE
+        DESCRIPTION.
+    awheadType : TYPE, optional
+        DESCRIPTION. The default is 1.
+    c : TYPE, optional
+        DESCRIPTION. The default is '#000000'.
+    alpha : TYPE, optional
+        DESCRIPTION. The default is 1.
+    curveType : str
+        Either 'orthogonal' or 'polyline'.
+    curveStrength : float
+        Strenght of curving from 0 to 100.
+
+    Returns
+    -------
+    obj : Object
+        The Arrow object.
+
+    """
+    # the marker is shared by every connection with the same arrow head
+    m = arrowMarker(awheadType)
+    obj = connector(obj2, obj1, ctype=curveType, curve=curveStrength, 
+                    stroke_width=strokeScale, 
+                    stroke_linecap='round', marker_start=m, spacing=1,
+                    stroke=c, stroke_opacity=alpha, opacity=alpha)
+    return obj
+
+
+def selfArrow(strokeScale, awheadType=1, c='#000000', alpha=1):
+    """
+        Helper function for drawing a self-arrow transition
+        returns - Arrow Object
+    """
+    # Not setup to snap to the node
+    # Also the arrow needs adjusting
+    m = arrowMarker(awheadType, fill=c)
+    obj = path([move(46.324845, 39.430272), 
+                curve(0.0, 0.0, 9.772666, -18.193303, 20.767921, -11.398013), 
+                curve(10.995255, 6.795289, -2.788919, 22.155939, -2.788919, 
+                      22.155939)], opacity=alpha, stroke_width=strokeScale,
+               stroke_linecap='round', stroke_opacity=alpha, marker_start=m,
+               stroke=c)
+    return obj
+
+def arrowMarker(awheadType=1, fill=None, orient='auto-start-reverse'):
+    """
+    Helper function returning the marker of an arrow head. Each marker is only
+    defined once per document and is reused by all later connections.
+
+    Parameters
+    ----------
+    awheadType : int, optional
+        0 for the pointy and 1 for the rounded arrow head. The default is 1.
+    fill : str, optional
+        Fill color of the marker. The default is None, no fill set.
+    orient : str, optional
+        The marker orientation. The default is 'auto-start-reverse'.
+
+    Returns
+    -------
+    m : Marker
+        The shared marker object.
+
+    """
+    # there are two arrow head definitions, more can be added
+    if awheadType == 0:
+        ref = (1, 2)
+    else:
+        ref = (0, 0)
+    key = (awheadType, fill, ref, orient)
+    if key not in markerDefs:
+        if awheadType == 0:
+            arrowhead = pointyArrowHead()
+        else:
+            arrowhead = roundedArrowHead()
+        style = {} if fill is None else {'fill': fill}
+        markerDefs[key] = marker(arrowhead, ref=ref, orient=orient, **style)
+    return markerDefs[key]
+
+def pointyArrowHead():
+    """
+        Marker definition for Pointy arrow head
+        returns - object
+    """
+    arrowhead = path([Move(0, 0), Line(4, 2), Line(0, 4), 
+                      Curve(0, 4, 1, 3, 1, 2), Curve(1, 1, 0, 0, 0, 0), 
+                      ZoneClose()], overflow='visible', fill_rule='evenodd',
+                     fill='context-stroke', stroke='none')
+    return arrowhead
+    
+def roundedArrowHead():
+    """
+        Maker definition for rounded arrow head
+        returns - object
+    """
+    arrowhead = path([Move(5.77, 0.0), Line(-2.88, 5.0), Vert(-5.0), 
+                      ZoneClose()], transform='scale(0.5, 0.5)', 
+                     stroke='context-stroke', fill='context-stroke', 
+                     fill_rule='evenodd', stroke_width='1pt')
+    return arrowhead
+
+
+def drawCircles(states, prob, coords, circleSize=6, fs=1, alpha=1, 
+                strokeColor="#000000"):
+    """
+    Helper function for drawing the nodes on the canvas.
+    Arguments:
+
+    Parameters
+    ----------
+    states : TYPE
+        DESCRIPTION.
+    prob : TYPE
+        DESCRIPTION.
+    coords : numpy array (2,states) or (states, 2)
+        The node coordinates.
+    circleSize : TYPE, optional
+        DESCRIPTION. The default is 6.
+    fs : float, optional
+        The font size of the probability text. The default is 1.
+    alpha : TYPE, optional
+        DESCRIPTION. The default is 1.
+
+    Returns
+    -------
+    objs : List
+        List of group objects of length states.
+
+    """
+    if isinstance(circleSize, int) or isinstance(circleSize, list):
+        circleSize = np.ones(states) * circleSize
+    if isinstance(states, int):
+        numStates = states
+        states = np.ones(states) * states
+    else:
+        numStates = len(states)
+    if coords.shape == (numStates, 2):
+        x_pos = coords[:, 0]
+        y_pos = coords[:, 1]
+    elif coords.shape == (2, numStates):
+        x_pos = coords[0]
+        y_pos = coords[1]
+    objs = [] # add all the nodes to this list
+    # avoidSetting = [False, False, True, False, False]
+    for i in range(numStates):
+        # the circles are placed relative to the origin of the canvas, which
+        # can be changed with some simple inkscape property
+        c = circle((x_pos[i], y_pos[i]), circleSize[i], opacity=alpha, 
+                   stroke=strokeColor, stroke_width=0.3,
+                   conn_avoid=False, stroke_opacity=alpha)
+        # added offset to place the state number centered in circle
+        # could also use inkscapes shape_inside argument for text to be place
+        # inside the object, however I did not like how it looked
+        # the default font is Calibri
+        t1 = text(f'{states[i]}', (x_pos[i], y_pos[i] + 1.2), #shape_inside=c,
+                 font_size=f'{fs}pt', text_align='center', text_anchor='middle', 
+                 font_family='Calibri', _inkscape_font_specification='Calibri', 
+                 fill="#ffffff")
+        # added offset to place the probability of the state right below 
+        # the node
+        # also the font is set to be 20% smaller than the state font
+        # t2 = text(f'{prob[i]:.4f}', (x_pos[i], y_pos[i] + circleSize[i] + 2.3),
+        #           font_size=f'{fs * (1 - 0.4)}pt', text_align='center', 
+        #           text_anchor='middle', font_family='Calibri', 
+        #           _inkscape_font_specification='Calibri')
+        # g = group([c, t1, t2], conn_avoid=False)
+        g = group([c, t1], conn_avoid=False)
+        objs.append(g)
+    return objs
+
+def drawOccupancy(state):
+    """
+    Function for drawing a microstate from an occupancy list
+    Arguments:
+                       
+    Parameters
+    ----------
+    state : list
+        The occupancy list of tokens arranged in the S0-S4 direction.
+
+    Returns
+    -------
+    g : Group
+        A group of objects.
+
+    """
+    pot_coords = [(3.199, 2.0), (3.199, 3.602), (3.199, 5.493), 
+                  (3.199, 7.221), (3.199, 8.894), (3.199, 10.567), 
+                  (3.199, 12.455), (3.199, 14.343), (3.199, 16.5)]
+    wat_coords = [(2.883, 1.5), (2.883, 3.779), (2.883, 5.266), 
+                  (2.883, 7.399), (2.883, 8.748), (2.883, 10.701), 
+                  (2.883, 12.145), (2.883, 14.359), (2.883, 16.273)]
+    indices = np.arange(9) # likely faster than overwriting the above coords
+    if len(state) == 5:
+        # for occupancy lists following the 5-binding site convention
+        # i.e., no plannar binding sites
+        indices = indices[::2]
+    g = group([], conn_avoid=True) # to output a group of objects
+    sf = glyph('filter')
+    g.append(sf)
+    for index, token in zip(indices, state):
+        if token == 'K':
+            # then K+
+            pot = glyph('potassium')
+            pot.translate(pot_coords[index])
+            g.append(pot)
+        elif token == 'W':
+            # then water
+            wat = glyph('water')
+            wat.translate(wat_coords[index])
+            g.append(wat)
+    # group center (4.1785, 10.7195)
+    g.translate((-4.18, -10.72)) # re-center filter to origin of canvas
+                                 # simplifies the translations
+    return g
+
+def glyph(name):
+    """
+    Helper function returning a <use> instance of a filter, potassium or
+    water drawing. The drawing itself is only made once per document and
+    moved into the defs, so each occupancy diagram only adds light
+    references that are placed with their own transform.
+
+    Parameters
+    ----------
+    name : str
+        One of 'filter', 'potassium' or 'water'.
+
+    Returns
+    -------
+    obj : Clone
+        A new instance of the glyph.
+
+    """
+    if name not in glyphDefs:
+        draw = {'filter': drawFilter, 'potassium': drawPotassium,
+                'water': drawWater}[name]
+        obj = draw()
+        obj.to_def()
+        glyphDefs[name] = obj
+    return clone(glyphDefs[name])
+
+def drawFilter():
+    """
+        Helper function for drwaing an empty selectivity filter
+        returns - group of objects
+    """
+    path632 = path([Move(2.8297661, 6.5863575), Horz(4.7359046)], 
+                   fill='#bdbdbd', opacity=0.985507, fill_opacity=1, 
+                   fill_rule='evenodd', stroke_width=1, stroke_linecap='round',
+                   stroke_linejoin='round', stroke_miterlimit=6.1, 
+                   stroke_dasharray='none', stroke_opacity=1, 
+                   paint_order='stroke markers fill')
+    path633 = path([Move(2.8297661, 6.5863575), Horz(4.7359046)], 
+                   stroke='#ff0000', fill='#bdbdbd', opacity=0.985507, 
+                   fill_opacity=1, fill_rule='evenodd', stroke_width=0.600001, 
+                   stroke_linecap='round', stroke_linejoin='round', 
+                   stroke_miterlimit=6.1, stroke_dasharray='none', 
+                   stroke_opacity=1, paint_order='stroke markers fill')
+    g633 = group([path632, path633], transform='translate(0, 0.38959)')
+    path634 = path([Move(2.8297661, 6.5863575), Horz(4.7359046)], 
+                   fill='#bdbdbd', opacity=0.985507, fill_opacity=1, 
+                   fill_rule='evenodd', stroke_width=1, stroke_linecap='round',
+                   stroke_linejoin='round', stroke_miterlimit=6.1, 
+                   stroke_dasharray='none', stroke_opacity=1, 
+                   paint_order='stroke markers fill')
+    path635 = path([Move(2.8297661, 6.5863575), Horz(4.7359046)], 
+                   stroke='#ff0000', fill='#bdbdbd', opacity=0.985507, 
+                   fill_opacity=1, fill_rule='evenodd', stroke_width=0.600001, 
+                   stroke_linecap='round', stroke_linejoin='round', 
+                   stroke_miterlimit=6.1, stroke_dasharray='none', 
+                   stroke_opacity=1, paint_order='stroke markers fill')
+    g635 = group([path634, path635], transform='translate(4.83, 9.00387)')
+    path636 = path([Move(2.8297661, 6.5863575), Horz(4.7359046)], 
+                   fill='#bdbdbd', opacity=0.985507, fill_opacity=1, 
+                   fill_rule='evenodd', stroke_width=1, stroke_linecap='round', 
+                   stroke_linejoin='round', stroke_miterlimit=6.1, 
+                   stroke_dasharray='none', stroke_opacity=1, 
+                   paint_order='stroke markers fill')
+    path637 = path([Move(2.8297661, 6.5863575), Horz(4.7359046)], 
+                   stroke='#ff0000', fill='#bdbdbd', opacity=0.985507, 
+                   fill_opacity=1, fill_rule='evenodd', stroke_width=0.600001, 
+                   stroke_linecap='round', stroke_linejoin='round', 
+                   stroke_miterlimit=6.1, stroke_dasharray='none', 
+                   stroke_opacity=1, paint_order='stroke markers fill')
+    g637 = group([path636, path637], transform='translate(4.83, 13.6749)')
+    path638 = path([move(4.7359046, 25.596912), 
+                    inkex.paths.line(-0.9530694, 1.54825)], 
+                   stroke='#cfcfcf', fill='#bdbdbd', opacity=0.985507, 
+                   fill_opacity=1, fill_rule='evenodd', stroke_width=1, 
+                   stroke_linecap='round', stroke_linejoin='round', 
+                   stroke_miterlimit=6.1, stroke_dasharray='none', 
+                   stroke_opacity=1, paint_order='stroke markers fill')
+    path639 = path([move(4.7359046, 25.596912), 
+                    inkex.paths.line(-0.9530694, 1.54825)], stroke='#ffffff', 
+                   fill='#bdbdbd', opacity=0.985507, fill_opacity=1, 
+                   fill_rule='evenodd', stroke_width=0.6, 
+                   stroke_linecap='round', stroke_linejoin='round', 
+                   stroke_miterlimit=6.1, stroke_dasharray='none', 
+                   stroke_opacity=1, paint_order='stroke markers fill')
+    g639 = group([path638, path639], 
+                 transform='matrix(0.394101 -0.919067 0.919067 0.394101 -17.7319 19.8618)')
+    path640 = path([Move(2.8297661, 6.5863575), Horz(4.7359046)], 
+                   fill='#bdbdbd', opacity=0.985507, fill_opacity=1, 
+                   fill_rule='evenodd', stroke_width=1, 
+                   stroke_linecap='round', stroke_linejoin='round', 
+                   stroke_miterlimit=6.1, stroke_dasharray='none', 
+                   stroke_opacity=1, paint_order='stroke markers fill')
+    path641 = path([Move(2.8297661, 6.5863575), Horz(4.7359046)], 
+                   stroke='#ff0000', fill='#bdbdbd', opacity=0.985507, 
+                   fill_opacity=1, fill_rule='evenodd', stroke_width=0.600001,
+                   stroke_linecap='round', stroke_linejoin='round', 
+                   stroke_miterlimit=6.1, stroke_dasharray='none', 
+                   stroke_opacity=1, paint_order='stroke markers fill')
+    g641 = group([path640, path641], transform='translate(4.83, 19.0106)')
+    path642 = path([Move(2.8297661, 6.5863575), Horz(4.7359046)], 
+                   fill='#bdbdbd', opacity=0.985507, fill_opacity=1, 
+                   fill_rule='evenodd', stroke_width=1, stroke_linecap='round',
+                   stroke_linejoin='round', stroke_miterlimit=6.1,
+                   stroke_dasharray='none', stroke_opacity=1,
+                   paint_order='stroke markers fill')
+    path643 = path([Move(2.8297661, 6.5863575), Horz(4.7359046)], 
+                   stroke='#ff0000', fill='#bdbdbd', opacity=0.985507, 
+                   fill_opacity=1, fill_rule='evenodd', stroke_width=0.600001,
+                   stroke_linecap='round', stroke_linejoin='round', 
+                   stroke_miterlimit=6.1, stroke_dasharray='none', 
+                   stroke_opacity=1, paint_order='stroke markers fill')
+    g643 = group([path642, path643], transform='translate(4.83, 4.86604)')
+    path644 = path([Move(2.8297661, 6.5863575), Horz(4.7359046)], 
+                   fill='#bdbdbd', opacity=0.985507, fill_opacity=1, 
+                   fill_rule='evenodd', stroke_width=1, stroke_linecap='round',
+                   stroke_linejoin='round', stroke_miterlimit=6.1, 
+                   stroke_dasharray='none', stroke_opacity=1, 
+                   paint_order='stroke markers fill')
+    path645 = path([Move(2.8297661, 6.5863575), Horz(4.7359046)], 
+                   stroke='#ff0000', fill='#bdbdbd', opacity=0.985507, 
+                   fill_opacity=1, fill_rule='evenodd', stroke_width=0.600001,
+                   stroke_linecap='round', stroke_linejoin='round',
+                   stroke_miterlimit=6.1, stroke_dasharray='none',
+                   stroke_opacity=1, paint_order='stroke markers fill')
+    g645 = group([path644, path645], transform='translate(4.83, 0.38959)')
+    path646 = path([Move(2.8297661, 6.5863575), Horz(4.7359046)], 
+                   fill='#bdbdbd', opacity=0.985507, fill_opacity=1, 
+                   fill_rule='evenodd', stroke_width=1, stroke_linecap='round',
+                   stroke_linejoin='round', stroke_miterlimit=6.1,
+                   stroke_dasharray='none', stroke_opacity=1,
+                   paint_order='stroke markers fill')
+    path647 = path([Move(2.8297661, 6.5863575), Horz(4.7359046)],
+                   stroke='#ff0000', fill='#bdbdbd', opacity=0.985507,
+                   fill_opacity=1, fill_rule='evenodd', stroke_width=0.600001,
+                   stroke_linecap='round', stroke_linejoin='round',
+                   stroke_miterlimit=6.1, stroke_dasharray='none',
+                   stroke_opacity=1, paint_order='stroke markers fill')
+    g647 = group([path646, path647], transform='translate(0, 9.00387)')
+    path648 = path([Move(2.8297661, 6.5863575), Horz(4.7359046)],
+                   fill='#bdbdbd', opacity=0.985507, fill_opacity=1,
+                   fill_rule='evenodd', stroke_width=1, stroke_linecap='round',
+                   stroke_linejoin='round', stroke_miterlimit=6.1, 
+                   stroke_dasharray='none', stroke_opacity=1,
+                   paint_order='stroke markers fill')
+    path649 = path([Move(2.8297661, 6.5863575), Horz(4.7359046)], 
+                   stroke='#ff0000', fill='#bdbdbd', opacity=0.985507,
+                   fill_opacity=1, fill_rule='evenodd', stroke_width=0.600001,
+                   stroke_linecap='round', stroke_linejoin='round',
+                   stroke_miterlimit=6.1, stroke_dasharray='none',
+                   stroke_opacity=1, paint_order='stroke markers fill')
+    g649 = group([path648, path649], transform='translate(0, 13.6749)')
+    path650 = path([move(4.7359046, 25.596912), 
+                    inkex.paths.line(-0.9530694, 1.54825)], stroke='#cfcfcf', 
+                   fill='#bdbdbd', opacity=0.985507, fill_opacity=1, 
+                   fill_rule='evenodd', stroke_width=1, stroke_linecap='round',
+                   stroke_linejoin='round', stroke_miterlimit=6.1, 
+                   stroke_dasharray='none', stroke_opacity=1, 
+                   paint_order='stroke markers fill')
+    path651 = path([move(4.7359046, 25.596912), 
+                    inkex.paths.line(-0.9530694, 1.54825)], stroke='#ffffff', 
+                   fill='#bdbdbd', opacity=0.985507, fill_opacity=1, 
+                   fill_rule='evenodd', stroke_width=0.6, 
+                   stroke_linecap='round', stroke_linejoin='round', 
+                   stroke_miterlimit=6.1, stroke_dasharray='none', 
+                   stroke_opacity=1, paint_order='stroke markers fill')
+    g651 = group([path650, path651], 
+                 transform='matrix(0.988646 -0.150267 0.150267 0.988646 -3.79259 1.00229)')
+    path652 = path([Move(2.8297661, 6.5863575), Horz(4.7359046)], 
+                   fill='#bdbdbd', opacity=0.985507, fill_opacity=1, 
+                   fill_rule='evenodd', stroke_width=1, stroke_linecap='round',
+                   stroke_linejoin='round', stroke_miterlimit=6.1, 
+                   stroke_dasharray='none', stroke_opacity=1, 
+                   paint_order='stroke markers fill')
+    path653 = path([Move(2.8297661, 6.5863575), Horz(4.7359046)], 
+                   stroke='#ff0000', fill='#bdbdbd', opacity=0.985507,
+                   fill_opacity=1, fill_rule='evenodd', stroke_width=0.600001,
+                   stroke_linecap='round', stroke_linejoin='round',
+                   stroke_miterlimit=6.1, stroke_dasharray='none', 
+                   stroke_opacity=1, paint_order='stroke markers fill')
+    g653 = group([path652, path653], transform='translate(0, 19.0106)')
+    path654 = path([Move(0.65423388, 0.54334677), Line(1.93, 1.6965726)], 
+                   fill='#bdbdbd', opacity=0.985507, fill_opacity=1, 
+                   fill_rule='evenodd', stroke_width=1, stroke_linecap='round',
+                   stroke_linejoin='round', stroke_miterlimit=6.1, 
+                   stroke_dasharray='none', stroke_opacity=1,
+                   paint_order='stroke markers fill')
+    path655 = path([Move(0.65423388, 0.54334677), Line(1.93, 1.6965726)], 
+                   stroke='#ff0000', fill='#bdbdbd', opacity=0.985507, 
+                   fill_opacity=1, fill_rule='evenodd', stroke_width=0.6, 
+                   stroke_linecap='round', stroke_linejoin='round', 
+                   stroke_miterlimit=6.1, stroke_dasharray='none', 
+                   stroke_opacity=1, paint_order='stroke markers fill')
+    g655 = group([path654, path655], transform='matrix(-1 0 0 1 11.5442 1.21065)')
+    path656 = path([Move(2.8297661, 6.5863575), Horz(4.7359046)], 
+                   fill='#bdbdbd', opacity=0.985507, fill_opacity=1, 
+                   fill_rule='evenodd', stroke_width=1, stroke_linecap='round',
+                   stroke_linejoin='round', stroke_miterlimit=6.1, 
+                   stroke_dasharray='none', stroke_opacity=1, 
+                   paint_order='stroke markers fill')
+    path657 = path([Move(2.8297661, 6.5863575), Horz(4.7359046)], 
+                   stroke='#ff0000', fill='#bdbdbd', opacity=0.985507, 
+                   fill_opacity=1, fill_rule='evenodd', stroke_width=0.600001, 
+                   stroke_linecap='round', stroke_linejoin='round', 
+                   stroke_miterlimit=6.1, stroke_dasharray='none', 
+                   stroke_opacity=1, paint_order='stroke markers fill')
+    g657 = group([path656, path657], transform='translate(0, 4.86604)')
+    path658 = path([Move(0.65423388, 0.54334677), Line(1.93, 1.6965726)], 
+                   fill='#bdbdbd', opacity=0.985507, fill_opacity=1, 
+                   fill_rule='evenodd', stroke_width=1, stroke_linecap='round',
+                   stroke_linejoin='round', stroke_miterlimit=6.1, 
+                   stroke_dasharray='none', stroke_opacity=1, 
+                   paint_order='stroke markers fill')
+    path659 = path([Move(0.65423388, 0.54334677), Line(1.93, 1.6965726)], 
+                   stroke='#ff0000', fill='#bdbdbd', opacity=0.985507, 
+                   fill_opacity=1, fill_rule='evenodd', stroke_width=0.6, 
+                   stroke_linecap='round', stroke_linejoin='round', 
+                   stroke_miterlimit=6.1, stroke_dasharray='none', 
+                   stroke_opacity=1, paint_order='stroke markers fill')
+    g659 = group([path658, path659], transform='translate(0.899766, 1.21065)')
+    path660 = path([Move(1.6295005, 1.6295005), Vert(24.317564)], 
+                   fill='#c4c4c4', opacity=0.985507, fill_opacity=1, 
+                   fill_rule='evenodd', stroke_width=1, stroke_linecap='round',
+                   stroke_linejoin='round', stroke_miterlimit=6.1, 
+                   stroke_dasharray='none', stroke_opacity=1, 
+                   paint_order='stroke markers fill')
+    path661 = path([Move(1.6295005, 1.6295005), Vert(24.317564)], 
+                   stroke='#989898', fill='#c4c4c4', opacity=0.985507,
+                   fill_opacity=1, fill_rule='evenodd', stroke_width=0.6,
+                   stroke_linecap='round', stroke_linejoin='round', 
+                   stroke_miterlimit=6.1, stroke_dasharray='none', 
+                   stroke_opacity=1, paint_order='stroke markers fill')
+    g661 = group([path660, path661], transform='translate(7.9625, 1.31115)')
+    path662 = path([Move(1.6295005, 1.6295005), Vert(24.317564)], 
+                   fill='#c4c4c4', opacity=0.985507, fill_opacity=1, 
+                   fill_rule='evenodd', stroke_width=1, stroke_linecap='round',
+                   stroke_linejoin='round', stroke_miterlimit=6.1,
+                   stroke_dasharray='none', stroke_opacity=1, 
+                   paint_order='stroke markers fill')
+    path663 = path([Move(1.6295005, 1.6295005), Vert(24.317564)], 
+                   stroke='#989898', fill='#c4c4c4', opacity=0.985507,
+                   fill_opacity=1, fill_rule='evenodd', stroke_width=0.6,
+                   stroke_linecap='round', stroke_linejoin='round',
+                   stroke_miterlimit=6.1, stroke_dasharray='none',
+                   stroke_opacity=1, paint_order='stroke markers fill')
+    g663 = group([path662, path663], transform='translate(1.20027, 1.31115)')
+    g = group([g633, g635, g637, g639, g641, g643, g645, g647, g649, g651, g653, 
+               g655, g657, g659, g661, g663], 
+              transform='matrix(0.80851 0 0 0.80851 22.0033 24.3273)', 
+              display='inline')
+    g.translate((-22.855, -25.341))
+    return g
+
+def drawPotassium():
+    """
+    Helper function for drawing a lone potassium ion
+
+    Returns
+    -------
+    c : Object
+        A shape object.
+
+    """
+    c = ellipse((76.884483, 72.982491), (1.0636501, 1.1304066), 
+                stroke='#030004', fill='#c300e2', display='inline', 
+                opacity=0.985507, fill_opacity=1, fill_rule='evenodd', 
+                stroke_width=0.3, stroke_linecap='round', 
+                stroke_linejoin='round', stroke_miterlimit=6.1, 
+                stroke_dasharray='none', stroke_opacity=1,
+                paint_order='stroke markers fill')
+    c.scale(0.8)
+    c.translate((-75.914, -71.958))
+    return c
+
+def drawWater():
+    """
+    Helper function for drawing a water molecule
+
+    Returns
+    -------
+    g : Group object
+        A group of objects.
+
+    """
+    ellipse664 = ellipse((8.8893547, 36.839996), (0.65193373, 0.69285023), 
+                         stroke='#bdbdbd', fill='#ffffff', opacity=0.985507, 
+                         fill_opacity=1, fill_rule='evenodd', 
+                         stroke_width=0.367552, stroke_linecap='round', 
+                         stroke_linejoin='round', stroke_miterlimit=6.1, 
+                         stroke_dasharray='none', stroke_opacity=1,
+                         paint_order='stroke markers fill')
+    ellipse665 = ellipse((7.92835, 36.020687), (1.0636501, 1.1304066), 
+                         stroke='#030004', fill='#ff0000', opacity=0.985507, 
+                         fill_opacity=1, fill_rule='evenodd', stroke_width=0.3,
+                         stroke_linecap='round', stroke_linejoin='round', 
+                         stroke_miterlimit=6.1, stroke_dasharray='none', 
+                         stroke_opacity=1, paint_order='stroke markers fill')
+    ellipse666 = ellipse((7.0421195, 37.151432), (0.68834645, 0.73154825), 
+                         stroke='#bdbdbd', fill='#ffffff', opacity=0.985507, 
+                         fill_opacity=1, fill_rule='evenodd', 
+                         stroke_width=0.388081, stroke_linecap='round', 
+                         stroke_linejoin='round', stroke_miterlimit=6.1, 
+                         stroke_dasharray='none', stroke_opacity=1, 
+                         paint_order='stroke markers fill')
+    g = group([ellipse664, ellipse665, ellipse666], 
+              transform='translate(-1.73152, -18.5919)', 
+              display='inline')
+    g.scale(0.75)
+    g.translate((-5.308, -21.208))
+    return g
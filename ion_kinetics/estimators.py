@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+"""
+Committors, mean first-passage times, stationary distribution and reactive
+flux (transition path theory) computed directly from a sparse rate matrix.
+
+Every quantity is a sparse linear solve on the states outside a boundary
+set. ``RateNetwork`` keeps the LU factorization of each boundary it has
+seen, so the committors of A -> B and B -> A, the MFPTs into A u B and
+committors for any other split of the same boundary reuse one
+factorization.
+"""
+
+import heapq
+
+import numpy as np
+import scipy.sparse
+import scipy.sparse.csgraph
+import scipy.sparse.linalg
+
+
+def asIndexArray(states):
+    """
+    Helper function to turn a state or list of states into a sorted index
+    array.
+    """
+    return np.unique(np.atleast_1d(np.asarray(states, dtype=np.int64)))
+
+
+class ReactiveFlux:
+    """
+    Transition path theory results for A -> B.
+
+    Attributes
+    ----------
+    source, sink : numpy array of int
+        The sets A and B.
+    forwardCommittor, backwardCommittor : numpy array (states,)
+        q+ and q-.
+    stationary : numpy array (states,)
+        The stationary distribution pi.
+    grossFlux : scipy.sparse.csr_matrix (states, states)
+        f_ij = pi_i q-_i Q_ij q+_j for i != j.
+    netFlux : scipy.sparse.csr_matrix (states, states)
+        max(f_ij - f_ji, 0), the ``major_flux`` drawn by ``network()``.
+    totalFlux : float
+        Net reactive flux out of A.
+    rate : float
+        The A -> B rate, totalFlux / sum_i pi_i q-_i.
+
+    """
+
+    def __init__(self, source, sink, forwardCommittor, backwardCommittor,
+                 stationary, grossFlux):
+        self.source = source
+        self.sink = sink
+        self.forwardCommittor = forwardCommittor
+        self.backwardCommittor = backwardCommittor
+        self.stationary = stationary
+        self.grossFlux = grossFlux
+        net = grossFlux - grossFlux.T
+        net.data[net.data < 0] = 0
+        net.eliminate_zeros()
+        self.netFlux = scipy.sparse.csr_matrix(net)
+        self.totalFlux = self.netFlux[source].sum()
+        self.rate = self.totalFlux / np.dot(stationary, backwardCommittor)
+
+    def pathways(self, fraction=1.0, maxiter=1000):
+        """
+        Function to decompose the net flux into A -> B pathways, strongest
+        (largest bottleneck) first.
+
+        Parameters
+        ----------
+        fraction : float, optional
+            Stop once this fraction of the total flux is covered. The
+            default is 1.0.
+        maxiter : int, optional
+            Maximum number of pathways. The default is 1000.
+
+        Returns
+        -------
+        paths : list of numpy arrays of int
+            The states of each pathway, from A to B.
+        fluxes : numpy array (paths,)
+            The flux carried by each pathway.
+
+        """
+        flux = self.netFlux.copy()
+        flux.sort_indices()
+        isSink = np.zeros(flux.shape[0], dtype=bool)
+        isSink[self.sink] = True
+        paths, fluxes = [], []
+        covered = 0.0
+        while len(paths) < maxiter and covered < fraction * self.totalFlux:
+            path, width = widestPath(flux, self.source, isSink)
+            if path is None or width <= 0:
+                break
+            for i, j in zip(path[:-1], path[1:]):
+                k = flux.indptr[i] + np.searchsorted(
+                    flux.indices[flux.indptr[i]:flux.indptr[i + 1]], j)
+                flux.data[k] -= width
+            paths.append(np.array(path))
+            fluxes.append(width)
+            covered += width
+        return (paths, np.array(fluxes))
+
+
+def widestPath(flux, source, isSink):
+    """
+    Helper function for the maximum-bottleneck path from any source state to
+    any sink state (Dijkstra with widths instead of lengths).
+
+    Parameters
+    ----------
+    flux : scipy.sparse.csr_matrix (states, states)
+        Edge capacities, non-positive entries are ignored.
+    source : numpy array of int
+        Start states.
+    isSink : numpy array of bool (states,)
+        Marks the end states.
+
+    Returns
+    -------
+    path : list of int or None
+    width : float
+
+    """
+    numStates = flux.shape[0]
+    width = np.zeros(numStates)
+    parent = np.full(numStates, -1)
+    done = np.zeros(numStates, dtype=bool)
+    heap = []
+    for s in source:
+        width[s] = np.inf
+        heap.append((-np.inf, int(s)))
+    heapq.heapify(heap)
+    while heap:
+        w, u = heapq.heappop(heap)
+        if done[u]:
+            continue
+        done[u] = True
+        if isSink[u]:
+            path = [u]
+            while parent[path[-1]] >= 0:
+                path.append(int(parent[path[-1]]))
+            return (path[::-1], width[u])
+        start, end = flux.indptr[u], flux.indptr[u + 1]
+        for v, c in zip(flux.indices[start:end], flux.data[start:end]):
+            cand = min(-w, c)
+            if c > 0 and not done[v] and cand > width[v]:
+                width[v] = cand
+                parent[v] = u
+                heapq.heappush(heap, (-cand, int(v)))
+    return (None, 0.0)
+
+
+class RateNetwork:
+    """
+    Sparse linear-algebra estimators on a rate matrix.
+
+    Parameters
+    ----------
+    rateMatrix : numpy array or scipy sparse matrix (states, states)
+        The rate matrix Q, rows summing to zero.
+
+    """
+
+    def __init__(self, rateMatrix):
+        self.Q = scipy.sparse.csr_matrix(rateMatrix, dtype=float)
+        self.numStates = self.Q.shape[0]
+        self._stationary = None
+        self._reversed = None
+        self._factors = {} # (boundary, reversed) -> (interior, splu)
+
+    def stationaryDistribution(self):
+        """
+        Returns the stationary distribution pi, pi Q = 0 and sum(pi) = 1.
+        It is unique and positive only for an irreducible Q, a reducible
+        one raises a ValueError.
+        """
+        if self._stationary is None:
+            graph = self.Q.copy()
+            graph.eliminate_zeros()
+            numSets, labels = scipy.sparse.csgraph.connected_components(
+                graph, directed=True, connection='strong')
+            if numSets > 1:
+                apart = np.flatnonzero(labels != labels[-1])
+                raise ValueError(f'the rate matrix is reducible, its states '
+                                 f'form {numSets} strongly connected sets; '
+                                 f'e.g. states {apart[:5].tolist()} and '
+                                 f'{self.numStates - 1} do not communicate')
+            # pin pi of the last state to 1 and drop its balance equation,
+            # which keeps the system as sparse as Q itself
+            last = self.numStates - 1
+            A = self.Q[:last][:, :last].T.tocsc()
+            b = -self.Q[last, :last].toarray().ravel()
+            pi = np.append(scipy.sparse.linalg.splu(A).solve(b), 1.0)
+            self._stationary = pi / pi.sum()
+        return self._stationary
+
+    def reversedRates(self):
+        """
+        Returns the time-reversed rate matrix pi_j Q_ji / pi_i.
+        """
+        if self._reversed is None:
+            pi = self.stationaryDistribution()
+            self._reversed = scipy.sparse.csr_matrix(
+                scipy.sparse.diags(1 / pi) @ self.Q.T @ scipy.sparse.diags(pi))
+        return self._reversed
+
+    def _solve(self, boundary, rhs, reverse=False):
+        """
+        Helper function to solve Q_II x = rhs(I) on the interior I of a
+        boundary set with a cached factorization.
+
+        Parameters
+        ----------
+        boundary : numpy array of int
+            The states held fixed.
+        rhs : callable
+            Maps (Q, interior) to the right-hand side(s) on the interior.
+        reverse : bool, optional
+            Use the time-reversed rate matrix. The default is False.
+
+        Returns
+        -------
+        interior : numpy array of int
+        x : numpy array (interior,) or (interior, columns)
+
+        """
+        Q = self.reversedRates() if reverse else self.Q
+        key = (boundary.tobytes(), reverse)
+        if key not in self._factors:
+            interior = np.setdiff1d(np.arange(self.numStates), boundary)
+            lu = scipy.sparse.linalg.splu(Q[interior][:, interior].tocsc())
+            self._factors[key] = (interior, lu)
+        interior, lu = self._factors[key]
+        if not interior.shape[0]:
+            return (interior, np.zeros(0))
+        return (interior, lu.solve(np.asarray(rhs(Q, interior), dtype=float)))
+
+    def committor(self, source, sink, reverse=False):
+        """
+        Function for the forward committor, the probability of reaching the
+        sink before the source.
+
+        Parameters
+        ----------
+        source, sink : int or list of int
+            The sets A and B.
+        reverse : bool, optional
+            Return the backward committor instead. The default is False.
+
+        Returns
+        -------
+        q : numpy array (states,)
+            0 on A, 1 on B.
+
+        """
+        source, sink = asIndexArray(source), asIndexArray(sink)
+        boundary = np.union1d(source, sink)
+        interior, x = self._solve(
+            boundary,
+            lambda Q, I: -np.asarray(Q[I][:, sink].sum(axis=1)).ravel(),
+            reverse=reverse)
+        q = np.zeros(self.numStates)
+        q[sink] = 1
+        q[interior] = x
+        return q
+
+    def backwardCommittor(self, source, sink):
+        """
+        Function for the backward committor, the probability of having last
+        visited the source rather than the sink.
+
+        Returns
+        -------
+        q : numpy array (states,)
+            1 on A, 0 on B.
+
+        """
+        return self.committor(sink, source, reverse=True)
+
+    def mfpt(self, target):
+        """
+        Function for the mean first-passage times into a set of states.
+
+        Parameters
+        ----------
+        target : int or list of int
+            The target states.
+
+        Returns
+        -------
+        tau : numpy array (states,)
+            Mean first-passage time from every state, 0 on the target.
+
+        """
+        interior, x = self._solve(asIndexArray(target),
+                                  lambda Q, I: -np.ones(I.shape[0]))
+        tau = np.zeros(self.numStates)
+        tau[interior] = x
+        return tau
+
+    def mfptMatrix(self):
+        """
+        Returns the (states, states) matrix of MFPTs from i into j, one
+        factorization per target state.
+        """
+        return np.stack([self.mfpt(j) for j in range(self.numStates)], axis=1)
+
+    def reactiveFlux(self, source, sink):
+        """
+        Function for transition path theory between two sets of states.
+
+        Parameters
+        ----------
+        source, sink : int or list of int
+            The sets A and B.
+
+        Returns
+        -------
+        flux : ReactiveFlux
+
+        """
+        source, sink = asIndexArray(source), asIndexArray(sink)
+        qPlus = self.committor(source, sink)
+        qMinus = self.backwardCommittor(source, sink)
+        pi = self.stationaryDistribution()
+        offDiag = self.Q.copy()
+        offDiag.setdiag(0)
+        offDiag.eliminate_zeros()
+        gross = scipy.sparse.diags(pi * qMinus) @ offDiag \
+            @ scipy.sparse.diags(qPlus)
+        gross = scipy.sparse.csr_matrix(gross)
+        gross.eliminate_zeros()
+        return ReactiveFlux(source, sink, qPlus, qMinus, pi, gross)
+
+
+def stationaryDistribution(rateMatrix):
+    """
+    Returns the stationary distribution of a rate matrix.
+    """
+    return RateNetwork(rateMatrix).stationaryDistribution()
+
+
+def committor(rateMatrix, source, sink):
+    """
+    Returns the forward committor of source -> sink.
+    """
+    return RateNetwork(rateMatrix).committor(source, sink)
+
+
+def mfpt(rateMatrix, target):
+    """
+    Returns the mean first-passage times into target from every state.
+    """
+    return RateNetwork(rateMatrix).mfpt(target)
+
+
+def reactiveFlux(rateMatrix, source, sink):
+    """
+    Returns the ``ReactiveFlux`` of source -> sink.
+    """
+    return RateNetwork(rateMatrix).reactiveFlux(source, sink)
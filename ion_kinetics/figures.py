@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+"""
+Network figures for many simulation conditions.
+
+A condition is a directory with the pickles of one run (see
+``ion_kinetics.bundle.CONDITION_FILES``) or their model bundle.
+``drawCondition`` draws its flux network with the occupancy overlays, as
+the driver of network_v2.1.2.py does, and the command line entry point
+renders a whole manifest of conditions to SVG on a process pool::
+
+    python -m ion_kinetics.figures manifest.txt --out figures --workers 4
+
+The manifest lists one condition directory per line (relative to the
+manifest, ``#`` starts a comment). Figures newer than all of their inputs
+are skipped unless ``--force`` is given, and the time spent loading,
+drawing and writing every figure is written to ``timings.csv``, together
+with the edges and hidden border circles ``network`` created.
+"""
+
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .bundle import BUNDLE_NAME, CONDITION_FILES, loadBundle, \
+    readConditionPickles
+from .blocks import BlockNetwork
+from .drawing import colormap, drawOccupancy, isSparse, network, useBackend
+from .instrument import MemoryCollector
+from .svg import SVGDocument
+
+
+def conditionInputs(directory):
+    """
+    Returns the paths of the input files of a condition, the pickles and,
+    when the condition has been converted, the bundle header.
+    """
+    pickles = [os.path.join(directory, name)
+               for name in CONDITION_FILES.values()]
+    header = os.path.join(directory, BUNDLE_NAME, 'header.json')
+    if os.path.exists(header):
+        return [header] + [f for f in pickles if os.path.exists(f)]
+    return pickles
+
+
+def bundleIsCurrent(directory):
+    """
+    Returns True if the condition has a model bundle that is not older
+    than any of its pickles, i.e. none was re-exported since converting.
+    """
+    header = os.path.join(directory, BUNDLE_NAME, 'header.json')
+    if not os.path.exists(header):
+        return False
+    return all(os.path.getmtime(header) >= os.path.getmtime(f)
+               for f in conditionInputs(directory))
+
+
+def loadCondition(directory):
+    """
+    Function to load one condition, from its model bundle (memory-mapped)
+    if it is up to date, else from the pickles.
+
+    Parameters
+    ----------
+    directory : str
+        The condition directory.
+
+    Returns
+    -------
+    model : dict
+        numStates, occuList, stationary_dist, rateMatrix and committor of
+        the microstate model, positions of the (tiled) network nodes and
+        the major_flux matrix between them.
+
+    """
+    if not bundleIsCurrent(directory):
+        # no bundle, or the pickles were re-exported after converting
+        return readConditionPickles(directory)
+    bundle = loadBundle(os.path.join(directory, BUNDLE_NAME))
+    model = {name: bundle[name] for name in bundle.keys()}
+    model['numStates'] = bundle.attrs['numStates']
+    return model
+
+
+def fluxWidths(flux):
+    """
+    Function to turn fluxes into connection widths, exp(10 f - min) for
+    every non-zero flux.
+
+    Parameters
+    ----------
+    flux : numpy array or scipy sparse matrix (states, states)
+        The flux matrix, zero where there is no connection.
+
+    Returns
+    -------
+    widths : numpy array or scipy.sparse.csr_matrix (states, states)
+        Sparse for a sparse flux.
+
+    """
+    if isSparse(flux):
+        widths = flux.tocsr().astype(float)
+        widths.eliminate_zeros()
+        if widths.nnz:
+            widths.data = np.exp(widths.data * 10 - (widths.data * 10).min())
+        return widths
+    widths = np.array(flux, dtype=float) * 10
+    cond = widths == 0
+    widths[~cond] = np.exp(widths[~cond] - widths[~cond].min())
+    return widths
+
+
+def drawCondition(model, colors='committor', occupancyBlock=None,
+                  offset=(0, 2.9), pruning=None, collector=None):
+    """
+    Function to draw the network of a condition with the occupancy of every
+    state of one block next to its node.
+
+    Parameters
+    ----------
+    model : dict
+        As returned by ``loadCondition``. The positions and major_flux
+        cover all blocks, the other entries one unit cell. Every non-zero
+        flux of the (pruned) major_flux is drawn.
+    colors : str or list of str, optional
+        Fill color of the nodes, or 'committor' to color them red to blue
+        by ``BlockNetwork.blockCommittor`` of the occupancy block, or None
+        to keep the default fill. The default is 'committor'.
+    occupancyBlock : int, optional
+        The block whose nodes get an occupancy drawing. The default is
+        None, the middle block.
+    offset : tuple, optional
+        Position of the occupancy drawing relative to its node. The default
+        is (0, 2.9).
+    pruning : dict, optional
+        ``pruneEdges`` keywords to thin out the major_flux before it is
+        drawn, e.g. {'topK': 3, 'fluxFraction': 0.99}. The default is None,
+        draw every non-zero flux.
+    collector : NullCollector, optional
+        Receives the stage timings of ``network``. The default is None.
+
+    Returns
+    -------
+    scene : NetworkScene
+        The drawn network, see ``network``. Unpacks as ``layers, objs``.
+
+    """
+    numStates = model['numStates']
+    positions = model['positions']
+    blockNet = BlockNetwork(numStates, len(positions) // numStates)
+    if occupancyBlock is None:
+        occupancyBlock = blockNet.blocks // 2
+    stationary_dist = blockNet.nodeValues(model['stationary_dist'])
+    cs = (np.exp(stationary_dist / stationary_dist.max() * 1.4) + 0.25) * 2
+    flux = model['major_flux']
+    if pruning is not None:
+        from .pruning import pruneEdges
+        flux = pruneEdges(flux, **pruning)
+    scene = network(blockNet.nodeStates(), stationary_dist, positions,
+                    fluxWidths(flux), circleSize=cs, circleAlpha=1,
+                    colorInto='#000000', colorOut='#000000',
+                    colorSelf='#de00fa', collector=collector)
+    if isinstance(colors, str) and colors == 'committor':
+        committor = np.ravel(model['committor'])
+        if committor.shape[0] != numStates:
+            raise ValueError('coloring by committor needs one committor per '
+                             'state')
+        colors = colormap(blockNet.blockCommittor(committor, occupancyBlock),
+                          vmin=0, vmax=1)
+    if colors is not None:
+        scene.restyleNodes(colors)
+    objs = scene.objs
+    for i in range(numStates * occupancyBlock, numStates * (occupancyBlock + 1)):
+        # wrap with modulo
+        interDraw = drawOccupancy(model['occuList'][i % numStates].split())
+        x, y = positions[i] + offset
+        interDraw.scale(1 - 0.6, (0, 0))
+        interDraw.rotate(90, (0, 0))
+        interDraw.translate((x, y))
+        objs[i].append(interDraw)
+    return scene
+
+
+def renderCondition(directory, output, force=False):
+    """
+    Function to render the figure of one condition to an SVG file.
+
+    Parameters
+    ----------
+    directory : str
+        The condition directory.
+    output : str
+        The SVG file.
+    force : bool, optional
+        Render even if the figure is newer than its inputs. The default is
+        False.
+
+    Returns
+    -------
+    timing : dict
+        The condition, output, status ('rendered', 'skipped' or 'failed:
+        <error>'), the load, draw, write and total times in seconds and
+        the number of edges and hidden border circles drawn.
+
+    """
+    timing = {'condition': directory, 'output': output, 'status': 'skipped',
+              'load': 0.0, 'draw': 0.0, 'write': 0.0, 'total': 0.0,
+              'edges': 0, 'borders': 0}
+    inputs = conditionInputs(directory)
+    if not force and os.path.exists(output) and all(
+            os.path.exists(f) for f in inputs) and os.path.getmtime(output) \
+            >= max(os.path.getmtime(f) for f in inputs):
+        return timing
+    try:
+        start = time.perf_counter()
+        model = loadCondition(directory)
+        loaded = time.perf_counter()
+        doc = SVGDocument()
+        useBackend(doc)
+        collector = MemoryCollector()
+        drawCondition(model, collector=collector)
+        drawn = time.perf_counter()
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+        doc.write(output)
+        written = time.perf_counter()
+    except Exception as err:
+        timing['status'] = f'failed: {err!r}'
+        return timing
+    totals = collector.totals()
+    timing.update(status='rendered', load=loaded - start, draw=drawn - loaded,
+                  write=written - drawn, total=written - start,
+                  edges=totals.get('connectors', {}).get('edges', 0),
+                  borders=totals.get('borders', {}).get('hidden', 0))
+    return timing
+
+
+def readManifest(manifest):
+    """
+    Function to read the condition directories of a manifest file.
+
+    Parameters
+    ----------
+    manifest : str
+        Text file with one directory per line, relative paths are taken
+        relative to the manifest.
+
+    Returns
+    -------
+    conditions : list of str
+
+    """
+    root = os.path.dirname(os.path.abspath(manifest))
+    conditions = []
+    with open(manifest) as f:
+        for line in f:
+            line = line.split('#')[0].strip()
+            if line:
+                conditions.append(os.path.normpath(os.path.join(root, line)))
+    return conditions
+
+
+def figureNames(conditions):
+    """
+    Helper function naming every figure after its condition path below the
+    common directory, e.g. sysA/vol_0 -> sysA_vol_0.svg.
+    """
+    if len(conditions) == 1:
+        return [os.path.basename(conditions[0]) + '.svg']
+    common = os.path.commonpath(conditions)
+    return [os.path.relpath(c, common).replace(os.sep, '_') + '.svg'
+            for c in conditions]
+
+
+def _renderTask(task):
+    return renderCondition(*task)
+
+
+def runManifest(manifest, outDir, maxWorkers=None, force=False):
+    """
+    Function to render all conditions of a manifest in parallel and write
+    the timing summary.
+
+    Parameters
+    ----------
+    manifest : str
+        The manifest file, see ``readManifest``.
+    outDir : str
+        Directory of the figures and of timings.csv.
+    maxWorkers : int, optional
+        Number of processes. 1 renders in this process. The default is
+        None, one per CPU.
+    force : bool, optional
+        Render figures that are up to date as well. The default is False.
+
+    Returns
+    -------
+    timings : list of dict
+        One ``renderCondition`` timing per condition, in manifest order.
+
+    """
+    conditions = readManifest(manifest)
+    tasks = [(c, os.path.join(outDir, name), force)
+             for c, name in zip(conditions, figureNames(conditions))]
+    if maxWorkers == 1:
+        timings = [_renderTask(task) for task in tasks]
+    else:
+        workers = maxWorkers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # one figure per task, they take much longer than the IPC
+            timings = list(pool.map(_renderTask, tasks))
+    os.makedirs(outDir, exist_ok=True)
+    with open(os.path.join(outDir, 'timings.csv'), 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(timings[0]) if timings
+                                else ['condition'])
+        writer.writeheader()
+        writer.writerows(timings)
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Render the network figure of every condition directory '
+                    'listed in a manifest.')
+    parser.add_argument('manifest', help='text file, one directory per line')
+    parser.add_argument('--out', default='figures',
+                        help='output directory (default: figures)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of processes (default: one per CPU)')
+    parser.add_argument('--force', action='store_true',
+                        help='also render figures that are up to date')
+    args = parser.parse_args(argv)
+    timings = runManifest(args.manifest, args.out, maxWorkers=args.workers,
+                          force=args.force)
+    for timing in timings:
+        print(f"{timing['total']:8.2f} s  {timing['status']:<9} "
+              f"{timing['output']}")
+    failed = sum(t['status'].startswith('failed') for t in timings)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
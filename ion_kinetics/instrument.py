@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+Collectors for the stage timings and counters of the drawing code.
+
+``network`` used to print the shape of its input and a line per edge with
+a hard-coded ``debug = 1``. It now reports every stage (circle creation,
+border matching, connector creation, layering) to a collector as one
+record with the elapsed time and the counters of the stage, e.g. the
+edges drawn, the hidden border circles created and the markers
+allocated. The default ``NullCollector`` drops the records,
+``MemoryCollector`` keeps them in a list and ``JsonLinesCollector``
+appends them to a file, one JSON object per line. The per-edge output is
+a ``logging`` debug message of ``ion_kinetics.drawing``.
+"""
+
+import contextlib
+import json
+import time
+
+
+class NullCollector:
+    """
+    A collector that drops every record, the default of ``network``.
+    Subclasses implement ``record``.
+
+    Parameters
+    ----------
+    **context
+        Fields added to every record, e.g. condition='wt/vol_0'.
+
+    """
+
+    def __init__(self, **context):
+        self.context = context
+
+    def record(self, stage, **fields):
+        """
+        Function to store one record.
+
+        Parameters
+        ----------
+        stage : str
+            The stage name, e.g. 'connectors'.
+        **fields
+            Its timing and counters.
+
+        Returns
+        -------
+        None.
+
+        """
+        pass
+
+    @contextlib.contextmanager
+    def stage(self, name, **counts):
+        """
+        Function to time a stage, a context manager yielding the dict of
+        counters to fill in. They are recorded together with the elapsed
+        time in seconds when the block is left.
+        """
+        start = time.perf_counter()
+        yield counts
+        self.record(name, seconds=time.perf_counter() - start, **counts)
+
+
+class MemoryCollector(NullCollector):
+    """
+    A collector keeping the records in memory.
+
+    Attributes
+    ----------
+    records : list of dict
+        One dict per stage run, with the stage name under 'stage'.
+
+    """
+
+    def __init__(self, **context):
+        super().__init__(**context)
+        self.records = []
+
+    def record(self, stage, **fields):
+        self.records.append({'stage': stage, **self.context, **fields})
+
+    def totals(self):
+        """
+        Function to sum the numeric fields of the records per stage.
+
+        Returns
+        -------
+        totals : dict
+            stage -> {field: sum}, with the number of runs under 'calls'.
+
+        """
+        totals = {}
+        for record in self.records:
+            total = totals.setdefault(record['stage'], {'calls': 0})
+            total['calls'] += 1
+            for key, value in record.items():
+                if isinstance(value, (int, float)) \
+                        and not isinstance(value, bool):
+                    total[key] = total.get(key, 0) + value
+        return totals
+
+
+class JsonLinesCollector(NullCollector):
+    """
+    A collector appending every record to a JSON-lines file.
+
+    Parameters
+    ----------
+    path : str
+        The file, opened for appending on first use.
+    **context
+        Fields added to every record.
+
+    """
+
+    def __init__(self, path, **context):
+        super().__init__(**context)
+        self.path = path
+        self._file = None
+
+    def record(self, stage, **fields):
+        if self._file is None:
+            self._file = open(self.path, 'a')
+        self._file.write(json.dumps({'stage': stage, **self.context,
+                                     **fields}) + '\n')
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
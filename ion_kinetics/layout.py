@@ -0,0 +1,402 @@
+# -*- coding: utf-8 -*-
+"""
+Node positions for ``network()`` computed from the rate (or flux) matrix.
+
+Three layouts are offered, all vectorized with NumPy and deterministic for a
+given seed:
+
+- ``spectralLayout``: the two smoothest non-trivial eigenvectors of the
+  normalized graph Laplacian.
+- ``forceLayout``: Fruchterman-Reingold with the repulsion of far away nodes
+  approximated Barnes-Hut style on a quadtree of grid levels, started from
+  the spectral layout.
+- ``layeredLayout``: one row per ion count (e.g. K ions in the filter),
+  ordered within a row by the barycenters of the neighbours.
+
+``layout`` picks one and scales it to the drawing, the result can be passed
+to ``network()`` in place of the coordinates of ``network_coords.pkl``.
+scipy is imported by the layouts themselves, ``drawing`` imports this
+module without it.
+"""
+
+import numpy as np
+
+# below this many nodes the spectral layout uses a dense eigensolver
+DENSE_SPECTRAL = 500
+# deepest quadtree level of the Barnes-Hut repulsion
+MAX_DEPTH = 12
+
+
+def graphMatrix(matrix, weighted=True):
+    """
+    Helper function for the symmetric, non-negative adjacency of a rate or
+    flux matrix without its diagonal.
+
+    Parameters
+    ----------
+    matrix : numpy array or scipy sparse matrix (states, states)
+    weighted : bool, optional
+        Keep |w_ij| + |w_ji| as edge weights (scaled to a maximum of 1),
+        else every edge weighs 1. The default is True.
+
+    Returns
+    -------
+    A : scipy.sparse.csr_matrix (states, states)
+
+    """
+    import scipy.sparse
+    A = abs(scipy.sparse.csr_matrix(matrix, dtype=float))
+    A = scipy.sparse.csr_matrix(A + A.T)
+    A.setdiag(0)
+    A.eliminate_zeros()
+    if not weighted:
+        A.data[:] = 1
+    elif A.nnz:
+        A.data /= A.data.max()
+    return A
+
+
+def ionCounts(occupancies, ion='K'):
+    """
+    Function to count the ions of every state, the layers of
+    ``layeredLayout``.
+
+    Parameters
+    ----------
+    occupancies : list of str or array like (states, sites)
+        Occupancy strings ("K W V K W") or token rows, e.g. the occuList.
+    ion : str, optional
+        The token counted. The default is 'K'.
+
+    Returns
+    -------
+    counts : numpy array of int (states,)
+
+    """
+    if len(occupancies) and isinstance(occupancies[0], str):
+        occupancies = [state.split() for state in occupancies]
+    return np.sum(np.asarray(occupancies) == ion, axis=-1)
+
+
+def spectralLayout(matrix, seed=0, weighted=True):
+    """
+    Function for the spectral layout, the eigenvectors 2 and 3 of the
+    random-walk Laplacian.
+
+    Parameters
+    ----------
+    matrix : numpy array or scipy sparse matrix (states, states)
+        The rate or flux matrix, the direction of the edges is ignored.
+    seed : int, optional
+        Seed of the start vector of the sparse eigensolver. The default is
+        0.
+    weighted : bool, optional
+        See ``graphMatrix``. The default is True.
+
+    Returns
+    -------
+    coords : numpy array (states, 2)
+        Unscaled positions.
+
+    """
+    import scipy.sparse
+    import scipy.sparse.linalg
+    A = graphMatrix(matrix, weighted=weighted)
+    n = A.shape[0]
+    if n < 4:
+        # too small for two non-trivial eigenvectors, put them on a circle
+        angle = 2 * np.pi * np.arange(n) / max(n, 1)
+        return np.column_stack((np.cos(angle), np.sin(angle)))
+    degree = np.asarray(A.sum(axis=1)).ravel()
+    degree[degree == 0] = 1 # isolated nodes
+    invSqrt = scipy.sparse.diags(1 / np.sqrt(degree))
+    N = invSqrt @ A @ invSqrt # I - normalized Laplacian
+    if n <= DENSE_SPECTRAL:
+        values, vectors = np.linalg.eigh(N.toarray())
+        vectors = vectors[:, ::-1][:, :3]
+    else:
+        rng = np.random.default_rng(seed)
+        values, vectors = scipy.sparse.linalg.eigsh(
+            N, k=3, which='LA', v0=rng.random(n), tol=1e-6)
+        vectors = vectors[:, np.argsort(-values)]
+    coords = invSqrt @ vectors[:, 1:3]
+    # fix the signs, eigenvectors are only defined up to one
+    signs = np.sign(coords[np.argmax(np.abs(coords), axis=0), [0, 1]])
+    return coords * np.where(signs == 0, 1, signs)
+
+
+def repulsion(pos, k, leafSize=8):
+    """
+    Helper function for the Fruchterman-Reingold repulsion k^2 / d of all
+    node pairs, Barnes-Hut style.
+
+    The nodes are binned on grids of 2^L x 2^L cells (the levels of a
+    quadtree). On every level a cell feels the cells that are children of
+    its parent's neighbours but not its own neighbours as point masses at
+    their center of mass, at least one cell width away. That force is
+    evaluated at the center of mass of the receiving cell and carried to
+    its nodes with its gradient. On the finest level the nodes of the
+    3 x 3 neighbouring cells are summed exactly.
+
+    Parameters
+    ----------
+    pos : numpy array (nodes, 2)
+    k : float
+        The ideal edge length.
+    leafSize : int, optional
+        Target number of nodes per finest cell, clustered cells are split
+        further down to ``MAX_DEPTH`` levels. The default is 8.
+
+    Returns
+    -------
+    force : numpy array (nodes, 2)
+
+    """
+    n = pos.shape[0]
+    lo = pos.min(axis=0)
+    extent = max((pos.max(axis=0) - lo).max(), 1e-12) * (1 + 1e-9)
+    unit = (pos - lo) / extent # in [0, 1)
+    depth = max(2, int(np.ceil(np.log(max(n / leafSize, 1)) / np.log(4))))
+    # refine clustered layouts until the finest cells are small again
+    while depth < MAX_DEPTH:
+        g = 2**depth
+        cell = np.minimum((unit * g).astype(np.int64), g - 1)
+        if np.bincount(cell[:, 0] * g + cell[:, 1]).max() <= 2 * leafSize:
+            break
+        depth += 1
+    force = np.zeros_like(pos)
+    # children of the parent's 3 x 3 neighbours: offsets -2..3 from 2*parent
+    a = np.arange(6) - 2
+    for level in range(2, depth + 1):
+        g = 2**level
+        cell = np.minimum((unit * g).astype(np.int64), g - 1)
+        cellIds, nodeCell, mass = np.unique(cell[:, 0] * g + cell[:, 1],
+                                            return_inverse=True,
+                                            return_counts=True)
+        center = np.column_stack(
+            [np.bincount(nodeCell, weights=pos[:, c]) for c in range(2)]) \
+            / mass[:, np.newaxis]
+        cx, cy = cellIds // g, cellIds % g
+        ox = np.repeat(2 * (cx // 2)[:, np.newaxis] + a, 6, axis=1) # (cells, 36)
+        oy = np.tile(2 * (cy // 2)[:, np.newaxis] + a, (1, 6))
+        far = (np.abs(ox - cx[:, np.newaxis]) > 1) \
+            | (np.abs(oy - cy[:, np.newaxis]) > 1)
+        far &= (ox >= 0) & (ox < g) & (oy >= 0) & (oy < g)
+        # look up the occupied source cells
+        source = np.minimum(np.searchsorted(cellIds, ox * g + oy),
+                            len(cellIds) - 1)
+        far &= cellIds[source] == ox * g + oy
+        target, slot = np.nonzero(far)
+        source = source[target, slot]
+        numCells = len(cellIds)
+        d = center[target] - center[source]
+        r2 = np.maximum(np.sum(d**2, axis=1), 1e-12)
+        w = mass[source] / r2
+        cellForce = np.column_stack(
+            [np.bincount(target, weights=d[:, c] * w, minlength=numCells)
+             for c in range(2)])
+        # gradient of m d / r^2: m (I / r^2 - 2 d d^T / r^4)
+        w /= r2
+        dxx = np.bincount(target, weights=w * (r2 - 2 * d[:, 0]**2),
+                          minlength=numCells)
+        dyy = np.bincount(target, weights=w * (r2 - 2 * d[:, 1]**2),
+                          minlength=numCells)
+        dxy = np.bincount(target, weights=-2 * w * d[:, 0] * d[:, 1],
+                          minlength=numCells)
+        offset = pos - center[nodeCell]
+        force[:, 0] += cellForce[nodeCell, 0] + dxx[nodeCell] * offset[:, 0] \
+            + dxy[nodeCell] * offset[:, 1]
+        force[:, 1] += cellForce[nodeCell, 1] + dxy[nodeCell] * offset[:, 0] \
+            + dyy[nodeCell] * offset[:, 1]
+    # exact sums over the nodes of the neighbouring finest cells
+    order = np.argsort(nodeCell, kind='stable')
+    starts = np.r_[0, np.cumsum(mass)[:-1]]
+    slots = np.arange(mass.max())
+    pairs = []
+    # each pair of neighbouring cells once, the other half by symmetry
+    for dx, dy in ((0, 0), (0, 1), (1, -1), (1, 0), (1, 1)):
+        nx, ny = cell[:, 0] + dx, cell[:, 1] + dy
+        other = np.minimum(np.searchsorted(cellIds, nx * g + ny),
+                           len(cellIds) - 1)
+        valid = (nx < g) & (ny >= 0) & (ny < g) \
+            & (cellIds[other] == nx * g + ny)
+        i, slot = np.nonzero(slots < np.where(valid, mass[other], 0)
+                             [:, np.newaxis])
+        j = order[starts[other[i]] + slot]
+        if dx == dy == 0:
+            i, j = i[i < j], j[i < j]
+        pairs.append((i, j))
+    i, j = (np.concatenate(p) for p in zip(*pairs))
+    x, y = pos[:, 0], pos[:, 1]
+    dx, dy = x[i] - x[j], y[i] - y[j]
+    scale = 1 / np.maximum(dx**2 + dy**2, 1e-12)
+    dx *= scale
+    dy *= scale
+    force[:, 0] += np.bincount(i, weights=dx, minlength=n) \
+        - np.bincount(j, weights=dx, minlength=n)
+    force[:, 1] += np.bincount(i, weights=dy, minlength=n) \
+        - np.bincount(j, weights=dy, minlength=n)
+    return force * k**2
+
+
+def forceLayout(matrix, iterations=30, seed=0, weighted=False, init=None,
+                leafSize=8):
+    """
+    Function for a force-directed (Fruchterman-Reingold) layout with
+    Barnes-Hut repulsion, see ``repulsion``.
+
+    Parameters
+    ----------
+    matrix : numpy array or scipy sparse matrix (states, states)
+        The rate or flux matrix, the direction of the edges is ignored.
+    iterations : int, optional
+        Number of steps, the step size cools down linearly. The default is
+        30, the spectral start is already untangled.
+    seed : int, optional
+        Seed of the small jitter separating coinciding start positions. The
+        default is 0.
+    weighted : bool, optional
+        Attract along edges in proportion to their weight, else every edge
+        pulls the same (rates and fluxes span many orders of magnitude).
+        The default is False.
+    init : numpy array (states, 2), optional
+        Start positions. The default is None, the spectral layout.
+    leafSize : int, optional
+        See ``repulsion``. The default is 8.
+
+    Returns
+    -------
+    coords : numpy array (states, 2)
+        Unscaled positions.
+
+    """
+    A = graphMatrix(matrix, weighted=weighted).tocoo()
+    n = A.shape[0]
+    rng = np.random.default_rng(seed)
+    pos = spectralLayout(matrix, seed=seed) if init is None \
+        else np.array(init, dtype=float)
+    if n < 2:
+        return pos
+    # start in the unit square, the ideal edge length is then 1 / sqrt(n)
+    pos = (pos - pos.min(axis=0)) / max(np.ptp(pos, axis=0).max(), 1e-12)
+    pos += rng.normal(scale=1e-3, size=pos.shape)
+    k = 1 / np.sqrt(n)
+    rows, cols, w = A.row, A.col, A.data
+    for step in range(iterations):
+        temperature = 0.1 * (1 - step / iterations)
+        force = repulsion(pos, k, leafSize=leafSize)
+        delta = pos[rows] - pos[cols]
+        dist = np.sqrt(np.sum(delta**2, axis=1))
+        pull = delta * (w * dist / k)[:, np.newaxis] # d^2 / k along the edge
+        force[:, 0] -= np.bincount(rows, weights=pull[:, 0], minlength=n)
+        force[:, 1] -= np.bincount(rows, weights=pull[:, 1], minlength=n)
+        length = np.maximum(np.sqrt(np.sum(force**2, axis=1)), 1e-12)
+        pos += force * (np.minimum(length, temperature) / length)[:, np.newaxis]
+    return pos
+
+
+def layeredLayout(matrix, layers, sweeps=4):
+    """
+    Function for a layered layout: one row per layer (e.g. ``ionCounts``),
+    with the nodes of a row ordered by the mean position of their
+    neighbours to reduce crossings.
+
+    Parameters
+    ----------
+    matrix : numpy array or scipy sparse matrix (states, states)
+        The rate or flux matrix, the direction of the edges is ignored.
+    layers : array like of int (states,)
+        The row of every node, row 0 at the top.
+    sweeps : int, optional
+        Number of barycenter reorderings. The default is 4.
+
+    Returns
+    -------
+    coords : numpy array (states, 2)
+        Unit spacing within and between rows, rows centered on x = 0.
+
+    """
+    A = graphMatrix(matrix, weighted=False)
+    layers = np.asarray(layers, dtype=np.int64)
+    n = layers.shape[0]
+    degree = np.asarray(A.sum(axis=1)).ravel()
+    rows, rowOf, rowSize = np.unique(layers, return_inverse=True,
+                                     return_counts=True)
+
+    def place(keys):
+        # x = rank within the row, rows centered
+        order = np.lexsort((np.arange(n), keys, layers))
+        sortedLayers = layers[order]
+        x = np.empty(n)
+        x[order] = np.arange(n) - np.searchsorted(sortedLayers, sortedLayers)
+        return x - (rowSize[rowOf] - 1) / 2
+
+    x = place(np.zeros(n))
+    for sweep in range(sweeps):
+        barycenter = np.where(degree > 0, A @ x / np.maximum(degree, 1), x)
+        x = place(barycenter)
+    return np.column_stack((x, layers.astype(float)))
+
+
+def fitCoords(coords, size):
+    """
+    Function to scale coordinates into a (width, height) box at the origin,
+    keeping the aspect ratio.
+    """
+    coords = np.asarray(coords, dtype=float)
+    lo = coords.min(axis=0)
+    span = np.ptp(coords, axis=0)
+    scale = np.min(np.asarray(size, dtype=float) / np.where(span > 0, span,
+                                                              np.inf))
+    if not np.isfinite(scale):
+        scale = 1
+    return (coords - lo) * scale
+
+
+def layout(matrix, method='force', seed=0, size=None, layers=None,
+           occupancies=None, **kwargs):
+    """
+    Function to lay out a network for ``network()``.
+
+    Parameters
+    ----------
+    matrix : numpy array or scipy sparse matrix (states, states)
+        The rate or flux matrix.
+    method : str, optional
+        'spectral', 'force' or 'layered'. The default is 'force'.
+    seed : int, optional
+        Seed, the same seed gives the same layout. The default is 0.
+    size : tuple, optional
+        (width, height) of the drawing. The default is None, 20 per node
+        along both sides of a square of sqrt(states) nodes.
+    layers : array like of int (states,), optional
+        Rows of the layered layout. The default is None, the ``ionCounts``
+        of the occupancies.
+    occupancies : list of str, optional
+        Occupancy strings for the layered layout. The default is None.
+    **kwargs
+        Passed on to the layout function.
+
+    Returns
+    -------
+    coords : numpy array (states, 2)
+
+    """
+    n = matrix.shape[0]
+    if method == 'spectral':
+        coords = spectralLayout(matrix, seed=seed, **kwargs)
+    elif method == 'force':
+        coords = forceLayout(matrix, seed=seed, **kwargs)
+    elif method == 'layered':
+        if layers is None:
+            if occupancies is None:
+                raise ValueError('the layered layout needs layers or '
+                                 'occupancies')
+            layers = ionCounts(occupancies)
+        coords = layeredLayout(matrix, layers, **kwargs)
+    else:
+        raise ValueError(f'unknown layout method {method}')
+    if size is None:
+        side = 20 * np.sqrt(n)
+        size = (side, side)
+    return fitCoords(coords, size)
@@ -0,0 +1,513 @@
+# -*- coding: utf-8 -*-
+"""
+Coarse-graining of rate networks into a few macrostates.
+
+Models with 243 and more microstates are simulated and drawn state by
+state. ``lumpModel`` partitions the microstates, either with PCCA+ on the
+slowest eigenvectors of the rate matrix or by binning the committor
+between two sets, and returns a ``LumpedModel`` with the membership
+matrix, the macrostate populations, a lumped rate matrix and the
+occupancy strings of every macrostate.
+
+The lumped rates are the local-equilibrium rates of the crisp partition,
+Q_IJ = sum_{i in I, j in J} pi_i Q_ij / Pi_I. They form a proper rate
+matrix, so ``KineticMonteCarlo`` and ``network`` take it as they are, and
+the stationary distribution of the lumped model is exactly the summed
+stationary distribution of its members. How much of the slow kinetics
+survives the lumping is measured by ``LumpedModel.kineticError``. Without
+a gap in the spectrum (e.g. the filter rates of ``benchmark``) these
+rates are several times too fast; ``LumpedModel.projectedRates``, the
+PCCA+ coarse generator, keeps the slowest eigenvalues of a reversible Q
+exactly but can have negative off-diagonal rates, so it is for analysis
+only. The lumped network is drawn with ``LumpedModel.drawNetwork``.
+
+PCCA+ follows Roeblitz and Weber (2013): the eigenvectors of the
+reversibilized generator, an inner simplex search for the vertices and
+the feasible transformation to memberships, optimized for crispness
+with Nelder-Mead for few macrostates.
+"""
+
+import numpy as np
+import scipy.linalg
+import scipy.optimize
+import scipy.sparse
+import scipy.sparse.linalg
+
+from .drawing import network
+from .estimators import RateNetwork, asIndexArray
+from .montecarlo import KineticMonteCarlo
+from .validation import DENSE_EIGEN, SHIFT, rateTimescales
+
+# up to this many macrostates the PCCA+ memberships are optimized
+OPTIMIZE_LIMIT = 10
+
+
+def slowEigenvectors(rateMatrix, k, pi):
+    """
+    Function for the k slowest eigenvectors of the reversibilized rate
+    matrix (Q + Q_hat) / 2, Q_hat the time reversal, normalized with pi.
+
+    Parameters
+    ----------
+    rateMatrix : scipy sparse matrix (states, states)
+    k : int
+    pi : numpy array (states,)
+        The stationary distribution, all positive.
+
+    Returns
+    -------
+    values : numpy array (k,)
+        The eigenvalues, 0 first, then decreasing.
+    X : numpy array (states, k)
+        The eigenvectors, X^T diag(pi) X = I, the first one constant.
+
+    """
+    n = rateMatrix.shape[0]
+    root = np.sqrt(pi)
+    # D^1/2 Q D^-1/2 symmetrized is similar to the reversibilized Q
+    A = scipy.sparse.diags(root) @ rateMatrix @ scipy.sparse.diags(1 / root)
+    S = scipy.sparse.csr_matrix((A + A.T) / 2)
+    if n <= DENSE_EIGEN or k >= n - 1:
+        values, V = scipy.linalg.eigh(S.toarray())
+    else:
+        sigma = SHIFT * np.abs(S.diagonal()).max()
+        values, V = scipy.sparse.linalg.eigsh(S, k=k, sigma=sigma, which='LM')
+    order = np.argsort(-values)[:k]
+    X = V[:, order] / root[:, np.newaxis]
+    X[:, 0] = 1.0
+    return (values[order], X)
+
+
+def innerSimplex(X):
+    """
+    Helper function for the inner simplex algorithm of PCCA+: the states
+    spanning the largest simplex in eigenvector space, one per
+    macrostate, found by Gram-Schmidt from the row of largest norm.
+    """
+    k = X.shape[1]
+    vertices = np.zeros(k, dtype=np.int64)
+    vertices[0] = np.argmax(np.linalg.norm(X, axis=1))
+    ortho = X - X[vertices[0]]
+    for m in range(1, k):
+        if m > 1:
+            direction = ortho[vertices[m - 1]].copy()
+            ortho -= np.outer(ortho @ direction, direction)
+        dist = np.linalg.norm(ortho, axis=1)
+        dist[vertices[:m]] = -1
+        vertices[m] = np.argmax(dist)
+        ortho /= np.linalg.norm(ortho[vertices[m]])
+    return vertices
+
+
+def feasibleTransformation(inner, X):
+    """
+    Helper function completing the (k-1, k-1) inner block of a PCCA+
+    transformation to the feasible (k, k) matrix, rows of X A summing to
+    one and non-negative.
+    """
+    k = inner.shape[0] + 1
+    A = np.zeros((k, k))
+    A[1:, 1:] = inner
+    A[1:, 0] = -inner.sum(axis=1)
+    A[0] = np.max(-X[:, 1:] @ A[1:], axis=0)
+    return A / A[0].sum()
+
+
+def crispness(inner, X):
+    """
+    Helper function for the negative PCCA+ crispness objective,
+    -sum_ij A_ji^2 / A_0i, of a flattened inner block.
+    """
+    k = X.shape[1]
+    A = feasibleTransformation(inner.reshape(k - 1, k - 1), X)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        value = -np.sum(A**2 / A[0])
+    return value if np.isfinite(value) else 0.0
+
+
+def pccaMemberships(rateMatrix, numMacrostates, pi=None, optimize=None):
+    """
+    Function for PCCA+ memberships of the microstates.
+
+    Parameters
+    ----------
+    rateMatrix : numpy array or scipy sparse matrix (states, states)
+        The rate matrix Q.
+    numMacrostates : int
+        The number of macrostates. It should end at a gap of the
+        spectrum, see ``slowEigenvectors``.
+    pi : numpy array (states,), optional
+        The stationary distribution. The default is None, solve for it.
+    optimize : bool, optional
+        Optimize the crispness of the memberships. The default is None,
+        only up to ``OPTIMIZE_LIMIT`` macrostates. Without optimization
+        the inner simplex memberships are used as they are; past the gap
+        of the spectrum some of their macrostates are not the largest
+        membership of any microstate, and ``LumpedModel`` drops those.
+
+    Returns
+    -------
+    memberships : numpy array (states, numMacrostates)
+        Non-negative, rows summing to one.
+
+    """
+    Q = scipy.sparse.csr_matrix(rateMatrix, dtype=float)
+    if pi is None:
+        pi = RateNetwork(Q).stationaryDistribution()
+    if numMacrostates == 1:
+        return np.ones((Q.shape[0], 1))
+    values, X = slowEigenvectors(Q, numMacrostates, pi)
+    A = np.linalg.inv(X[innerSimplex(X)])
+    if optimize is None:
+        optimize = numMacrostates <= OPTIMIZE_LIMIT
+    if optimize:
+        result = scipy.optimize.minimize(crispness, A[1:, 1:].ravel(),
+                                         args=(X,), method='Nelder-Mead')
+        A = result.x.reshape(numMacrostates - 1, numMacrostates - 1)
+    else:
+        A = A[1:, 1:]
+    chi = np.maximum(X @ feasibleTransformation(A, X), 0)
+    return chi / chi.sum(axis=1, keepdims=True)
+
+
+def committorMemberships(rateMatrix, source, sink, numMacrostates):
+    """
+    Function for a partition of the microstates into numMacrostates equal
+    bins of the forward committor from source to sink, e.g. the
+    conduction steps between an empty and a filled filter.
+
+    Parameters
+    ----------
+    rateMatrix : numpy array or scipy sparse matrix (states, states)
+    source, sink : int or list of int
+        The sets A and B, put in the first and last bin.
+    numMacrostates : int
+
+    Returns
+    -------
+    memberships : numpy array (states, numMacrostates)
+        Crisp, one 1 per row. Empty bins are dropped.
+
+    """
+    q = RateNetwork(rateMatrix).committor(source, sink)
+    bins = np.minimum((q * numMacrostates).astype(np.int64),
+                      numMacrostates - 1)
+    bins[asIndexArray(source)] = 0
+    bins[asIndexArray(sink)] = numMacrostates - 1
+    used, assignments = np.unique(bins, return_inverse=True)
+    memberships = np.zeros((q.shape[0], used.shape[0]))
+    memberships[np.arange(q.shape[0]), assignments] = 1
+    return memberships
+
+
+class LumpedModel:
+    """
+    A rate network lumped into macrostates.
+
+    Parameters
+    ----------
+    rateMatrix : numpy array or scipy sparse matrix (states, states)
+        The microscopic rate matrix Q.
+    memberships : numpy array (states, macrostates)
+        Membership of every microstate in every macrostate, rows summing
+        to one, e.g. from ``pccaMemberships``. Macrostates that are not
+        the largest membership of any microstate are dropped, they would
+        be absorbing states of the lumped rates.
+    pi : numpy array (states,), optional
+        The stationary distribution. The default is None, solve for it.
+    occupancies : list of str, optional
+        The occupancy string of every microstate, e.g. the occuList.
+
+    Attributes
+    ----------
+    numMacrostates : int
+        The number of macrostates kept.
+    emptyMacrostates : int
+        The number of macrostates dropped.
+    assignments : numpy array of int (states,)
+        The macrostate of every microstate, its largest membership.
+    populations : numpy array (macrostates,)
+        Stationary population of every macrostate.
+    rateMatrix : scipy.sparse.csr_matrix (macrostates, macrostates)
+        The lumped rates, see the module description.
+
+    """
+
+    def __init__(self, rateMatrix, memberships, pi=None, occupancies=None):
+        self.microRates = scipy.sparse.csr_matrix(rateMatrix, dtype=float)
+        self.numStates = self.microRates.shape[0]
+        if pi is None:
+            pi = RateNetwork(self.microRates).stationaryDistribution()
+        self.pi = np.asarray(pi, dtype=float)
+        memberships = np.asarray(memberships, dtype=float)
+        used = np.unique(np.argmax(memberships, axis=1))
+        self.emptyMacrostates = memberships.shape[1] - used.shape[0]
+        memberships = memberships[:, used]
+        self.memberships = memberships / memberships.sum(axis=1,
+                                                         keepdims=True)
+        self.numMacrostates = used.shape[0]
+        self.assignments = np.argmax(self.memberships, axis=1)
+        self.occupancies = occupancies
+        self.populations = np.bincount(self.assignments, weights=self.pi,
+                                       minlength=self.numMacrostates)
+        self.rateMatrix = self.localEquilibriumRates()
+        self._engine = None
+
+    def indicator(self):
+        """
+        Returns the crisp (states, macrostates) assignment matrix.
+        """
+        return scipy.sparse.csr_matrix(
+            (np.ones(self.numStates), (np.arange(self.numStates),
+                                       self.assignments)),
+            shape=(self.numStates, self.numMacrostates))
+
+    def aggregate(self, matrix):
+        """
+        Function to sum a microstate matrix, e.g. the reactive flux, over
+        pairs of macrostates.
+
+        Parameters
+        ----------
+        matrix : numpy array or scipy sparse matrix (states, states)
+
+        Returns
+        -------
+        lumped : scipy.sparse.csr_matrix (macrostates, macrostates)
+            The sums between different macrostates, the diagonal (flux
+            within a macrostate) is dropped.
+
+        """
+        M = self.indicator()
+        lumped = scipy.sparse.csr_matrix(M.T @ scipy.sparse.csr_matrix(matrix)
+                                         @ M)
+        lumped.setdiag(0)
+        lumped.eliminate_zeros()
+        return lumped
+
+    def localEquilibriumRates(self):
+        """
+        Helper function for the lumped rate matrix, the aggregated
+        stationary flux pi_i Q_ij divided by the population of the
+        starting macrostate.
+        """
+        flux = self.aggregate(scipy.sparse.diags(self.pi) @ self.microRates)
+        with np.errstate(divide='ignore'):
+            inv = np.where(self.populations > 0, 1 / self.populations, 0)
+        Q = scipy.sparse.csr_matrix(scipy.sparse.diags(inv) @ flux)
+        Q.setdiag(-np.asarray(Q.sum(axis=1)).ravel())
+        return Q
+
+    def projectedRates(self):
+        """
+        Function for the PCCA+ coarse generator
+        (chi^T D chi)^-1 chi^T D Q chi, D = diag(pi).
+
+        Returns
+        -------
+        Q : numpy array (macrostates, macrostates)
+            Rows sum to zero, off-diagonal entries can be negative.
+
+        """
+        weighted = self.memberships * self.pi[:, np.newaxis]
+        return np.linalg.solve(weighted.T @ self.memberships,
+                               weighted.T @ (self.microRates
+                                             @ self.memberships))
+
+    def project(self, values):
+        """
+        Returns the sum of a per-microstate quantity (e.g. probabilities) in
+        every macrostate.
+        """
+        return np.bincount(self.assignments, weights=values,
+                           minlength=self.numMacrostates)
+
+    def coords(self, coords):
+        """
+        Function for macrostate positions, the population-weighted mean of
+        the positions of their microstates.
+
+        Parameters
+        ----------
+        coords : numpy array (states, 2)
+
+        Returns
+        -------
+        coords : numpy array (macrostates, 2)
+
+        """
+        coords = np.asarray(coords, dtype=float)
+        weights = self.project(self.pi)
+        return np.column_stack([self.project(self.pi * c) for c in coords.T]) \
+            / np.where(weights > 0, weights, 1)[:, np.newaxis]
+
+    def members(self, macrostate):
+        """
+        Returns the microstates of a macrostate, most populated first.
+        """
+        members = np.flatnonzero(self.assignments == macrostate)
+        return members[np.argsort(-self.pi[members], kind='stable')]
+
+    def memberOccupancies(self, macrostate):
+        """
+        Returns the occupancy strings of a macrostate, most populated first.
+        """
+        if self.occupancies is None:
+            raise ValueError('the model has no occupancies')
+        return [self.occupancies[i] for i in self.members(macrostate)]
+
+    def labels(self):
+        """
+        Returns the occupancy string of the most populated member of every
+        macrostate, e.g. for ``drawOccupancy``.
+        """
+        return [self.memberOccupancies(I)[0]
+                for I in range(self.numMacrostates)]
+
+    def lift(self, traj):
+        """
+        Function to map a microstate trajectory onto the macrostates.
+
+        Parameters
+        ----------
+        traj : numpy array (steps,) or (steps, 2)
+            States, or the (time, State) rows of ``monteCarloSim``.
+
+        Returns
+        -------
+        traj : numpy array
+            The same layout with macrostates.
+
+        """
+        traj = np.asarray(traj)
+        if traj.ndim == 2:
+            lifted = traj.copy()
+            lifted[:, 1] = self.assignments[traj[:, 1].astype(np.int64)]
+            return lifted
+        return self.assignments[traj.astype(np.int64)]
+
+    def simulate(self, steps, start=None, seed=None):
+        """
+        Function to run a kinetic Monte Carlo trajectory of the lumped
+        model, see ``KineticMonteCarlo.simulate``.
+
+        Returns
+        -------
+        traj : numpy array (steps, 2)
+            (time, Macrostate) rows.
+
+        """
+        if self._engine is None:
+            self._engine = KineticMonteCarlo(self.rateMatrix)
+        return self._engine.simulate(steps, start=start, seed=seed)
+
+    def drawNetwork(self, coords, matrix=None, widths=None, **kw):
+        """
+        Function to draw the lumped network with ``network``, one node per
+        macrostate sized by its population.
+
+        Parameters
+        ----------
+        coords : numpy array (states, 2) or str
+            Microstate positions, averaged per macrostate by ``coords``,
+            or a ``layout`` method applied to the lumped network.
+        matrix : numpy array or scipy sparse matrix (states, states),
+            optional
+            The microstate weights to aggregate, e.g. the reactive flux.
+            The default is None, the stationary flux pi_i Q_ij.
+        widths : callable, optional
+            Maps the aggregated matrix to stroke widths, e.g.
+            ``ion_kinetics.figures.fluxWidths``. The default is None,
+            scale the largest entry to 1.
+        **kw
+            Further ``network`` keywords.
+
+        Returns
+        -------
+        scene : NetworkScene
+
+        """
+        if matrix is None:
+            matrix = scipy.sparse.diags(self.pi) @ self.microRates
+        lumped = self.aggregate(matrix)
+        if widths is None:
+            lumped = lumped / max(abs(lumped).max(), 1e-300)
+        else:
+            lumped = widths(lumped)
+        if not isinstance(coords, str):
+            coords = self.coords(coords)
+        return network(self.numMacrostates, self.populations, coords, lumped,
+                       **kw)
+
+    def kineticError(self, k=None, projected=False):
+        """
+        Function for the relative error of the slowest relaxation times of
+        the lumped model against the microscopic ones.
+
+        Parameters
+        ----------
+        k : int, optional
+            The number of processes compared. The default is None,
+            macrostates - 1.
+        projected : bool, optional
+            Compare ``projectedRates`` instead of ``rateMatrix``. The
+            default is False.
+
+        Returns
+        -------
+        micro : numpy array (k,)
+        lumped : numpy array (k,)
+            The relaxation times -1/lambda_i.
+        error : numpy array (k,)
+            (lumped - micro) / micro.
+
+        """
+        if k is None:
+            k = self.numMacrostates - 1
+        micro = rateTimescales(self.microRates, k=k)
+        lumped = rateTimescales(self.projectedRates() if projected
+                                else self.rateMatrix, k=k)
+        return (micro, lumped, (lumped - micro) / micro)
+
+
+def lumpModel(rateMatrix, numMacrostates, method='pcca', pi=None,
+              source=None, sink=None, occupancies=None):
+    """
+    Function to coarse-grain a rate network.
+
+    Parameters
+    ----------
+    rateMatrix : numpy array or scipy sparse matrix (states, states)
+        The rate matrix Q.
+    numMacrostates : int
+        The number of macrostates, e.g. 20 to 50 for the filter models.
+    method : str, optional
+        'pcca' for PCCA+ or 'committor' for committor bins between source
+        and sink. The default is 'pcca'.
+    pi : numpy array (states,), optional
+        The stationary distribution. The default is None, solve for it.
+    source, sink : int or list of int, optional
+        The sets A and B of the 'committor' method.
+    occupancies : list of str, optional
+        The occupancy string of every microstate.
+
+    Returns
+    -------
+    model : LumpedModel
+        Its ``numMacrostates`` can be smaller than requested, macrostates
+        without members are dropped (``emptyMacrostates``).
+
+    """
+    Q = scipy.sparse.csr_matrix(rateMatrix, dtype=float)
+    if pi is None:
+        pi = RateNetwork(Q).stationaryDistribution()
+    if method == 'pcca':
+        memberships = pccaMemberships(Q, numMacrostates, pi=pi)
+    elif method == 'committor':
+        if source is None or sink is None:
+            raise ValueError("the 'committor' method needs a source and a "
+                             "sink")
+        memberships = committorMemberships(Q, source, sink, numMacrostates)
+    else:
+        raise ValueError(f'unknown lumping method {method}')
+    return LumpedModel(Q, memberships, pi=pi, occupancies=occupancies)
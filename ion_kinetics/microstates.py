@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+Bit-packed microstates of the single-file filter.
+
+The notebooks keep microstates as arrays of token strings
+(``np.array(list(product(["V", "W", "K"], repeat=5)))``) and compare
+characters with ``== "K"`` for every transition. ``Microstates`` packs each
+site into 2 bits of an integer, site 0 in the highest bits, and precomputes
+per state tables (K count, end sites, allowed moves and their conduction)
+so that downstream code works with integer indices only.
+
+A state is referred to by its index, the row of the rate matrix, which is
+the base ``len(tokens)`` code of ``ion_kinetics.ratematrix``. The packed
+integer is ``Microstates.packed[index]`` and back with ``unpack``.
+"""
+
+import numpy as np
+
+from .ratematrix import MOVES, conductionMatrix, encodeMicrostates, \
+    filterRateMatrix, microstateDigits
+
+# bits per site of a packed microstate
+SITE_BITS = 2
+
+
+class Microstates:
+    """
+    All microstates of a filter with 2-bit packed sites and lookup tables.
+
+    Parameters
+    ----------
+    numSites : int
+        The number of binding sites. The tables cover all
+        len(tokens)**numSites states.
+    tokens : sequence of str, optional
+        The site tokens, vacancy first, at most 4. The default is
+        ('V', 'W', 'K').
+    ion : str, optional
+        The token counted by ``ionCount``. The default is 'K'.
+
+    Attributes
+    ----------
+    digits : numpy array of int8 (states, numSites)
+        Token index of each site.
+    packed : numpy array of uint32 or uint64 (states,)
+        The 2-bit packed code of every state.
+    ionCount : numpy array of int8 (states,)
+        Number of ion tokens of every state.
+    first, last : numpy array of int8 (states,)
+        Token index at site 0 and at the last site.
+
+    """
+
+    def __init__(self, numSites, tokens=('V', 'W', 'K'), ion='K'):
+        if len(tokens) > 2**SITE_BITS:
+            raise ValueError(f'at most {2**SITE_BITS} tokens fit in '
+                             f'{SITE_BITS} bits')
+        if numSites * SITE_BITS > 64:
+            raise ValueError('at most 32 sites fit in 64 bits')
+        self.numSites = numSites
+        self.tokens = tuple(tokens)
+        self.ion = ion
+        self.numStates = len(tokens)**numSites
+        self.dtype = np.uint32 if numSites * SITE_BITS <= 32 else np.uint64
+        self.shifts = (SITE_BITS * np.arange(numSites - 1, -1, -1)).astype(
+            self.dtype)
+        self.digits = microstateDigits(numSites, len(tokens))
+        self.packed = np.bitwise_or.reduce(
+            self.digits.astype(self.dtype) << self.shifts, axis=1)
+        self.ionCount = np.sum(self.digits == self.tokens.index(ion), axis=1,
+                               dtype=np.int8)
+        self.first = self.digits[:, 0]
+        self.last = self.digits[:, -1]
+        self.powers = len(tokens)**np.arange(numSites - 1, -1, -1)
+        self.singleChars = all(isinstance(t, str) and len(t) == 1
+                               for t in self.tokens)
+        self._moves = None
+
+    def __len__(self):
+        return self.numStates
+
+    def site(self, packed, a):
+        """
+        Returns the token index at site a of packed states.
+        """
+        return (np.asarray(packed, dtype=self.dtype)
+                >> self.shifts[a]) & self.dtype(2**SITE_BITS - 1)
+
+    def unpack(self, packed):
+        """
+        Function to turn packed codes into state indices.
+
+        Parameters
+        ----------
+        packed : array like of int
+
+        Returns
+        -------
+        index : numpy array of int64
+            Rows of the rate matrix.
+
+        """
+        packed = np.asarray(packed, dtype=self.dtype)
+        index = np.zeros(packed.shape, dtype=np.int64)
+        for a in range(self.numSites):
+            index += self.site(packed, a).astype(np.int64) * self.powers[a]
+        return index
+
+    def encode(self, occupancies):
+        """
+        Function for the state index of occupancy strings.
+
+        Parameters
+        ----------
+        occupancies : str or list of str
+            Occupancies such as "K W V K W", e.g. the occuList.
+
+        Returns
+        -------
+        index : int or numpy array of int64
+
+        """
+        if isinstance(occupancies, str):
+            return int(self.encode([occupancies])[0])
+        width = 2 * self.numSites - 1
+        if self.singleChars and all(
+                len(s) == width for s in occupancies):
+            # one character per token: read them straight off the bytes
+            chars = np.frombuffer(''.join(occupancies).encode('ascii'),
+                                  dtype=np.uint8).reshape(-1, width)[:, ::2]
+            lookup = np.full(256, -1, dtype=np.int64)
+            for t, token in enumerate(self.tokens):
+                lookup[ord(token)] = t
+            digits = lookup[chars]
+            if (digits < 0).any():
+                raise ValueError('unknown token in occupancies')
+            return digits @ self.powers
+        return encodeMicrostates([s.split() for s in occupancies],
+                                 tokens=[str(t) for t in self.tokens])
+
+    def decode(self, index):
+        """
+        Function for the occupancy strings of state indices.
+
+        Parameters
+        ----------
+        index : int or array like of int
+
+        Returns
+        -------
+        occupancies : str or list of str
+            Tokens separated by spaces, e.g. "K W V K W".
+
+        """
+        if np.ndim(index) == 0:
+            return self.decode([index])[0]
+        digits = self.digits[np.asarray(index, dtype=np.int64)]
+        if self.singleChars:
+            chars = np.frombuffer(''.join(self.tokens).encode('ascii'),
+                                  dtype=np.uint8)
+            out = np.full((digits.shape[0], 2 * self.numSites - 1), ord(' '),
+                          dtype=np.uint8)
+            out[:, ::2] = chars[digits]
+            return out.view(f'S{out.shape[1]}').ravel().astype(str).tolist()
+        return [' '.join(str(self.tokens[t]) for t in row) for row in digits]
+
+    def tokenArray(self, index=None):
+        """
+        Returns the token strings of states (all by default) as
+        ``np.array(list(product(tokens, repeat=numSites)))`` does.
+        """
+        digits = self.digits if index is None else self.digits[index]
+        return np.asarray(self.tokens)[digits]
+
+    def moves(self):
+        """
+        Function for the table of allowed moves, every hop into a vacancy
+        and every entry/exit of W and K at both ends, as in
+        ``isallowedTransition``. Computed on first use.
+
+        Returns
+        -------
+        neighbours : scipy.sparse.csr_matrix of bool (states, states)
+            neighbours[i, j] is True if i -> j is a single move. Row i lists
+            the neighbours of i in ``indices[indptr[i]:indptr[i+1]]``.
+        conductions : scipy.sparse.csr_matrix of int (states, states)
+            Net ion charge carried through the filter by i -> j, +1 into the
+            filter at site 0 or out at the last site, -1 the other way.
+
+        """
+        if self._moves is None:
+            rates = {token: dict.fromkeys(MOVES, 1)
+                     for token in self.tokens[1:]}
+            Q, conds = filterRateMatrix(self.numSites, rates,
+                                        tokens=self.tokens,
+                                        charges={self.ion: 1})
+            neighbours = Q.copy()
+            neighbours.setdiag(0)
+            neighbours.eliminate_zeros()
+            self._moves = (neighbours.astype(bool), conductionMatrix(Q, conds))
+        return self._moves
+
+    @property
+    def neighbours(self):
+        return self.moves()[0]
+
+    @property
+    def conductions(self):
+        return self.moves()[1]
+
+    def ionDelta(self, starts, ends):
+        """
+        Returns the change of the ion count of i -> j jumps, the ``diff`` of
+        ``isConduction``, for arrays of start and end states.
+        """
+        return self.ionCount[ends].astype(np.int64) - self.ionCount[starts]
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+Kinetic Monte Carlo (Gillespie) simulation of continuous-time Markov chains.
+
+The jump tables are built once per rate matrix so that every step costs a
+single binary search instead of the O(N^2) ``cum_prob`` scan used in the
+notebooks.
+"""
+
+from bisect import bisect_right
+
+import numpy as np
+import scipy.sparse
+
+
+def offDiagonalRates(rateMatrix):
+    """
+    Helper function to split a rate matrix into its off-diagonal transitions
+    and the total exit rate of every state.
+
+    Parameters
+    ----------
+    rateMatrix : numpy array or scipy sparse matrix (states, states)
+        The rate matrix Q. The diagonal is ignored, the exit rates are taken
+        from the off-diagonal row sums.
+
+    Returns
+    -------
+    offDiag : scipy.sparse.csr_matrix (states, states)
+        The off-diagonal rates with explicit zeros removed.
+    exitRates : numpy array (states,)
+        The total rate of leaving each state, i.e. -Q[i, i].
+
+    """
+    offDiag = scipy.sparse.csr_matrix(rateMatrix, dtype=float, copy=True)
+    offDiag.setdiag(0)
+    offDiag.eliminate_zeros()
+    offDiag.sort_indices()
+    exitRates = np.asarray(offDiag.sum(axis=1)).ravel()
+    return (offDiag, exitRates)
+
+
+class KineticMonteCarlo:
+    """
+    Precomputed jump tables for Gillespie simulations of a rate matrix.
+
+    For every state i the exit probabilities Q[i, j] / -Q[i, i] are stored as
+    a cumulative table in [0, 1] laid out like the CSR rows of Q, so the next
+    state is found with a binary search within the ``indptr`` slice of the
+    current state. Every row keeps its own scale, so no digits are lost to the
+    row offset however many states there are.
+
+    Parameters
+    ----------
+    rateMatrix : numpy array or scipy sparse matrix (states, states)
+        The rate matrix Q.
+
+    """
+
+    def __init__(self, rateMatrix):
+        offDiag, exitRates = offDiagonalRates(rateMatrix)
+        self.numStates = offDiag.shape[0]
+        self.exitRates = exitRates
+        self.absorbing = exitRates == 0 # states that can never be left
+        self.indptr = offDiag.indptr.astype(np.int64)
+        degrees = np.diff(self.indptr)
+        rows = np.repeat(np.arange(self.numStates), degrees)
+        cumProb = offDiag.data / exitRates[rows]
+        # running sum of every row on its own, one column at a time, so that
+        # no row carries the sums of the rows before it
+        for k in range(1, degrees.max(initial=0)):
+            pos = self.indptr[:-1][degrees > k] + k
+            cumProb[pos] += cumProb[pos - 1]
+        # the last entry of every row must be exactly 1 so that a uniform
+        # number can never fall past the end of its row
+        cumProb[self.indptr[1:][~self.absorbing] - 1] = 1.0
+        self.cumulative = cumProb # row i lives in indptr[i]:indptr[i + 1]
+        self.targets = offDiag.indices.astype(np.int64)
+
+    def nextStates(self, states, u):
+        """
+        Function to draw the next state of a set of walkers.
+
+        Parameters
+        ----------
+        states : numpy array of int (walkers,)
+            The current state of each walker.
+        u : numpy array (walkers,)
+            Uniform random numbers in [0, 1).
+
+        Returns
+        -------
+        newStates : numpy array of int (walkers,)
+            The state each walker jumps to. Walkers in absorbing states stay.
+
+        """
+        states = np.asarray(states, dtype=np.int64)
+        u = np.asarray(u, dtype=float)
+        absorbing = self.absorbing[states]
+        # binary search of every walker within the row of its own state
+        lo = self.indptr[states]
+        hi = np.where(absorbing, lo, self.indptr[states + 1] - 1)
+        while (lo < hi).any():
+            mid = (lo + hi) // 2
+            right = self.cumulative[mid] <= u
+            lo = np.where(right, mid + 1, lo)
+            hi = np.where(right, hi, mid)
+        pos = np.minimum(lo, self.targets.shape[0] - 1)
+        return np.where(absorbing, states, self.targets[pos])
+
+    def simulate(self, steps, start=None, seed=None):
+        """
+        Function to run a single kinetic Monte Carlo trajectory.
+
+        Parameters
+        ----------
+        steps : int
+            The number of jumps.
+        start : int, optional
+            The initial state. The default is a uniformly random state.
+        seed : int or numpy Generator or SeedSequence, optional
+            Seed for the random number generator. The default is None.
+
+        Returns
+        -------
+        traj : numpy array (steps, 2)
+            The first column is the time spent in the state listed in the
+            second column, i.e., (time, State), same as ``monteCarloSim``.
+
+        """
+        rng = np.random.default_rng(seed)
+        if start is None:
+            start = rng.integers(self.numStates)
+        u = rng.random(steps)
+        # plain python lists are much faster than numpy scalars for the
+        # sequential part of the walk
+        cumulative = self.cumulative.tolist()
+        targets = self.targets.tolist()
+        indptr = self.indptr.tolist()
+        absorbing = self.absorbing.tolist()
+        state = int(start)
+        states = []
+        for r in u.tolist():
+            states.append(state)
+            if not absorbing[state]:
+                pos = bisect_right(cumulative, r, indptr[state],
+                                   indptr[state + 1] - 1)
+                state = targets[pos]
+        states = np.array(states, dtype=np.int64)
+        with np.errstate(divide='ignore'):
+            times = rng.standard_exponential(steps) / self.exitRates[states]
+        return np.column_stack((times, states))
+
+    def simulateBatch(self, steps, walkers, start=None, seed=None):
+        """
+        Function to advance many independent walkers in lockstep.
+
+        Parameters
+        ----------
+        steps : int
+            The number of jumps per walker.
+        walkers : int
+            The number of independent trajectories.
+        start : int or numpy array of int (walkers,), optional
+            The initial states. The default is a uniformly random state for
+            every walker.
+        seed : int or numpy Generator or SeedSequence, optional
+            Seed for the random number generator. The default is None.
+
+        Returns
+        -------
+        trajs : numpy array (walkers, steps, 2)
+            One ``(time, State)`` trajectory per walker.
+
+        """
+        rng = np.random.default_rng(seed)
+        if start is None:
+            states = rng.integers(self.numStates, size=walkers)
+        else:
+            states = np.broadcast_to(np.asarray(start, dtype=np.int64),
+                                     (walkers,)).copy()
+        trajs = np.empty((walkers, steps, 2))
+        for k in range(steps):
+            trajs[:, k, 1] = states
+            states = self.nextStates(states, rng.random(walkers))
+        with np.errstate(divide='ignore'):
+            trajs[:, :, 0] = rng.standard_exponential((walkers, steps)) \
+                / self.exitRates[trajs[:, :, 1].astype(np.int64)]
+        return trajs
+
+
+def monteCarloSim(uniqueStates, rateMatrix, steps, start=None, seed=None):
+    """
+    Returns a numpy array of shape (steps, 2)
+    Where the first column is the time spent in the state
+    listed in the second column, i.e., (time, State)
+
+    Parameters
+    ----------
+    uniqueStates : int
+        The number of states in the rate matrix.
+    rateMatrix : numpy array or scipy sparse matrix (states, states)
+        The rate matrix Q.
+    steps : int
+        The number of jumps.
+    start : int, optional
+        The initial state. The default is a uniformly random state.
+    seed : int or numpy Generator or SeedSequence, optional
+        Seed for the random number generator. The default is None.
+
+    Returns
+    -------
+    traj : numpy array (steps, 2)
+        The (time, State) trajectory.
+
+    """
+    engine = KineticMonteCarlo(rateMatrix)
+    if engine.numStates != uniqueStates:
+        raise ValueError(f'rateMatrix has {engine.numStates} states, '
+                         f'expected {uniqueStates}')
+    return engine.simulate(steps, start=start, seed=seed)
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+Time evolution P(t) = expm(Q t) of a rate matrix over whole time grids.
+
+The notebooks call ``scipy.linalg.expm(Q * t)`` or ``Prob_t`` (which inverts
+the eigenvectors again) once per time point. ``Propagator`` decomposes Q
+once and evaluates every time point with batched products.
+"""
+
+import numpy as np
+import scipy.linalg
+import scipy.sparse
+import scipy.sparse.linalg
+
+
+class Propagator:
+    """
+    Cached propagator of a rate matrix Q.
+
+    Parameters
+    ----------
+    rateMatrix : numpy array or scipy sparse matrix (states, states)
+        The rate matrix Q, rows summing to zero.
+    method : str, optional
+        'eig' uses the cached spectral decomposition Q = V Lambda V^-1,
+        'expm' uses ``scipy.linalg.expm`` and 'krylov' never forms P(t) and
+        only propagates vectors with ``expm_multiply``. The default 'auto'
+        tries 'eig' and falls back to 'expm' when Q is defective or its
+        eigenvectors are badly conditioned.
+    condLimit : float, optional
+        Largest eigenvector condition number accepted by 'auto'. The
+        default is 1e8.
+
+    Attributes
+    ----------
+    method : str
+        The path that was actually used ('eig', 'expm' or 'krylov').
+    reason : str
+        Why 'auto' fell back to 'expm', empty otherwise.
+
+    """
+
+    def __init__(self, rateMatrix, method='auto', condLimit=1e8):
+        if method not in ('auto', 'eig', 'expm', 'krylov'):
+            raise ValueError(f'unknown method {method}')
+        self.numStates = rateMatrix.shape[0]
+        self.reason = ''
+        if method == 'krylov':
+            self.Q = scipy.sparse.csr_matrix(rateMatrix, dtype=float)
+            self.method = method
+            return
+        if scipy.sparse.issparse(rateMatrix):
+            rateMatrix = rateMatrix.toarray()
+        self.Q = np.asarray(rateMatrix, dtype=float)
+        self.method = 'expm'
+        if method == 'expm':
+            return
+        val, vec = np.linalg.eig(self.Q)
+        cond = np.linalg.cond(vec)
+        if not np.isfinite(cond) or cond > condLimit:
+            if method == 'eig':
+                raise np.linalg.LinAlgError(
+                    f'eigenvectors are badly conditioned (cond={cond:.3g})')
+            self.reason = f'eigenvector condition number {cond:.3g}'
+            return
+        vecInv = np.linalg.inv(vec)
+        error = np.abs((vec * val) @ vecInv - self.Q).max()
+        if method == 'auto' and error > 1e-8 * max(np.abs(self.Q).max(), 1):
+            self.reason = f'decomposition residual {error:.3g}'
+            return
+        # LAPACK returns complex eigenvalues as adjacent conjugate pairs with
+        # the positive imaginary part first; each pair a +/- ib is replaced by
+        # the real basis (Re v, Im v) on which Q acts as [[a, b], [-b, a]],
+        # so all products below stay in real arithmetic
+        real = np.where(val.imag == 0)[0]
+        pairs = np.where(val.imag > 0)[0]
+        self.eigenvalues = val
+        self.realRates = val.real[real]
+        self.pairRates = val[pairs]
+        self.vec = np.concatenate(
+            (vec[:, real].real,
+             np.stack((vec[:, pairs].real, vec[:, pairs].imag),
+                      axis=2).reshape(self.numStates, -1)), axis=1)
+        self.vecInv = np.linalg.inv(self.vec)
+        self.method = 'eig'
+
+    def _expBlocks(self, times, X):
+        """
+        Helper function to multiply X from the right by exp(t Lambda), where
+        Lambda is the real block-diagonal form of Q.
+
+        Parameters
+        ----------
+        times : numpy array (times,)
+            The time points.
+        X : numpy array (..., states)
+            Coordinates in the eigenbasis ``self.vec``.
+
+        Returns
+        -------
+        XB : numpy array (times, ..., states)
+
+        """
+        nr = self.realRates.shape[0]
+        shape = (times.shape[0],) + (1,) * (X.ndim - 1) + (-1,)
+        XB = np.empty((times.shape[0],) + X.shape)
+        XB[..., :nr] = X[..., :nr] * np.exp(
+            np.multiply.outer(times, self.realRates)).reshape(shape)
+        decay = np.exp(np.multiply.outer(times, self.pairRates.real)).reshape(shape)
+        angle = np.multiply.outer(times, self.pairRates.imag).reshape(shape)
+        cos, sin = decay * np.cos(angle), decay * np.sin(angle)
+        x, y = X[..., nr::2], X[..., nr + 1::2]
+        XB[..., nr::2] = x * cos - y * sin
+        XB[..., nr + 1::2] = x * sin + y * cos
+        return XB
+
+    def matrix(self, times, chunk=64):
+        """
+        Function to evaluate P(t) for a whole grid of times.
+
+        Parameters
+        ----------
+        times : float or numpy array (times,)
+            The time points.
+        chunk : int, optional
+            Number of time points evaluated per batched product, bounds the
+            temporary memory. The default is 64.
+
+        Returns
+        -------
+        P : numpy array (times, states, states)
+            P[k] = expm(Q * times[k]). A scalar time gives (states, states).
+
+        """
+        scalar = np.ndim(times) == 0
+        times = np.atleast_1d(np.asarray(times, dtype=float))
+        P = np.empty((times.shape[0], self.numStates, self.numStates))
+        if self.method == 'eig':
+            for k in range(0, times.shape[0], chunk):
+                P[k:k + chunk] = self._expBlocks(times[k:k + chunk],
+                                                 self.vec) @ self.vecInv
+        elif self.method == 'expm':
+            dt = np.diff(times)
+            if dt.shape[0] and np.allclose(dt, dt[0]):
+                # uniform grid, P(t + dt) = P(t) P(dt)
+                step = scipy.linalg.expm(self.Q * dt[0])
+                P[0] = scipy.linalg.expm(self.Q * times[0])
+                for k in range(1, times.shape[0]):
+                    P[k] = P[k - 1] @ step
+            else:
+                for k, t in enumerate(times):
+                    P[k] = scipy.linalg.expm(self.Q * t)
+        else:
+            # row i of P(t) is the propagated unit vector of state i
+            P = self.evolve(np.eye(self.numStates), times)
+        return P[0] if scalar else P
+
+    def diagonal(self, times):
+        """
+        Function to evaluate only the return probabilities P_ii(t).
+
+        Parameters
+        ----------
+        times : numpy array (times,)
+            The time points.
+
+        Returns
+        -------
+        Pii : numpy array (times, states)
+            The diagonal of P(t), i.e., ``P[:, i, i]`` in the notebooks.
+
+        """
+        times = np.atleast_1d(np.asarray(times, dtype=float))
+        if self.method != 'eig':
+            return np.diagonal(self.matrix(times), axis1=1, axis2=2).copy()
+        # P_ii(t) = sum_k vec[i, k] exp(t Lambda)_kk' vecInv[k', i], written out
+        # per real eigenvalue and per (cos, sin) term of every conjugate pair
+        nr = self.realRates.shape[0]
+        left, right = self.vec, self.vecInv.T
+        decay = np.exp(np.multiply.outer(times, self.pairRates.real))
+        angle = np.multiply.outer(times, self.pairRates.imag)
+        x, y = left[:, nr::2], left[:, nr + 1::2]
+        u, w = right[:, nr::2], right[:, nr + 1::2]
+        return np.exp(np.multiply.outer(times, self.realRates)) \
+            @ (left[:, :nr] * right[:, :nr]).T \
+            + (decay * np.cos(angle)) @ (x * u + y * w).T \
+            + (decay * np.sin(angle)) @ (x * w - y * u).T
+
+    def evolve(self, p0, times):
+        """
+        Function to propagate initial distributions, p(t) = p0 P(t), without
+        forming P(t) for the 'krylov' path.
+
+        Parameters
+        ----------
+        p0 : numpy array (states,) or (vectors, states)
+            Initial probability row vector(s).
+        times : numpy array (times,)
+            The time points.
+
+        Returns
+        -------
+        pt : numpy array (times, states) or (times, vectors, states)
+            The propagated distributions.
+
+        """
+        p0 = np.asarray(p0, dtype=float)
+        times = np.atleast_1d(np.asarray(times, dtype=float))
+        if self.method == 'eig':
+            return self._expBlocks(times, p0 @ self.vec) @ self.vecInv
+        if self.method == 'expm':
+            return p0 @ self.matrix(times)
+        QT = scipy.sparse.csr_matrix(self.Q.T)
+        dt = np.diff(times)
+        if dt.shape[0] and np.allclose(dt, dt[0]):
+            pt = scipy.sparse.linalg.expm_multiply(
+                QT, p0.T, start=times[0], stop=times[-1], num=times.shape[0],
+                endpoint=True)
+        else:
+            pt = np.stack([scipy.sparse.linalg.expm_multiply(QT * t, p0.T)
+                           for t in times])
+        return np.swapaxes(pt, -1, -2) if p0.ndim == 2 else pt
+
+
+def propagate(rateMatrix, times, method='auto'):
+    """
+    Function to replace the ``for t in times: scipy.linalg.expm(Q * t)``
+    loops of the notebooks.
+
+    Parameters
+    ----------
+    rateMatrix : numpy array or scipy sparse matrix (states, states)
+        The rate matrix Q.
+    times : numpy array (times,)
+        The time points.
+    method : str, optional
+        Passed to ``Propagator``. The default is 'auto'.
+
+    Returns
+    -------
+    P : numpy array (times, states, states)
+        The stacked transition matrices.
+
+    """
+    return Propagator(rateMatrix, method=method).matrix(times)
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+Level-of-detail reduction of the edges of a flux or rate network.
+
+``network()`` draws one connector for every non-zero matrix entry, so a
+dense matrix with many ~1e-10 entries turns into tens of thousands of
+invisible arrows. ``pruneEdges`` sits between the matrix and the drawing:
+it can merge i -> j / j -> i pairs into one net-flux arrow, bundle the
+parallel edges between blocks into one, and keep only the top-k edges per
+node and/or the strongest edges covering a fraction of the total flux. The
+result is a sparse matrix of the edges to draw, which ``network()`` takes
+as its adjacency matrix. With ``topK`` or ``maxEdges`` its size is bounded
+by the number of nodes, not their square.
+"""
+
+import numpy as np
+import scipy.sparse
+
+
+def asEdgeMatrix(matrix):
+    """
+    Helper function for a CSR copy of matrix without its zeros.
+    """
+    matrix = scipy.sparse.csr_matrix(matrix, dtype=float, copy=True)
+    matrix.sum_duplicates()
+    matrix.eliminate_zeros()
+    return matrix
+
+
+def keepEdges(matrix, keep):
+    """
+    Helper function for the CSR matrix of the kept stored entries.
+    """
+    coo = matrix.tocoo()
+    return scipy.sparse.csr_matrix((coo.data[keep], (coo.row[keep],
+                                                     coo.col[keep])),
+                                   shape=matrix.shape)
+
+
+def netFlux(matrix):
+    """
+    Function to merge the i -> j and j -> i edges into one net-flux edge,
+    max(f_ij - f_ji, 0). Self edges are dropped.
+
+    Parameters
+    ----------
+    matrix : numpy array or scipy sparse matrix (states, states)
+
+    Returns
+    -------
+    net : scipy.sparse.csr_matrix (states, states)
+
+    """
+    matrix = asEdgeMatrix(matrix)
+    net = scipy.sparse.csr_matrix(matrix - matrix.T)
+    net.data[net.data < 0] = 0
+    net.eliminate_zeros()
+    return net
+
+
+def rankInGroups(groups, weights):
+    """
+    Helper function for the rank of every entry within its group, 0 being
+    the largest weight.
+    """
+    order = np.lexsort((-weights, groups))
+    sortedGroups = groups[order]
+    starts = np.flatnonzero(np.r_[True, sortedGroups[1:] != sortedGroups[:-1]])
+    firsts = np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+    ranks = np.empty(len(order), dtype=np.int64)
+    ranks[order] = np.arange(len(order)) - firsts
+    return ranks
+
+
+def topKEdges(matrix, k, direction='both'):
+    """
+    Function to keep the k strongest edges of every node.
+
+    Parameters
+    ----------
+    matrix : numpy array or scipy sparse matrix (states, states)
+        The edge weights, compared by magnitude.
+    k : int
+        Edges kept per node.
+    direction : str, optional
+        'out' keeps the k strongest outgoing edges of every node, 'in' the
+        k strongest incoming ones and 'both' an edge that is either. The
+        default is 'both', so no node loses its strongest arrow.
+
+    Returns
+    -------
+    pruned : scipy.sparse.csr_matrix (states, states)
+        At most k edges per node for 'in' and 'out', 2k for 'both'.
+
+    """
+    matrix = asEdgeMatrix(matrix)
+    coo = matrix.tocoo()
+    weights = np.abs(coo.data)
+    keep = np.zeros(coo.nnz, dtype=bool)
+    if direction in ('out', 'both'):
+        keep |= rankInGroups(coo.row, weights) < k
+    if direction in ('in', 'both'):
+        keep |= rankInGroups(coo.col, weights) < k
+    if direction not in ('in', 'out', 'both'):
+        raise ValueError(f'unknown direction {direction}')
+    return keepEdges(matrix, keep)
+
+
+def fluxCoverEdges(matrix, fraction):
+    """
+    Function to keep the strongest edges that together carry a fraction of
+    the total flux.
+
+    Parameters
+    ----------
+    matrix : numpy array or scipy sparse matrix (states, states)
+        The edge weights, compared by magnitude.
+    fraction : float
+        Between 0 and 1, e.g. 0.99 drops the weakest edges carrying the
+        last percent.
+
+    Returns
+    -------
+    pruned : scipy.sparse.csr_matrix (states, states)
+
+    """
+    matrix = asEdgeMatrix(matrix)
+    weights = np.abs(matrix.tocoo().data)
+    order = np.argsort(-weights, kind='stable')
+    covered = np.cumsum(weights[order])
+    # the edge that reaches the fraction is kept as well
+    count = np.searchsorted(covered, fraction * covered[-1]) + 1 \
+        if len(covered) else 0
+    keep = np.zeros(len(weights), dtype=bool)
+    keep[order[:count]] = True
+    return keepEdges(matrix, keep)
+
+
+def bundleEdges(matrix, groups):
+    """
+    Function to bundle the parallel edges between two groups of nodes, e.g.
+    the blocks of a ``BlockNetwork``, into one edge. The bundle is drawn
+    along its strongest edge and carries the summed weight; edges within a
+    group are kept as they are.
+
+    Parameters
+    ----------
+    matrix : numpy array or scipy sparse matrix (states, states)
+    groups : numpy array of int (states,)
+        The group of every node, e.g. ``BlockNetwork.nodeBlocks()``.
+
+    Returns
+    -------
+    bundled : scipy.sparse.csr_matrix (states, states)
+
+    """
+    matrix = asEdgeMatrix(matrix)
+    groups = np.asarray(groups)
+    coo = matrix.tocoo()
+    between = groups[coo.row] != groups[coo.col]
+    rows, cols, data = coo.row[between], coo.col[between], coo.data[between]
+    numGroups = groups.max() + 1 if len(groups) else 0
+    pairs = groups[rows].astype(np.int64) * numGroups + groups[cols]
+    pairs, bundle = np.unique(pairs, return_inverse=True)
+    total = np.bincount(bundle, weights=data, minlength=len(pairs))
+    strongest = np.flatnonzero(rankInGroups(bundle, np.abs(data)) == 0)
+    strongest = strongest[np.argsort(bundle[strongest])]
+    within = ~between
+    return scipy.sparse.csr_matrix(
+        (np.r_[coo.data[within], total],
+         (np.r_[coo.row[within], rows[strongest]],
+          np.r_[coo.col[within], cols[strongest]])), shape=matrix.shape)
+
+
+def pruneEdges(matrix, topK=None, fluxFraction=None, maxEdges=None,
+               net=False, groups=None, direction='both'):
+    """
+    Function to reduce a matrix to the edges worth drawing.
+
+    The steps are applied in this order: ``netFlux`` if net, ``bundleEdges``
+    if groups are given, then an edge is kept if it is selected by
+    ``topKEdges`` or ``fluxCoverEdges`` (whichever are given, all edges if
+    neither is) and finally only the maxEdges strongest edges are kept.
+
+    Parameters
+    ----------
+    matrix : numpy array or scipy sparse matrix (states, states)
+        The flux (or rate) matrix.
+    topK : int, optional
+        Edges kept per node, see ``topKEdges``. The default is None.
+    fluxFraction : float, optional
+        Fraction of the total flux to cover, see ``fluxCoverEdges``. The
+        default is None.
+    maxEdges : int, optional
+        Upper bound on the number of edges. The default is None.
+    net : bool, optional
+        Merge opposite edges into net-flux edges. The default is False.
+    groups : numpy array of int (states,), optional
+        Node groups whose parallel edges are bundled. The default is None.
+    direction : str, optional
+        See ``topKEdges``. The default is 'both'.
+
+    Returns
+    -------
+    pruned : scipy.sparse.csr_matrix (states, states)
+        The edges to draw, the weights are those of the (merged) matrix.
+
+    """
+    matrix = netFlux(matrix) if net else asEdgeMatrix(matrix)
+    if groups is not None:
+        matrix = bundleEdges(matrix, groups)
+    if topK is not None or fluxFraction is not None:
+        selected = scipy.sparse.csr_matrix(matrix.shape, dtype=bool)
+        if topK is not None:
+            selected = selected + (topKEdges(matrix, topK, direction) != 0)
+        if fluxFraction is not None:
+            selected = selected + (fluxCoverEdges(matrix, fluxFraction) != 0)
+        matrix = asEdgeMatrix(matrix.multiply(selected))
+    if maxEdges is not None and matrix.nnz > maxEdges:
+        weights = np.abs(matrix.tocoo().data)
+        keep = np.zeros(len(weights), dtype=bool)
+        keep[np.argsort(-weights, kind='stable')[:maxEdges]] = True
+        matrix = keepEdges(matrix, keep)
+    return matrix
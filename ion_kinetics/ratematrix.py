@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""
+Sparse rate matrices for single-file occupancy models of the selectivity
+filter (the V/W/K site model and the ASEP).
+
+A microstate is a tuple of tokens, one per binding site ordered S0 -> S4
+(left to right), and is encoded as an integer in base ``len(tokens)`` with
+site 0 as the most significant digit. This is the same order as
+``np.array(list(product(tokens, repeat=numSites)))`` in the notebooks, so
+row k of the rate matrix is ``microstates[k]``.
+"""
+
+import numpy as np
+import scipy.sparse
+
+# move names understood by filterRateMatrix, per species
+MOVES = ('forward', 'backward', 'enterLeft', 'exitLeft', 'enterRight',
+         'exitRight')
+
+
+def microstateDigits(numSites, base):
+    """
+    Function for decoding every microstate code into its per-site tokens.
+
+    Parameters
+    ----------
+    numSites : int
+        The number of binding sites.
+    base : int
+        The number of tokens a site can hold (vacancy included).
+
+    Returns
+    -------
+    digits : numpy array of int8 (base**numSites, numSites)
+        Token index of each site, site 0 first.
+
+    """
+    codes = np.arange(base**numSites)
+    powers = base**np.arange(numSites - 1, -1, -1)
+    return ((codes[:, np.newaxis] // powers) % base).astype(np.int8)
+
+
+def filterMicrostates(numSites, tokens=('V', 'W', 'K')):
+    """
+    Function to list all microstates in code order.
+
+    Parameters
+    ----------
+    numSites : int
+        The number of binding sites.
+    tokens : sequence, optional
+        The site tokens, vacancy first. The default is ('V', 'W', 'K').
+
+    Returns
+    -------
+    microstates : numpy array (len(tokens)**numSites, numSites)
+        Equal to ``np.array(list(product(tokens, repeat=numSites)))``.
+
+    """
+    return np.asarray(tokens)[microstateDigits(numSites, len(tokens))]
+
+
+def encodeMicrostates(microstates, tokens=('V', 'W', 'K')):
+    """
+    Function to convert occupancy rows into their integer codes.
+
+    Parameters
+    ----------
+    microstates : array like (..., numSites)
+        Occupancies written with ``tokens``.
+    tokens : sequence, optional
+        The site tokens, vacancy first. The default is ('V', 'W', 'K').
+
+    Returns
+    -------
+    codes : numpy array of int (...)
+        The row index of each occupancy in the rate matrix.
+
+    """
+    microstates = np.asarray(microstates)
+    tokenArr = np.asarray(tokens)
+    order = np.argsort(tokenArr)
+    digits = order[np.searchsorted(tokenArr[order], microstates)]
+    numSites = microstates.shape[-1]
+    powers = len(tokens)**np.arange(numSites - 1, -1, -1)
+    return digits @ powers
+
+
+def filterRateMatrix(numSites, rates, tokens=('V', 'W', 'K'), charges=None,
+                     swapRate=0):
+    """
+    Function for building the rate matrix of a single-file filter directly
+    from the move rules instead of testing every (i, j)-pair.
+
+    The allowed moves are the ones of ``isallowedTransition``: a particle
+    hops into an adjacent vacancy, or enters/leaves through an end site.
+    Optionally two different particles on adjacent sites can swap.
+
+    Parameters
+    ----------
+    numSites : int
+        The number of binding sites.
+    rates : dict
+        Rates per particle token, e.g.
+        ``{'K': {'forward': p, 'backward': q, 'enterLeft': alpha,
+        'exitRight': beta}}``. Valid moves are listed in ``MOVES``;
+        missing moves have rate 0 and are not generated.
+    tokens : sequence, optional
+        The site tokens, vacancy first. The default is ('V', 'W', 'K').
+    charges : dict, optional
+        Charge carried by each token for the conduction labels. The default
+        is a unit charge on the last token (K, or 1 for the ASEP).
+    swapRate : float, optional
+        Rate of exchanging two different adjacent particles. The default is
+        0, i.e., no K/W swaps, same as ``isallowedTransition``.
+
+    Returns
+    -------
+    Q : scipy.sparse.csr_matrix (states, states)
+        The rate matrix with its diagonal filled so the rows sum to zero.
+    conds : numpy array of int (Q.nnz,)
+        Conduction label of every stored entry of Q, parallel to
+        ``Q.data``: +1 when a charge enters through site 0 or leaves
+        through the last site, -1 for the reverse, 0 otherwise, same as
+        the ``cond`` output of ``isConduction``.
+
+    """
+    base = len(tokens)
+    numStates = base**numSites
+    if charges is None:
+        charges = {tokens[-1]: 1}
+    digits = microstateDigits(numSites, base)
+    codes = np.arange(numStates)
+    powers = base**np.arange(numSites - 1, -1, -1)
+    rows, cols, vals, conds = [], [], [], []
+
+    def addMoves(mask, delta, rate, cond):
+        # mask selects the source states, delta is the code change
+        if rate == 0:
+            return
+        src = codes[mask]
+        rows.append(src)
+        cols.append(src + delta)
+        vals.append(np.full(src.shape[0], rate, dtype=float))
+        conds.append(np.full(src.shape[0], cond, dtype=np.int64))
+
+    for token, moves in rates.items():
+        unknown = set(moves) - set(MOVES)
+        if unknown:
+            raise ValueError(f'unknown moves {sorted(unknown)} for {token}')
+        t = list(tokens).index(token)
+        if t == 0:
+            raise ValueError('the vacancy token cannot move')
+        charge = charges.get(token, 0)
+        for a in range(numSites - 1):
+            # hop a -> a+1 and a+1 -> a into a vacancy
+            addMoves((digits[:, a] == t) & (digits[:, a + 1] == 0),
+                     t * (powers[a + 1] - powers[a]), moves.get('forward', 0), 0)
+            addMoves((digits[:, a + 1] == t) & (digits[:, a] == 0),
+                     t * (powers[a] - powers[a + 1]), moves.get('backward', 0), 0)
+        first, last = digits[:, 0], digits[:, -1]
+        addMoves(first == 0, t * powers[0], moves.get('enterLeft', 0), charge)
+        addMoves(first == t, -t * powers[0], moves.get('exitLeft', 0), -charge)
+        addMoves(last == 0, t * powers[-1], moves.get('enterRight', 0), -charge)
+        addMoves(last == t, -t * powers[-1], moves.get('exitRight', 0), charge)
+    if swapRate:
+        for a in range(numSites - 1):
+            left, right = digits[:, a].astype(int), digits[:, a + 1].astype(int)
+            mask = (left != 0) & (right != 0) & (left != right)
+            src = codes[mask]
+            delta = (right - left)[mask] * (powers[a] - powers[a + 1])
+            rows.append(src)
+            cols.append(src + delta)
+            vals.append(np.full(src.shape[0], swapRate, dtype=float))
+            conds.append(np.zeros(src.shape[0], dtype=np.int64))
+    # the diagonal is always stored so every row has an entry
+    rows.append(codes)
+    cols.append(codes)
+    vals.append(np.zeros(numStates))
+    conds.append(np.zeros(numStates, dtype=np.int64))
+    rows, cols = np.concatenate(rows), np.concatenate(cols)
+    vals, conds = np.concatenate(vals), np.concatenate(conds)
+    # coalesce duplicated (i, j)-pairs, which only happens for one site
+    # where both ends are the same site
+    keys, inverse = np.unique(rows * numStates + cols, return_inverse=True)
+    data = np.zeros(keys.shape[0])
+    np.add.at(data, inverse, vals)
+    condData = np.zeros(keys.shape[0], dtype=np.int64)
+    np.add.at(condData, inverse, conds)
+    indices = keys % numStates
+    indptr = np.concatenate(([0], np.cumsum(np.bincount(keys // numStates,
+                                                        minlength=numStates))))
+    Q = scipy.sparse.csr_matrix((data, indices, indptr),
+                                shape=(numStates, numStates))
+    diag = indices == np.repeat(codes, np.diff(indptr))
+    Q.data[diag] = -np.asarray(Q.sum(axis=1)).ravel()
+    return (Q, condData)
+
+
+def asepRateMatrix(numSites, alpha, beta, p, q):
+    """
+    Function for building the ASEP rate matrix of asep_model.ipynb.
+
+    Particles enter site 0 with rate alpha, leave the last site with rate
+    beta and hop forward/backward with rates p/q.
+
+    Parameters
+    ----------
+    numSites : int
+        The number of sites.
+    alpha : float
+        First site entrance rate.
+    beta : float
+        Last site exit rate.
+    p : float
+        Forward rate.
+    q : float
+        Backward rate.
+
+    Returns
+    -------
+    Q : scipy.sparse.csr_matrix (2**numSites, 2**numSites)
+        The rate matrix, rows ordered as ``product([0, 1], repeat=numSites)``.
+    conds : numpy array of int (Q.nnz,)
+        Conduction labels parallel to ``Q.data``.
+
+    """
+    rates = {1: {'forward': p, 'backward': q, 'enterLeft': alpha,
+                 'exitRight': beta}}
+    return filterRateMatrix(numSites, rates, tokens=(0, 1))
+
+
+def conductionMatrix(Q, conds):
+    """
+    Function to turn the conduction labels of ``filterRateMatrix`` into a
+    sparse (i, j) lookup table.
+
+    Parameters
+    ----------
+    Q : scipy.sparse.csr_matrix (states, states)
+        The rate matrix returned together with ``conds``.
+    conds : numpy array of int (Q.nnz,)
+        The conduction labels parallel to ``Q.data``.
+
+    Returns
+    -------
+    C : scipy.sparse.csr_matrix (states, states)
+        C[i, j] is the net charge carried through the filter by i -> j.
+
+    """
+    # copies, eliminate_zeros works in place and Q must keep its pattern
+    C = scipy.sparse.csr_matrix((conds.copy(), Q.indices.copy(),
+                                 Q.indptr.copy()), shape=Q.shape)
+    C.eliminate_zeros()
+    return C
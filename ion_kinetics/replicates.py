@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+Replicate Monte Carlo runs over a (step count, replicate) grid on a process
+pool, for convergence studies like the MFPT/committor one in
+markov_chain_stuff.ipynb.
+
+The rate matrix is handed to every worker once through the pool
+initializer, which also builds the jump tables there, so a task only
+carries its step count and seed.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .montecarlo import KineticMonteCarlo
+from .streaming import StreamingAnalysis
+
+_worker = {} # per-process engine and observable function
+
+
+def stateObservables(traj, uniqueStates):
+    """
+    Default observables of a (time, State) trajectory: the populations
+    followed by the mean dwell time of every state.
+
+    Parameters
+    ----------
+    traj : numpy array (steps, 2)
+        A ``monteCarloSim`` trajectory.
+    uniqueStates : int
+        The number of states.
+
+    Returns
+    -------
+    values : numpy array (2 * uniqueStates,)
+    names : list of str
+
+    """
+    analysis = StreamingAnalysis(uniqueStates).update(traj)
+    values = np.concatenate((analysis.populations(),
+                             analysis.dwellTimes()[0]))
+    names = [f'pi_{i}' for i in range(uniqueStates)] \
+        + [f'dwell_{i}' for i in range(uniqueStates)]
+    return (values, names)
+
+
+def threeStateEstimates(traj, uniqueStates=3):
+    """
+    The estimates of cell 99 in markov_chain_stuff.ipynb for the
+    A <-> B <-> C chain (states 0, 1, 2).
+
+    Parameters
+    ----------
+    traj : numpy array (steps, 2)
+        A ``monteCarloSim`` trajectory.
+    uniqueStates : int, optional
+        Must be 3. The default is 3.
+
+    Returns
+    -------
+    values : numpy array (18,)
+        7 MFPTs, 2 committors, 3 populations, 2 fluxes and 4 rates, in the
+        order of the notebook. Divisions by zero give nan.
+    names : list of str
+
+    """
+    states = traj[:, 1]
+    N_ab = np.sum((states[:-1] == 0) & (states[1:] == 1))
+    N_bc = np.sum((states[:-1] == 1) & (states[1:] == 2))
+    T_a, T_b, T_c = (np.sum(traj[:, 0][states == s]) for s in range(3))
+    T = traj[:, 0].sum()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        N_ab, N_bc = np.float64(N_ab), np.float64(N_bc)
+        MFPTs = [T_a / N_ab, T_b / (N_ab + N_bc), T_c / N_bc,
+                 (T_a + T_b) / N_bc, (T_b + T_c) / N_ab,
+                 T_a / N_ab + (T_a + T_b) / N_bc,
+                 T_c / N_bc + (T_b + T_c) / N_ab]
+        committors = [N_ab / (N_ab + N_bc), N_bc / (N_ab + N_bc)]
+        pi = [T_a / T, T_b / T, T_c / T]
+        flux = [N_ab / T, N_bc / T]
+        rate = [N_ab / T_a, N_bc / T_b, N_ab / T_b, N_bc / T_c]
+    values = np.array(MFPTs + committors + pi + flux + rate)
+    values[~np.isfinite(values)] = np.nan
+    names = ['t_A', 't_B', 't_C', 't_BC', 't_BA', 't_AC', 't_CA',
+             'phi_ba', 'phi_bc', 'pi_A', 'pi_B', 'pi_C', 'J_AB', 'J_BC',
+             'k_AB', 'k_BC', 'k_BA', 'k_CB']
+    return (values, names)
+
+
+class ReplicateResult:
+    """
+    Observables of a replicate grid.
+
+    Attributes
+    ----------
+    values : numpy array (steps, replicates, observables)
+        Same layout as the reshaped ``MFPTs``/``committors`` arrays of the
+        notebook.
+    steps : numpy array (steps,)
+        The step counts of the first axis.
+    names : list of str
+        The observable names of the last axis.
+    seeds : numpy array of SeedSequence (steps, replicates)
+        The seed of every run, for reproducing a single replicate.
+
+    """
+
+    def __init__(self, values, steps, names, seeds):
+        self.values = values
+        self.steps = steps
+        self.names = names
+        self.seeds = seeds
+
+    def __getitem__(self, name):
+        """
+        Returns the (steps, replicates) values of one observable by name.
+        """
+        return self.values[..., self.names.index(name)]
+
+    def mean(self):
+        """
+        Returns the nan-mean over replicates, shape (steps, observables).
+        """
+        return np.nanmean(self.values, axis=1)
+
+    def std(self):
+        """
+        Returns the nan-std over replicates, shape (steps, observables).
+        """
+        return np.nanstd(self.values, axis=1)
+
+
+def _initWorker(rateMatrix, observables):
+    _worker['engine'] = KineticMonteCarlo(rateMatrix)
+    _worker['observables'] = observables
+
+
+def _runReplicate(task):
+    steps, seed = task
+    engine = _worker['engine']
+    traj = engine.simulate(steps, seed=seed)
+    return _worker['observables'](traj, engine.numStates)
+
+
+def runReplicates(rateMatrix, steps, replicates, seed=None,
+                  observables=stateObservables, maxWorkers=None):
+    """
+    Function to simulate every (step count, replicate) pair and collect the
+    observables into one array.
+
+    Parameters
+    ----------
+    rateMatrix : numpy array or scipy sparse matrix (states, states)
+        The rate matrix Q.
+    steps : list of int
+        The trajectory lengths, e.g. [10, 100, 1000, 10000].
+    replicates : int
+        The number of independent runs per length.
+    seed : int or SeedSequence, optional
+        Root seed, every run gets its own child from ``SeedSequence.spawn``
+        so results do not depend on the number of workers. The default is
+        None.
+    observables : callable, optional
+        A module-level function ``f(traj, uniqueStates)`` returning
+        ``(values, names)``. The default is ``stateObservables``.
+    maxWorkers : int, optional
+        Number of processes. 1 runs everything in this process. The
+        default is None, one per CPU.
+
+    Returns
+    -------
+    result : ReplicateResult
+
+    """
+    steps = np.asarray(steps, dtype=np.int64)
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    seeds = np.empty((steps.shape[0], replicates), dtype=object)
+    seeds.ravel()[:] = seed.spawn(seeds.size)
+    tasks = [(int(step), s) for step, row in zip(steps, seeds) for s in row]
+    if maxWorkers == 1:
+        _initWorker(rateMatrix, observables)
+        outputs = [_runReplicate(task) for task in tasks]
+    else:
+        workers = maxWorkers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers,
+                                 initializer=_initWorker,
+                                 initargs=(rateMatrix, observables)) as pool:
+            # hand the tasks out in blocks to keep the IPC overhead low
+            chunksize = max(1, len(tasks) // (4 * workers))
+            outputs = list(pool.map(_runReplicate, tasks, chunksize=chunksize))
+    names = outputs[0][1]
+    values = np.array([output[0] for output in outputs]).reshape(
+        steps.shape[0], replicates, -1)
+    return ReplicateResult(values, steps, names, seeds)
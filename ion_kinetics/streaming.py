@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+Chunked analysis of trajectories that do not fit in memory.
+
+``StreamingAnalysis`` keeps only O(states^2) accumulators (sparse jump
+counts, time per state, dwell moments and net conductions) and is fed one
+chunk at a time, e.g. slices of a memory-mapped ``.npy`` file. The state at
+the end of each chunk is carried over so that jumps and dwell runs across
+chunk boundaries are counted exactly once.
+
+Two trajectory layouts are understood:
+
+- discrete time: an integer array of states, one per frame, as returned by
+  ``MSM.simulate``;
+- continuous time: a (steps, 2) array of (time, State) rows as returned by
+  ``monteCarloSim``.
+"""
+
+import numpy as np
+import scipy.sparse
+
+from .counting import countPairs, pairValues, runLengths
+from .estimators import RateNetwork, asIndexArray
+from .validation import connectedSet
+
+
+def iterChunks(source, chunkSize=10**6):
+    """
+    Function to split a trajectory source into chunks.
+
+    Parameters
+    ----------
+    source : str, numpy array or iterable of arrays
+        A path to a ``.npy`` file (opened with ``mmap_mode='r'``), an array
+        (e.g. already memory-mapped) or any generator of chunks.
+    chunkSize : int, optional
+        Number of frames/rows per chunk for files and arrays. The default
+        is 10**6.
+
+    Yields
+    ------
+    chunk : numpy array
+        Consecutive pieces of the trajectory.
+
+    """
+    if isinstance(source, str):
+        source = np.load(source, mmap_mode='r')
+    if isinstance(source, np.ndarray):
+        for k in range(0, source.shape[0], chunkSize):
+            yield np.asarray(source[k:k + chunkSize])
+    else:
+        for chunk in source:
+            yield np.asarray(chunk)
+
+
+class StreamingAnalysis:
+    """
+    Running estimates over a trajectory that arrives in chunks.
+
+    Parameters
+    ----------
+    uniqueStates : int
+        The number of states.
+    timestep : float, optional
+        Time per frame of discrete-time trajectories. The default is 1.
+    conductions : scipy sparse matrix (states, states), optional
+        Net charge of every i -> j jump, e.g. from ``conductionMatrix``.
+        The default is None, no conduction counting.
+
+    """
+
+    def __init__(self, uniqueStates, timestep=1.0, conductions=None):
+        self.uniqueStates = uniqueStates
+        self.timestep = timestep
+        self.conductions = conductions
+        self.counts = scipy.sparse.csr_matrix((uniqueStates, uniqueStates),
+                                              dtype=np.int64)
+        self.stateTime = np.zeros(uniqueStates) # total time spent per state
+        self.dwellCount = np.zeros(uniqueStates, dtype=np.int64)
+        self.dwellSum = np.zeros(uniqueStates)
+        self.dwellSumSq = np.zeros(uniqueStates)
+        self.netConductions = 0
+        self.steps = 0
+        self.lastState = None # state at the end of the previous chunk
+        self.openRun = 0 # frames of the last, unfinished, discrete run
+
+    def update(self, chunk):
+        """
+        Function to add the next chunk of the trajectory.
+
+        Parameters
+        ----------
+        chunk : numpy array (steps,) or (steps, 2)
+            Discrete-time states or continuous-time (time, State) rows.
+
+        Returns
+        -------
+        self : StreamingAnalysis
+
+        """
+        chunk = np.asarray(chunk)
+        if not chunk.shape[0]:
+            return self
+        if chunk.ndim == 2:
+            times, states = chunk[:, 0], chunk[:, 1].astype(np.int64)
+            # every row is one complete dwell
+            self.stateTime += np.bincount(states, weights=times,
+                                          minlength=self.uniqueStates)
+            self.addDwells(states, times)
+        else:
+            states = chunk.astype(np.int64)
+            self.stateTime += self.timestep * np.bincount(
+                states, minlength=self.uniqueStates)
+            runStates, lengths = runLengths(states, includeLast=True)
+            if runStates[0] == self.lastState:
+                lengths[0] += self.openRun
+            elif self.lastState is not None:
+                self.addDwells(np.array([self.lastState]),
+                               np.array([self.openRun * self.timestep]))
+            self.addDwells(runStates[:-1], lengths[:-1] * self.timestep)
+            self.openRun = lengths[-1]
+        if self.lastState is not None:
+            states = np.concatenate(([self.lastState], states))
+        starts, ends = states[:-1], states[1:]
+        jump = starts != ends
+        starts, ends = starts[jump], ends[jump]
+        self.counts = self.counts + countPairs(self.uniqueStates, starts, ends)
+        if self.conductions is not None:
+            self.netConductions += pairValues(self.conductions, starts,
+                                              ends).sum()
+        self.steps += chunk.shape[0]
+        self.lastState = states[-1]
+        return self
+
+    def addDwells(self, states, durations):
+        """
+        Helper function to add finished dwells to the moment accumulators.
+        """
+        n = self.uniqueStates
+        self.dwellCount += np.bincount(states, minlength=n)
+        self.dwellSum += np.bincount(states, weights=durations, minlength=n)
+        self.dwellSumSq += np.bincount(states, weights=durations**2,
+                                       minlength=n)
+
+    def run(self, source, chunkSize=10**6):
+        """
+        Function to consume a whole trajectory source, see ``iterChunks``.
+
+        Returns
+        -------
+        self : StreamingAnalysis
+
+        """
+        for chunk in iterChunks(source, chunkSize=chunkSize):
+            self.update(chunk)
+        return self
+
+    @property
+    def totalTime(self):
+        return self.stateTime.sum()
+
+    def populations(self):
+        """
+        Returns the fraction of time spent in each state, pi_i = T_i / T.
+        """
+        return self.stateTime / self.totalTime
+
+    def flux(self):
+        """
+        Returns the sparse jump flux J_ij = N_ij / T.
+        """
+        return self.counts / self.totalTime
+
+    def rateMatrix(self):
+        """
+        Returns the estimated rate matrix k_ij = N_ij / T_i with its diagonal
+        filled so the rows sum to zero.
+        """
+        invTime = np.divide(1, self.stateTime,
+                            out=np.zeros(self.uniqueStates),
+                            where=self.stateTime > 0)
+        K = scipy.sparse.diags(invTime) @ self.counts.astype(float)
+        return scipy.sparse.csr_matrix(
+            K - scipy.sparse.diags(np.asarray(K.sum(axis=1)).ravel()))
+
+    def jumpProbabilities(self):
+        """
+        Returns the jump probabilities N_ij / sum_j N_ij of leaving i to j,
+        the transition matrix of the jump chain. In the three-state model
+        the row of the middle state b holds N_ba / (N_ba + N_bc) and
+        N_bc / (N_ba + N_bc).
+        """
+        total = np.asarray(self.counts.sum(axis=1)).ravel()
+        inv = np.divide(1, total, out=np.zeros(self.uniqueStates),
+                        where=total > 0)
+        return scipy.sparse.csr_matrix(scipy.sparse.diags(inv) @ self.counts)
+
+    def dwellTimes(self):
+        """
+        Returns the mean and standard deviation of the finished dwell times
+        of every state (nan for states without a finished dwell).
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = self.dwellSum / self.dwellCount
+            var = self.dwellSumSq / self.dwellCount - mean**2
+        return (mean, np.sqrt(np.maximum(var, 0)))
+
+    def mfpt(self, target):
+        """
+        Function for the mean first-passage times into a set of states from
+        the estimated rate matrix, restricted to the largest strongly
+        connected set of the jumps (see ``validation.connectedSet``), which
+        leaves out states that were never visited or never left.
+
+        Parameters
+        ----------
+        target : int or list of int
+            The target states, in the connected set.
+
+        Returns
+        -------
+        tau : numpy array (states,)
+            Mean first-passage time from every state, 0 on the target and
+            nan outside of the connected set.
+
+        """
+        target = asIndexArray(target)
+        active = connectedSet(self.counts)
+        outside = np.setdiff1d(target, active)
+        if outside.shape[0]:
+            raise ValueError(f'target states {outside.tolist()} are not in '
+                             f'the connected set of the jumps')
+        # jumps leaving the connected set are dropped
+        Q = self.rateMatrix()[active][:, active]
+        Q.setdiag(0)
+        Q = Q - scipy.sparse.diags(np.asarray(Q.sum(axis=1)).ravel())
+        tau = np.full(self.uniqueStates, np.nan)
+        tau[active] = RateNetwork(Q).mfpt(np.searchsorted(active, target))
+        return tau
+
+    def current(self):
+        """
+        Returns the mean ionic current, net conductions per unit time.
+        """
+        return self.netConductions / self.totalTime
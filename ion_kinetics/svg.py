@@ -0,0 +1,733 @@
+# -*- coding: utf-8 -*-
+"""
+Headless SVG backend for ``ion_kinetics.drawing``.
+
+``SVGDocument`` provides the Simple Inkscape Scripting primitives the drawing
+functions use (``circle``, ``connector``, ``group``, ``layer``, ``marker``,
+``clone``, ``all_shapes``, the path commands and ``inkex.paths``) on a small
+in-memory tree, which ``write`` streams to an SVG file. No Inkscape process
+is needed, so many figures can be drawn from one Python process::
+
+    doc = SVGDocument()
+    useBackend(doc)
+    network(states, prob, coords, flux)
+    doc.write('network.svg')
+
+Inkscape routes connectors itself. Here a connector is a straight line
+between the centers of its two objects, cut where it leaves their outlines,
+which is what Inkscape draws for shapes the connector does not avoid.
+Layers are written as Inkscape layers, so the file can still be edited
+there. Hidden elements (``display:none``, e.g. the border circles of
+``network``) do not count towards the bounding boxes and the page size.
+While a document is written its transforms, boxes and connector ends do
+not change, they are computed once per element.
+"""
+
+import types
+from xml.sax.saxutils import escape, quoteattr
+
+import numpy as np
+
+
+def fmt(value):
+    """
+    Helper function to write a number with 8 significant digits.
+    """
+    return f'{float(value):.8g}'
+
+
+# transform of untransformed elements, shared and never modified
+IDENTITY = np.eye(3)
+IDENTITY.flags.writeable = False
+
+
+def translateMatrix(dx, dy):
+    return np.array([[1.0, 0, dx], [0, 1.0, dy], [0, 0, 1]])
+
+
+def scaleMatrix(sx, sy=None):
+    return np.diag([sx, sx if sy is None else sy, 1.0])
+
+
+def rotateMatrix(angle):
+    a = np.radians(angle)
+    return np.array([[np.cos(a), -np.sin(a), 0], [np.sin(a), np.cos(a), 0],
+                     [0, 0, 1]])
+
+
+def parseTransform(transform):
+    """
+    Helper function to turn an SVG transform attribute into a 3x3 matrix.
+
+    Parameters
+    ----------
+    transform : str
+        Any sequence of translate, scale, rotate and matrix operations.
+
+    Returns
+    -------
+    M : numpy array (3, 3)
+
+    """
+    M = np.eye(3)
+    for op in transform.replace(',', ' ').split(')'):
+        if '(' not in op:
+            continue
+        name, args = op.split('(')
+        args = [float(a) for a in args.split()]
+        name = name.strip()
+        if name == 'translate':
+            M = M @ translateMatrix(args[0], args[1] if len(args) > 1 else 0)
+        elif name == 'scale':
+            M = M @ scaleMatrix(*args)
+        elif name == 'rotate':
+            center = args[1:] if len(args) == 3 else [0, 0]
+            M = M @ translateMatrix(*center) @ rotateMatrix(args[0]) \
+                @ translateMatrix(-center[0], -center[1])
+        elif name == 'matrix':
+            a, b, c, d, e, f = args
+            M = M @ np.array([[a, c, e], [b, d, f], [0, 0, 1]])
+        else:
+            raise ValueError(f'unknown transform {name}')
+    return M
+
+
+def applyMatrix(M, points):
+    """
+    Helper function to transform an (n, 2) array of points.
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    if M is IDENTITY:
+        return points.copy()
+    return points @ M[:2, :2].T + M[:2, 2]
+
+
+def boxOf(points):
+    """
+    Helper function for the (xmin, ymin, xmax, ymax) box of points.
+    """
+    if not len(points):
+        return None
+    points = np.asarray(points).reshape(-1, 2)
+    return np.concatenate((points.min(axis=0), points.max(axis=0)))
+
+
+def boxCorners(box):
+    return np.array([[box[0], box[1]], [box[2], box[1]], [box[0], box[3]],
+                     [box[2], box[3]]])
+
+
+class PathCommand:
+    """
+    A path command with its arguments, e.g. ``Move(0, 0)``. Lowercase
+    letters are relative to the current point.
+    """
+    letter = ''
+
+    def __init__(self, *args):
+        self.args = args
+
+    def __str__(self):
+        return ' '.join([self.letter] + [fmt(a) for a in self.args])
+
+    def points(self, current, start):
+        """
+        Returns the points the command passes through (its control points
+        for curves) and the new current point.
+        """
+        args = np.asarray(self.args, dtype=float).reshape(-1, 2)
+        if self.letter.islower():
+            args = args + current
+        return (args, args[-1])
+
+
+class Move(PathCommand):
+    letter = 'M'
+
+
+class Line(PathCommand):
+    letter = 'L'
+
+
+class Curve(PathCommand):
+    letter = 'C'
+
+
+class RelMove(PathCommand):
+    letter = 'm'
+
+
+class RelLine(PathCommand):
+    letter = 'l'
+
+
+class RelCurve(PathCommand):
+    letter = 'c'
+
+
+class Horz(PathCommand):
+    letter = 'H'
+
+    def points(self, current, start):
+        point = np.array([self.args[0], current[1]], dtype=float)
+        return (point[np.newaxis], point)
+
+
+class Vert(PathCommand):
+    letter = 'V'
+
+    def points(self, current, start):
+        point = np.array([current[0], self.args[0]], dtype=float)
+        return (point[np.newaxis], point)
+
+
+class ZoneClose(PathCommand):
+    letter = 'Z'
+
+    def points(self, current, start):
+        return (start[np.newaxis], start)
+
+
+class SVGWriter:
+    """
+    Minimal streaming XML writer, elements go straight to the file.
+
+    Parameters
+    ----------
+    stream : file object
+        Opened in text mode.
+
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.depth = 0
+
+    def start(self, tag, attrs, empty=False):
+        attrText = ''.join(f' {key}={quoteattr(str(value))}'
+                           for key, value in attrs.items()
+                           if value is not None)
+        self.stream.write(f'{"  " * self.depth}<{tag}{attrText}'
+                          f'{"/" if empty else ""}>\n')
+        if not empty:
+            self.depth += 1
+
+    def end(self, tag):
+        self.depth -= 1
+        self.stream.write(f'{"  " * self.depth}</{tag}>\n')
+
+    def element(self, tag, attrs, text):
+        attrText = ''.join(f' {key}={quoteattr(str(value))}'
+                           for key, value in attrs.items()
+                           if value is not None)
+        self.stream.write(f'{"  " * self.depth}<{tag}{attrText}>'
+                          f'{escape(text)}</{tag}>\n')
+
+
+class Element:
+    """
+    A shape, group or definition of an ``SVGDocument``, with the object
+    methods of Simple Inkscape Scripting (``append``, ``style``,
+    ``translate``, ``rotate``, ``scale``, ``to_def``).
+    """
+
+    def __init__(self, doc, tag, attrs=None, style=None):
+        self.doc = doc
+        self.tag = tag
+        self.attrs = attrs or {}
+        self.styles = {}
+        self.transform = IDENTITY
+        self.parent = None
+        self.children = []
+        self.id = None
+        style = dict(style or {})
+        style.pop('conn_avoid', None) # connectors are not routed here
+        if 'transform' in style:
+            self.transform = parseTransform(style.pop('transform'))
+        self.style(**style)
+
+    def __getitem__(self, index):
+        return self.children[index]
+
+    def __len__(self):
+        return len(self.children)
+
+    def cached(self, key, compute):
+        """
+        Helper function to compute a value once per element while the
+        document is written, see ``SVGDocument.write``.
+        """
+        cache = self.doc.cache
+        if cache is None:
+            return compute()
+        key = (key, id(self))
+        if key not in cache:
+            cache[key] = compute()
+        return cache[key]
+
+    def hidden(self):
+        return self.styles.get('display') == 'none'
+
+    def reference(self):
+        """
+        Returns the id of the element, assigning one on first use.
+        """
+        if self.id is None:
+            self.id = self.doc.newId(self.tag)
+        return self.id
+
+    def append(self, obj):
+        """
+        Function to move an object into this group.
+        """
+        if obj.parent is not None:
+            obj.parent.children.remove(obj)
+        obj.parent = self
+        self.children.append(obj)
+        return self
+
+    def remove(self):
+        """
+        Function to delete the object from the document.
+        """
+        if self.parent is not None:
+            self.parent.children.remove(self)
+            self.parent = None
+        return self
+
+    def style(self, **style):
+        """
+        Function to update the style, keywords are written with hyphens,
+        e.g. ``stroke_width`` -> ``stroke-width``. Without keywords the
+        current style is returned.
+        """
+        if not style:
+            return dict(self.styles)
+        for key, value in style.items():
+            if key.startswith('_'):
+                key = '-' + key[1:]
+            self.styles[key.replace('_', '-')] = value
+        return self
+
+    def styleText(self):
+        items = []
+        for key, value in self.styles.items():
+            if isinstance(value, Element):
+                value = f'url(#{value.reference()})'
+            elif isinstance(value, (int, float, np.number)) \
+                    and not isinstance(value, bool):
+                value = fmt(value)
+            items.append(f'{key}:{value}')
+        return ';'.join(items) or None
+
+    def transformBy(self, M, first=False):
+        self.transform = self.transform @ M if first else M @ self.transform
+        return self
+
+    def anchorPoint(self, anchor):
+        if isinstance(anchor, str):
+            if anchor != 'center':
+                raise ValueError(f'unsupported anchor {anchor}')
+            box = self.bbox()
+            if box is None:
+                return np.zeros(2)
+            return (box[:2] + box[2:]) / 2
+        return np.asarray(anchor, dtype=float)
+
+    def translate(self, dist, first=False):
+        return self.transformBy(translateMatrix(*dist), first=first)
+
+    def rotate(self, angle, anchor='center', first=False):
+        x, y = self.anchorPoint(anchor)
+        return self.transformBy(translateMatrix(x, y) @ rotateMatrix(angle)
+                                @ translateMatrix(-x, -y), first=first)
+
+    def scale(self, factor, anchor='center', first=False):
+        x, y = self.anchorPoint(anchor)
+        factor = np.broadcast_to(factor, (2,))
+        return self.transformBy(translateMatrix(x, y) @ scaleMatrix(*factor)
+                                @ translateMatrix(-x, -y), first=first)
+
+    def to_def(self):
+        """
+        Function to move the object into the document definitions.
+        """
+        if self.parent is not None:
+            self.parent.children.remove(self)
+        self.parent = self.doc.defs
+        self.doc.defs.children.append(self)
+        self.reference() # definitions are written before their users
+        return self
+
+    def localBox(self):
+        """
+        Returns the bounding box in the element's own coordinates, without
+        hidden children.
+        """
+        boxes = [child.bbox() for child in self.children
+                 if not child.hidden()]
+        boxes = [box for box in boxes if box is not None]
+        if not boxes:
+            return None
+        boxes = np.array(boxes)
+        return np.concatenate((boxes[:, :2].min(axis=0),
+                               boxes[:, 2:].max(axis=0)))
+
+    def bbox(self):
+        """
+        Returns the bounding box in the coordinates of the parent.
+        """
+        return self.cached('bbox', self.parentBox)
+
+    def parentBox(self):
+        box = self.localBox()
+        if box is None:
+            return None
+        if self.transform is IDENTITY:
+            return box
+        return boxOf(applyMatrix(self.transform, boxCorners(box)))
+
+    def documentTransform(self):
+        """
+        Returns the transform from the element to document coordinates.
+        """
+        return self.cached('transform', self.composedTransform)
+
+    def composedTransform(self):
+        if self.parent is None:
+            return self.transform
+        M = self.parent.documentTransform()
+        if self.transform is IDENTITY:
+            return M
+        if M is IDENTITY:
+            return self.transform
+        return M @ self.transform
+
+    def inverseTransform(self):
+        """
+        Returns the transform from document to element coordinates.
+        """
+        return self.cached('inverse', self.invertedTransform)
+
+    def invertedTransform(self):
+        M = self.documentTransform()
+        return IDENTITY if M is IDENTITY else np.linalg.inv(M)
+
+    def boundaryPoint(self, towards):
+        """
+        Function for the point where a line from the center of the element
+        to ``towards`` (document coordinates) leaves its outline.
+        """
+        box = self.localBox()
+        if box is None:
+            return None
+        M = self.documentTransform()
+        center = (box[:2] + box[2:]) / 2
+        local = applyMatrix(self.inverseTransform(), towards)[0] - center
+        half = (box[2:] - box[:2]) / 2
+        scale = np.inf
+        for d, h in zip(local, half):
+            if d:
+                scale = min(scale, h / abs(d))
+        if not np.isfinite(scale):
+            return applyMatrix(M, center)[0]
+        return applyMatrix(M, center + local * min(scale, 1))[0]
+
+    def attributes(self):
+        attrs = dict(self.attrs)
+        if self.transform is not IDENTITY \
+                and not np.allclose(self.transform, IDENTITY):
+            a, c, e = self.transform[0]
+            b, d, f = self.transform[1]
+            attrs['transform'] = 'matrix(' + ' '.join(
+                fmt(v) for v in (a, b, c, d, e, f)) + ')'
+        attrs['style'] = self.styleText()
+        attrs = {key: (fmt(value) if isinstance(value, (float, np.number))
+                       else value) for key, value in attrs.items()}
+        if self.id is not None:
+            attrs = {'id': self.id, **attrs}
+        return attrs
+
+    def write(self, writer):
+        """
+        Function to stream the element and its children.
+        """
+        if self.children:
+            writer.start(self.tag, self.attributes())
+            for child in self.children:
+                child.write(writer)
+            writer.end(self.tag)
+        else:
+            writer.start(self.tag, self.attributes(), empty=True)
+
+
+class Ellipse(Element):
+
+    def __init__(self, doc, center, radii, style):
+        super().__init__(doc, 'ellipse', style=style)
+        self.center = np.asarray(center, dtype=float)
+        self.radii = np.broadcast_to(np.asarray(radii, dtype=float), (2,))
+        if self.radii[0] == self.radii[1]:
+            self.tag = 'circle'
+            self.attrs = {'cx': self.center[0], 'cy': self.center[1],
+                          'r': self.radii[0]}
+        else:
+            self.attrs = {'cx': self.center[0], 'cy': self.center[1],
+                          'rx': self.radii[0], 'ry': self.radii[1]}
+
+    def localBox(self):
+        return np.concatenate((self.center - self.radii,
+                               self.center + self.radii))
+
+    def boundaryPoint(self, towards):
+        M = self.documentTransform()
+        d = applyMatrix(self.inverseTransform(), towards)[0] - self.center
+        norm = np.hypot(*(d / self.radii))
+        if norm == 0:
+            return applyMatrix(M, self.center)[0]
+        return applyMatrix(M, self.center + d / max(norm, 1))[0]
+
+
+class Path(Element):
+
+    def __init__(self, doc, elts, style):
+        super().__init__(doc, 'path', style=style)
+        self.elts = list(elts)
+        self.attrs = {'d': ' '.join(str(elt) for elt in self.elts)}
+
+    def localBox(self):
+        current = start = np.zeros(2)
+        points = []
+        for elt in self.elts:
+            pts, current = elt.points(current, start)
+            if elt.letter in 'Mm':
+                start = current
+            points.append(pts)
+        return boxOf(np.concatenate(points)) if points else None
+
+
+class Text(Element):
+
+    def __init__(self, doc, msg, base, style):
+        super().__init__(doc, 'text', style=style)
+        self.msg = msg
+        self.base = np.asarray(base, dtype=float)
+        self.attrs = {'x': self.base[0], 'y': self.base[1]}
+
+    def localBox(self):
+        return np.concatenate((self.base, self.base))
+
+    def write(self, writer):
+        writer.element(self.tag, self.attributes(), self.msg)
+
+
+class Clone(Element):
+
+    def __init__(self, doc, obj):
+        super().__init__(doc, 'use')
+        self.obj = obj
+        obj.reference()
+
+    def localBox(self):
+        return self.obj.bbox()
+
+    def attributes(self):
+        attrs = super().attributes()
+        attrs['xlink:href'] = f'#{self.obj.reference()}'
+        return attrs
+
+
+class Marker(Element):
+
+    def __init__(self, doc, obj, ref, orient, style):
+        super().__init__(doc, 'marker', style=style)
+        self.attrs = {'orient': orient, 'refX': ref[0], 'refY': ref[1],
+                      'markerUnits': 'strokeWidth'}
+        self.styles.setdefault('overflow', 'visible')
+        self.append(obj)
+        self.reference()
+
+    def bbox(self):
+        return None
+
+
+class Layer(Element):
+
+    def __init__(self, doc, name, style):
+        super().__init__(doc, 'g', style=style)
+        self.attrs = {'inkscape:groupmode': 'layer', 'inkscape:label': name}
+
+
+class Connector(Element):
+
+    def __init__(self, doc, obj1, obj2, style):
+        super().__init__(doc, 'path', style=style)
+        self.obj1 = obj1
+        self.obj2 = obj2
+
+    def endpoints(self):
+        """
+        Returns the start and end point in document coordinates, None when
+        both objects share a center.
+        """
+        return self.cached('ends', self.computeEndpoints)
+
+    def computeEndpoints(self):
+        c1 = self.obj1.boundaryPoint(self.centerOf(self.obj2))
+        c2 = self.obj2.boundaryPoint(self.centerOf(self.obj1))
+        if c1 is None or c2 is None \
+                or (np.abs(c1 - c2) <= 1e-8 + 1e-5 * np.abs(c2)).all():
+            return None
+        return (c1, c2)
+
+    @staticmethod
+    def centerOf(obj):
+        box = obj.localBox()
+        if box is None:
+            return np.zeros(2)
+        return applyMatrix(obj.documentTransform(), (box[:2] + box[2:]) / 2)[0]
+
+    def localBox(self):
+        ends = self.endpoints()
+        if ends is None:
+            return None
+        return boxOf(applyMatrix(self.inverseTransform(), np.array(ends)))
+
+    def write(self, writer):
+        ends = self.endpoints()
+        if ends is None:
+            return # a connector between concentric objects has no length
+        (x1, y1), (x2, y2) = applyMatrix(self.inverseTransform(),
+                                         np.array(ends))
+        self.attrs = {'d': f'M {fmt(x1)},{fmt(y1)} L {fmt(x2)},{fmt(y2)}'}
+        super().write(writer)
+
+
+class SVGDocument:
+    """
+    An SVG document with the drawing primitives of Simple Inkscape
+    Scripting, to be passed to ``useBackend``.
+
+    Parameters
+    ----------
+    width, height : float, optional
+        Size of the page in mm. The default is None, fit the drawing.
+    margin : float, optional
+        Space around the drawing when the page is fitted. The default is 5.
+
+    """
+    # path commands, as exposed by the extension
+    Move = Move
+    Line = Line
+    Curve = Curve
+    Horz = Horz
+    Vert = Vert
+    ZoneClose = ZoneClose
+    move = RelMove
+    line = RelLine
+    curve = RelCurve
+
+    def __init__(self, width=None, height=None, margin=5):
+        self.width = width
+        self.height = height
+        self.margin = margin
+        self.root = Element(self, 'svg')
+        self.defs = Element(self, 'defs')
+        self.ids = {}
+        self.cache = None # per element values while writing
+        self.inkex = types.SimpleNamespace(paths=types.SimpleNamespace(
+            Move=Move, Line=Line, Curve=Curve, Horz=Horz, Vert=Vert,
+            ZoneClose=ZoneClose, move=RelMove, line=RelLine, curve=RelCurve))
+
+    def newId(self, prefix):
+        self.ids[prefix] = self.ids.get(prefix, 0) + 1
+        return f'{prefix}{self.ids[prefix]}'
+
+    def add(self, obj):
+        self.root.append(obj)
+        return obj
+
+    def circle(self, center, radius, **style):
+        return self.add(Ellipse(self, center, radius, style))
+
+    def ellipse(self, center, radii, **style):
+        return self.add(Ellipse(self, center, radii, style))
+
+    def path(self, elts, **style):
+        return self.add(Path(self, elts, style))
+
+    def text(self, msg, base, **style):
+        return self.add(Text(self, msg, base, style))
+
+    def group(self, objs=None, **style):
+        g = self.add(Element(self, 'g', style=style))
+        for obj in objs or []:
+            g.append(obj)
+        return g
+
+    def layer(self, name, **style):
+        return self.add(Layer(self, name, style))
+
+    def marker(self, obj, ref=(0, 0), orient='auto', **style):
+        m = Marker(self, obj, ref, orient, style)
+        self.defs.append(m)
+        return m
+
+    def connector(self, obj1, obj2, ctype='polyline', curve=0, **style):
+        style.pop('spacing', None)
+        return self.add(Connector(self, obj1, obj2, style))
+
+    def clone(self, obj):
+        return self.add(Clone(self, obj))
+
+    def all_shapes(self):
+        return list(self.root.children)
+
+    def viewBox(self):
+        box = self.root.localBox()
+        if box is None:
+            box = np.zeros(4)
+        if self.width is not None and self.height is not None:
+            return np.array([0, 0, self.width, self.height])
+        return np.concatenate((box[:2] - self.margin,
+                               box[2:] - box[:2] + 2 * self.margin))
+
+    def write(self, filename):
+        """
+        Function to stream the document to an SVG file.
+
+        Parameters
+        ----------
+        filename : str or file object
+            The output path or an open text file.
+
+        Returns
+        -------
+        None.
+
+        """
+        if isinstance(filename, str):
+            with open(filename, 'w', encoding='utf-8') as stream:
+                return self.write(stream)
+        self.cache = {}
+        try:
+            x, y, width, height = self.viewBox()
+            writer = SVGWriter(filename)
+            filename.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+            writer.start('svg', {
+                'xmlns': 'http://www.w3.org/2000/svg',
+                'xmlns:xlink': 'http://www.w3.org/1999/xlink',
+                'xmlns:inkscape':
+                    'http://www.inkscape.org/namespaces/inkscape',
+                'width': f'{fmt(width)}mm', 'height': f'{fmt(height)}mm',
+                'viewBox': ' '.join(fmt(v) for v in (x, y, width, height))})
+            if self.defs.children:
+                writer.start('defs', {})
+                for obj in self.defs.children:
+                    obj.write(writer)
+                writer.end('defs')
+            for obj in self.root.children:
+                obj.write(writer)
+            writer.end('svg')
+        finally:
+            self.cache = None
@@ -0,0 +1,396 @@
+# -*- coding: utf-8 -*-
+"""
+Steady-state currents over sweeps of rate parameters (e.g. I-V curves).
+
+For every (alpha, beta, p, q) the notebook rebuilds Q, runs ``expm`` and
+simulates to get the transport. ``SteadyStateSolver`` builds the sparsity
+pattern of Q once for a rule set, a list of moves per token, and keeps a
+sparse (entries, moves) matrix mapping the rates of a parameter set onto
+``Q.data``. Every parameter set then only costs a sparse mat-vec for the
+entries, a sparse LU solve for the stationary distribution and a dot
+product for the exact current, J = sum_ij pi_i Q_ij c_ij with c the
+conduction labels of ``filterRateMatrix``.
+
+The balance equations are solved as in ``RateNetwork`` (pin the last state
+and drop its equation), on the states the filter reaches from the empty
+state. A rule set that never moves a token (e.g. only K moves with the
+default tokens) leaves the states holding it unreachable, they get
+probability 0. SciPy's SuperLU cannot refactor a matrix with a
+known symbolic analysis, so the solver reuses what it can: the column
+ordering of the first factorization and the index maps into the
+pre-ordered matrix, so no sparse matrix is rebuilt or reordered per set.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import scipy.sparse
+import scipy.sparse.csgraph
+import scipy.sparse.linalg
+
+from .ratematrix import MOVES, filterRateMatrix
+
+# direction of every move from site 0 towards the last site, +1 or -1
+MOVE_DIRECTIONS = {'forward': 1, 'backward': -1, 'enterLeft': 1,
+                   'exitLeft': -1, 'enterRight': -1, 'exitRight': 1}
+
+_worker = {} # per-process solver
+
+
+def recurrentStates(pattern, start=0):
+    """
+    Function for the states the chain ends up in from a start state, the
+    closed class reachable from it.
+
+    Parameters
+    ----------
+    pattern : scipy sparse matrix (states, states)
+        The transitions i -> j, any stored entry counts.
+    start : int, optional
+        The start state. The default is 0, the empty filter.
+
+    Returns
+    -------
+    states : numpy array of int
+        Sorted.
+
+    Raises
+    ------
+    ValueError
+        If more than one closed class is reachable from the start, the
+        steady state then depends on the path taken.
+
+    """
+    pattern = scipy.sparse.csr_matrix(pattern)
+    graph = scipy.sparse.csr_matrix(
+        (np.ones(pattern.nnz), pattern.indices, pattern.indptr),
+        shape=pattern.shape, copy=True)
+    graph.setdiag(0)
+    graph.eliminate_zeros()
+    numClasses, labels = scipy.sparse.csgraph.connected_components(
+        graph, directed=True, connection='strong')
+    # a class is closed if none of its transitions leave it
+    coo = graph.tocoo()
+    leaving = labels[coo.row] != labels[coo.col]
+    closed = np.ones(numClasses, dtype=bool)
+    closed[labels[coo.row[leaving]]] = False
+    reachable = scipy.sparse.csgraph.breadth_first_order(
+        graph, start, directed=True, return_predecessors=False)
+    classes = np.unique(labels[reachable])
+    classes = classes[closed[classes]]
+    if classes.shape[0] != 1:
+        examples = [int(np.flatnonzero(labels == c)[0]) for c in classes[:5]]
+        raise ValueError(f'{classes.shape[0]} closed classes are reachable '
+                         f'from state {start}, e.g. containing the states '
+                         f'{examples}')
+    return np.flatnonzero(labels == classes[0])
+
+
+class SteadyStateSolver:
+    """
+    Stationary distributions and currents of one rule set for many rates.
+
+    Parameters
+    ----------
+    numSites : int
+        The number of binding sites.
+    moves : dict
+        The rule set, {token: list of move names}, e.g.
+        ``{'K': ['forward', 'backward', 'enterLeft', 'exitRight']}``. Valid
+        moves are listed in ``ion_kinetics.ratematrix.MOVES``.
+    tokens : sequence, optional
+        The site tokens, vacancy first. The default is ('V', 'W', 'K').
+    charges : dict, optional
+        Charge carried by each token, see ``filterRateMatrix``. The default
+        is a unit charge on the last token.
+
+    Attributes
+    ----------
+    parameters : list of tuple
+        The (token, move) of every rate parameter, the order of
+        ``rateVector``.
+    recurrent : numpy array of int
+        The states reached from the empty filter, see ``recurrentStates``.
+        The others have probability 0.
+
+    """
+
+    def __init__(self, numSites, moves, tokens=('V', 'W', 'K'),
+                 charges=None):
+        self.numSites = numSites
+        self.moves = {token: list(names) for token, names in moves.items()}
+        self.tokens = tuple(tokens)
+        self.charges = charges
+        self.parameters = [(token, move) for token, names in self.moves.items()
+                           for move in names]
+        n = len(tokens)**numSites
+        self.numStates = n
+        rows, cols, params, conds = [], [], [], []
+        for k, (token, move) in enumerate(self.parameters):
+            if move not in MOVES:
+                raise ValueError(f'unknown move {move} for {token}')
+            # one move at unit rate gives its entries and their labels
+            Q, cond = filterRateMatrix(numSites, {token: {move: 1.0}},
+                                       tokens=tokens, charges=charges)
+            coo = scipy.sparse.coo_matrix(Q)
+            off = coo.row != coo.col
+            rows.append(coo.row[off])
+            cols.append(coo.col[off])
+            params.append(np.full(np.sum(off), k))
+            conds.append(cond[off] / coo.data[off]) # label of one move
+        rows, cols = np.concatenate(rows), np.concatenate(cols)
+        params, conds = np.concatenate(params), np.concatenate(conds)
+        # the union pattern, with the diagonal always stored
+        codes = np.arange(n)
+        keys = np.unique(np.concatenate((rows * n + cols, codes * n + codes)))
+        indices = keys % n
+        indptr = np.concatenate(([0], np.cumsum(np.bincount(keys // n,
+                                                            minlength=n))))
+        self.pattern = scipy.sparse.csr_matrix(
+            (np.zeros(keys.shape[0]), indices, indptr), shape=(n, n))
+        self.entryRows = keys // n
+        self.diagonal = np.searchsorted(keys, codes * n + codes)
+        position = np.searchsorted(keys, rows * n + cols)
+        shape = (keys.shape[0], len(self.parameters))
+        # Q.data = rateMap @ rates, charge flux data = chargeMap @ rates
+        self.rateMap = scipy.sparse.csr_matrix(
+            (np.ones(position.shape[0]), (position, params)), shape=shape)
+        self.chargeMap = scipy.sparse.csr_matrix(
+            (conds, (position, params)), shape=shape)
+        self._prepareSolve()
+
+    def _prepareSolve(self):
+        """
+        Helper function for the index maps of the pinned balance equations
+        A x = b, A = Q[:last, :last].T, b = -Q[last, :last] on the
+        recurrent states, with the columns of A in the order of a first
+        COLAMD factorization.
+        """
+        self.recurrent = recurrentStates(self.pattern)
+        last = self.recurrent.shape[0] - 1
+        ids = self.pattern.copy()
+        ids.data = np.arange(1, ids.nnz + 1, dtype=float) # position + 1
+        ids = ids[self.recurrent][:, self.recurrent]
+        # a generic matrix on the pattern for the ordering, diagonally
+        # dominant like -Q
+        trial = ids.copy()
+        trial.data[:] = 1.0
+        trial.setdiag(-(np.diff(trial.indptr) + 1.0))
+        order = scipy.sparse.linalg.splu(
+            trial[:last][:, :last].T.tocsc(), permc_spec='COLAMD').perm_c \
+            if last else np.zeros(0, dtype=int)
+        # perm_c maps a column of A to its position, gather A in that order
+        self.columnOrder = np.argsort(order)
+        A = ids[:last][:, :last].T.tocsc()[:, self.columnOrder].tocsc()
+        A.sort_indices()
+        self.solveIndices, self.solveIndptr = A.indices, A.indptr
+        self.solveEntries = A.data.astype(np.int64) - 1
+        b = ids[last, :last].tocoo()
+        self.rhsColumns = b.col
+        self.rhsEntries = b.data.astype(np.int64) - 1
+
+    def rateVector(self, rates):
+        """
+        Function to turn a rates dict into the parameter vector.
+
+        Parameters
+        ----------
+        rates : dict
+            {token: {move: rate}} as for ``filterRateMatrix``. Moves of the
+            rule set that are missing have rate 0, moves outside it raise.
+
+        Returns
+        -------
+        rates : numpy array (parameters,)
+
+        """
+        for token, moves in rates.items():
+            extra = set(moves) - set(self.moves.get(token, ()))
+            if extra:
+                raise ValueError(f'moves {sorted(extra)} of {token} are not '
+                                 f'in the rule set')
+        return np.array([rates.get(token, {}).get(move, 0.0)
+                         for token, move in self.parameters], dtype=float)
+
+    def rateData(self, rates):
+        """
+        Returns ``Q.data`` on the pattern for a rates dict or vector.
+        """
+        if isinstance(rates, dict):
+            rates = self.rateVector(rates)
+        data = self.rateMap @ rates
+        data[self.diagonal] = 0
+        data[self.diagonal] = -np.bincount(self.entryRows, weights=data,
+                                           minlength=self.numStates)
+        return data
+
+    def rateMatrix(self, rates):
+        """
+        Returns the rate matrix Q (CSR) of a rates dict or vector, equal to
+        ``filterRateMatrix(numSites, rates, tokens, charges)[0]`` on the
+        union pattern of the rule set.
+        """
+        Q = self.pattern.copy()
+        Q.data = self.rateData(rates)
+        return Q
+
+    def solve(self, rates):
+        """
+        Function for the steady state of one parameter set.
+
+        Parameters
+        ----------
+        rates : dict or numpy array (parameters,)
+            A rates dict or the vector of ``rateVector``.
+
+        Returns
+        -------
+        pi : numpy array (states,)
+            The stationary distribution, 0 outside of ``recurrent``.
+        current : float
+            The exact steady-state current, net charge through the filter
+            per unit time.
+
+        """
+        if isinstance(rates, dict):
+            rates = self.rateVector(rates)
+        data = self.rateData(rates)
+        last = self.recurrent.shape[0] - 1
+        A = scipy.sparse.csc_matrix(
+            (data[self.solveEntries], self.solveIndices, self.solveIndptr),
+            shape=(last, last))
+        b = np.zeros(last)
+        b[self.rhsColumns] = -data[self.rhsEntries]
+        try:
+            x = scipy.sparse.linalg.splu(A, permc_spec='NATURAL').solve(b) \
+                if last else b
+        except RuntimeError:
+            zero = [self.parameters[k] for k in np.flatnonzero(rates == 0)]
+            raise ValueError(f'the rates leave recurrent states unreachable, '
+                             f'zero rates: {zero}') from None
+        pi = np.zeros(self.numStates)
+        pi[self.recurrent[self.columnOrder]] = x
+        pi[self.recurrent[last]] = 1.0
+        pi /= pi.sum()
+        current = np.dot(pi[self.entryRows], self.chargeMap @ rates)
+        return (pi, current)
+
+    def sweep(self, rateSets, maxWorkers=1):
+        """
+        Function to solve a list of parameter sets.
+
+        Parameters
+        ----------
+        rateSets : list of dict or numpy array (sets, parameters)
+            The parameter sets, e.g. from ``voltageSweep``.
+        maxWorkers : int, optional
+            Number of processes, None for one per CPU. The default is 1,
+            solve in this process (a few ms per set for hundreds of
+            states).
+
+        Returns
+        -------
+        currents : numpy array (sets,)
+        pis : numpy array (sets, states)
+
+        """
+        vectors = np.array([self.rateVector(r) if isinstance(r, dict) else r
+                            for r in rateSets], dtype=float)
+        if maxWorkers == 1:
+            outputs = [self.solve(r) for r in vectors]
+        else:
+            workers = maxWorkers or os.cpu_count() or 1
+            with ProcessPoolExecutor(
+                    max_workers=workers, initializer=_initWorker,
+                    initargs=(self.numSites, self.moves, self.tokens,
+                              self.charges)) as pool:
+                chunksize = max(1, len(vectors) // (4 * workers))
+                outputs = list(pool.map(_solveTask, vectors,
+                                        chunksize=chunksize))
+        if not outputs:
+            return (np.zeros(0), np.zeros((0, self.numStates)))
+        pis, currents = zip(*outputs)
+        return (np.array(currents), np.array(pis))
+
+
+def _initWorker(numSites, moves, tokens, charges):
+    _worker['solver'] = SteadyStateSolver(numSites, moves, tokens=tokens,
+                                          charges=charges)
+
+
+def _solveTask(rates):
+    return _worker['solver'].solve(rates)
+
+
+def voltageRates(rates, voltage, numSites, tokens=('V', 'W', 'K'),
+                 charges=None):
+    """
+    Function to scale the rates of a parameter set by a membrane voltage.
+
+    The voltage drops uniformly over the numSites + 1 barriers between the
+    two baths and the sites. A move of a token with charge z in direction
+    d (+1 towards the last site) is scaled by exp(d z v / (2 (numSites+1))),
+    the usual symmetric barrier.
+
+    Parameters
+    ----------
+    rates : dict
+        {token: {move: rate}} at zero voltage.
+    voltage : float
+        The voltage in units of kT/e.
+    numSites : int
+        The number of binding sites.
+    tokens : sequence, optional
+        The site tokens, vacancy first. The default is ('V', 'W', 'K').
+    charges : dict, optional
+        Charge carried by each token. The default is a unit charge on the
+        last token.
+
+    Returns
+    -------
+    rates : dict
+
+    """
+    if charges is None:
+        charges = {tokens[-1]: 1}
+    fraction = voltage / (2 * (numSites + 1))
+    return {token: {move: rate * np.exp(MOVE_DIRECTIONS[move]
+                                        * charges.get(token, 0) * fraction)
+                    for move, rate in moves.items()}
+            for token, moves in rates.items()}
+
+
+def voltageSweep(numSites, rates, voltages, tokens=('V', 'W', 'K'),
+                 charges=None, maxWorkers=1):
+    """
+    Function for the I-V curve of a rule set.
+
+    Parameters
+    ----------
+    numSites : int
+        The number of binding sites.
+    rates : dict
+        {token: {move: rate}} at zero voltage, its moves are the rule set.
+    voltages : array like (voltages,)
+        In units of kT/e.
+    tokens : sequence, optional
+        The site tokens, vacancy first. The default is ('V', 'W', 'K').
+    charges : dict, optional
+        Charge carried by each token. The default is a unit charge on the
+        last token.
+    maxWorkers : int, optional
+        See ``SteadyStateSolver.sweep``. The default is 1.
+
+    Returns
+    -------
+    currents : numpy array (voltages,)
+    pis : numpy array (voltages, states)
+
+    """
+    solver = SteadyStateSolver(numSites, {token: list(moves) for token, moves
+                                          in rates.items()},
+                               tokens=tokens, charges=charges)
+    rateSets = [voltageRates(rates, v, numSites, tokens=tokens,
+                             charges=charges) for v in voltages]
+    return solver.sweep(rateSets, maxWorkers=maxWorkers)
@@ -0,0 +1,347 @@
+# -*- coding: utf-8 -*-
+"""
+Implied timescales and Chapman-Kolmogorov tests of Markov state models.
+
+The notebooks take the spectrum from a full ``np.linalg.eig`` of the rate
+matrix or of a dense ``expm(Q * tau)``. ``LagAnalysis`` estimates the
+transition matrices of a set of trajectories at many lag times (one
+``countMatrix`` call) on their largest strongly connected set and only asks
+ARPACK for the few eigenvalues of largest modulus, which include the
+oscillating processes with eigenvalues near -1. No factorization is
+needed, and the Krylov search at one lag starts from the slowest
+eigenvector of the previous one.
+
+The Chapman-Kolmogorov test propagates all start sets at once, T(tau)^k as
+repeated sparse products with an (states, sets) block, and compares with
+the directly estimated T(k tau). Everything is returned as arrays ready
+for plotting.
+"""
+
+import numpy as np
+import scipy.sparse
+import scipy.sparse.csgraph
+import scipy.sparse.linalg
+
+from .counting import countMatrix
+
+# up to this many states the spectrum is computed densely
+DENSE_EIGEN = 500
+# shift-invert shift of rateTimescales above 0, relative to the largest rate
+SHIFT = 1e-6
+
+
+def transitionMatrix(counts, reversible=False):
+    """
+    Function to normalize a count matrix into a transition matrix.
+
+    Parameters
+    ----------
+    counts : scipy sparse matrix (states, states)
+        Counts including the i -> i pairs.
+    reversible : bool, optional
+        Symmetrize the counts, (C + C^T) / 2, first. The default is False.
+
+    Returns
+    -------
+    T : scipy.sparse.csr_matrix (states, states)
+        Rows of states without counts stay empty.
+
+    """
+    counts = scipy.sparse.csr_matrix(counts, dtype=float)
+    if reversible:
+        counts = scipy.sparse.csr_matrix((counts + counts.T) / 2)
+    total = np.asarray(counts.sum(axis=1)).ravel()
+    inv = np.divide(1, total, out=np.zeros(total.shape[0]), where=total > 0)
+    return scipy.sparse.csr_matrix(scipy.sparse.diags(inv) @ counts)
+
+
+def connectedSet(counts):
+    """
+    Returns the sorted states of the largest strongly connected set of a
+    count matrix, the states a transition matrix can be estimated on.
+    """
+    numSets, labels = scipy.sparse.csgraph.connected_components(
+        counts, directed=True, connection='strong')
+    sizes = np.bincount(labels)
+    return np.flatnonzero(labels == np.argmax(sizes))
+
+
+def slowEigenvalues(matrix, k, sigma, OPinv=None, v0=None):
+    """
+    Helper function for the k eigenvalues of a sparse matrix closest to
+    sigma (dense for small matrices), sorted by their distance to sigma.
+
+    Parameters
+    ----------
+    matrix : scipy sparse matrix (states, states)
+    k : int
+    sigma : float
+        The shift.
+    OPinv : LinearOperator, optional
+        (matrix - sigma I)^-1 from a cached factorization. The default is
+        None, ARPACK factorizes.
+    v0 : numpy array (states,), optional
+        Start vector of the Krylov search. The default is None.
+
+    Returns
+    -------
+    values : numpy array of complex (k,)
+    vectors : numpy array of complex (states, k) or None
+        Right eigenvectors, None for the dense path.
+
+    """
+    n = matrix.shape[0]
+    if n <= DENSE_EIGEN or k >= n - 1:
+        values = np.linalg.eigvals(matrix.toarray())
+        values = values[np.argsort(np.abs(values - sigma))][:k]
+        return (values, None)
+    values, vectors = scipy.sparse.linalg.eigs(matrix, k=k, sigma=sigma,
+                                               OPinv=OPinv, v0=v0)
+    order = np.argsort(np.abs(values - sigma))
+    return (values[order], vectors[:, order])
+
+
+def largestEigenvalues(matrix, k, v0=None):
+    """
+    Helper function for the k eigenvalues of largest modulus of a sparse
+    matrix (dense for small matrices), sorted by decreasing modulus.
+
+    Returns
+    -------
+    values : numpy array of complex (k,)
+    vectors : numpy array of complex (states, k) or None
+        Right eigenvectors, None for the dense path.
+
+    """
+    n = matrix.shape[0]
+    if n <= DENSE_EIGEN or k >= n - 1:
+        values = np.linalg.eigvals(matrix.toarray())
+        return (values[np.argsort(-np.abs(values), kind='stable')][:k], None)
+    values, vectors = scipy.sparse.linalg.eigs(matrix, k=k, which='LM', v0=v0)
+    order = np.argsort(-np.abs(values), kind='stable')
+    return (values[order], vectors[:, order])
+
+
+def shiftInverse(matrix, sigma):
+    """
+    Helper function for (matrix - sigma I)^-1 as a LinearOperator over one
+    sparse LU factorization.
+    """
+    n = matrix.shape[0]
+    lu = scipy.sparse.linalg.splu(
+        (matrix - sigma * scipy.sparse.identity(n)).tocsc())
+    return scipy.sparse.linalg.LinearOperator((n, n), matvec=lu.solve,
+                                              dtype=float)
+
+
+class LagAnalysis:
+    """
+    Transition matrices of trajectories over a range of lag times.
+
+    Parameters
+    ----------
+    uniqueStates : int
+        The number of states.
+    trajs : array like (steps,) or list of array like
+        Discrete-state trajectories.
+    lagtimes : list of int
+        The lag times in frames.
+    timestep : float, optional
+        Time per frame. The default is 1.
+    reversible : bool, optional
+        Estimate with symmetrized counts. The default is False.
+
+    Attributes
+    ----------
+    counts : dict
+        lag -> sparse counts over all states, i -> i included.
+    active : dict
+        lag -> the states of the largest strongly connected set.
+
+    """
+
+    def __init__(self, uniqueStates, trajs, lagtimes, timestep=1.0,
+                 reversible=False):
+        self.uniqueStates = uniqueStates
+        self.lagtimes = [int(lag) for lag in lagtimes]
+        self.timestep = timestep
+        self.reversible = reversible
+        self.trajs = trajs
+        self.counts = dict(zip(self.lagtimes, countMatrix(
+            uniqueStates, trajs, lagtime=self.lagtimes, includeSelf=True)))
+        self.active = {}
+        self._matrices = {}
+        self._vectors = {} # lag -> slowest right eigenvectors
+
+    def addLag(self, lag):
+        """
+        Helper function to count a lag time that was not in the list.
+        """
+        if lag not in self.counts:
+            self.counts[lag] = countMatrix(self.uniqueStates, self.trajs,
+                                           lagtime=lag, includeSelf=True)
+        return self.counts[lag]
+
+    def transitionMatrix(self, lag):
+        """
+        Function for the transition matrix at a lag time on its connected
+        set, see ``active``.
+
+        Returns
+        -------
+        T : scipy.sparse.csr_matrix (active, active)
+
+        """
+        if lag not in self._matrices:
+            counts = self.addLag(lag)
+            active = connectedSet(counts)
+            self.active[lag] = active
+            self._matrices[lag] = transitionMatrix(
+                counts[active][:, active], reversible=self.reversible)
+        return self._matrices[lag]
+
+    def eigenvalues(self, lag, k=5):
+        """
+        Function for the k + 1 eigenvalues of T(lag) of largest modulus,
+        the first being the stationary 1.
+
+        Returns
+        -------
+        values : numpy array of complex (k + 1,)
+
+        """
+        T = self.transitionMatrix(lag)
+        v0 = None
+        # warm start from the slowest process of the previous lag
+        previous = [l for l in self._vectors if l < lag
+                    and np.array_equal(self.active[l], self.active[lag])]
+        if previous:
+            v0 = self._vectors[max(previous)][:, min(1, k)].real.copy()
+        values, vectors = largestEigenvalues(T, k + 1, v0=v0)
+        if vectors is not None:
+            self._vectors[lag] = vectors
+        return values
+
+    def impliedTimescales(self, k=5):
+        """
+        Function for the implied timescales -tau / ln|lambda_i| of the k
+        slowest processes at every lag time.
+
+        Parameters
+        ----------
+        k : int, optional
+            The number of processes. The default is 5.
+
+        Returns
+        -------
+        lagtimes : numpy array (lags,)
+            In units of time.
+        timescales : numpy array (lags, k)
+            nan where the model has fewer processes.
+
+        """
+        timescales = np.full((len(self.lagtimes), k), np.nan)
+        for row, lag in enumerate(sorted(self.lagtimes)):
+            values = np.abs(self.eigenvalues(lag, k=k))[1:]
+            with np.errstate(divide='ignore'):
+                ts = -lag * self.timestep / np.log(np.clip(values, 0, 1))
+            timescales[row, :ts.shape[0]] = ts
+        return (np.array(sorted(self.lagtimes)) * self.timestep, timescales)
+
+    def chapmanKolmogorov(self, sets, lag, multiples=(1, 2, 3, 4, 5)):
+        """
+        Function for the Chapman-Kolmogorov test of the model at one lag
+        time: the probability to be in set A after k * lag when starting in
+        set A (stationary weights within A), predicted by T(lag)^k and
+        estimated from T(k * lag).
+
+        Parameters
+        ----------
+        sets : list of list of int
+            The state sets, e.g. metastable states.
+        lag : int
+            The model lag time in frames.
+        multiples : list of int, optional
+            The multiples k. The default is (1, 2, 3, 4, 5).
+
+        Returns
+        -------
+        times : numpy array (multiples,)
+            k * lag in units of time.
+        predicted : numpy array (multiples, sets)
+        estimated : numpy array (multiples, sets)
+        errors : numpy array (multiples, sets)
+            Binomial standard errors of the estimate, sqrt(p (1 - p) / n)
+            with n the counts out of the set.
+
+        """
+        multiples = np.asarray(multiples, dtype=np.int64)
+        T = self.transitionMatrix(lag)
+        active = self.active[lag]
+        # start weights within every set from the visits, and indicators
+        visits = np.asarray(self.counts[lag].sum(axis=1)).ravel()
+        start = np.zeros((self.uniqueStates, len(sets)))
+        indicator = np.zeros((self.uniqueStates, len(sets)))
+        for s, members in enumerate(sets):
+            members = np.intersect1d(members, active)
+            start[members, s] = visits[members]
+            indicator[members, s] = 1
+        start /= np.maximum(start.sum(axis=0), 1e-300)
+        # batched powers: every set is a column, p_k^T = p_0^T T^k
+        TT = T.T.tocsr()
+        block = start[active]
+        power = 0
+        predicted = np.empty((multiples.shape[0], len(sets)))
+        estimated = np.empty((multiples.shape[0], len(sets)))
+        errors = np.empty((multiples.shape[0], len(sets)))
+        for row, k in enumerate(multiples):
+            for step in range(k - power):
+                block = TT @ block
+            power = k
+            predicted[row] = np.sum(block * indicator[active], axis=0)
+            counts = self.addLag(int(k * lag))
+            estimate = transitionMatrix(counts)
+            estimated[row] = np.sum((estimate.T @ start) * indicator, axis=0)
+            n = np.asarray(counts.sum(axis=1)).ravel() @ indicator
+            with np.errstate(divide='ignore', invalid='ignore'):
+                errors[row] = np.sqrt(estimated[row] * (1 - estimated[row])
+                                      / n)
+        return (multiples * lag * self.timestep, predicted, estimated, errors)
+
+
+def rateTimescales(rateMatrix, k=5):
+    """
+    Function for the k slowest relaxation times -1/lambda_i of a rate
+    matrix, the lag-independent reference for implied timescales, from the
+    eigenvalues of Q closest to 0 (shift-invert, one factorization).
+
+    Parameters
+    ----------
+    rateMatrix : numpy array or scipy sparse matrix (states, states)
+    k : int, optional
+        The number of processes. The default is 5.
+
+    Returns
+    -------
+    timescales : numpy array (k,)
+
+    """
+    Q = scipy.sparse.csr_matrix(rateMatrix, dtype=float)
+    scale = np.abs(Q.diagonal()).max()
+    sigma = SHIFT * scale
+    n = Q.shape[0]
+    OPinv = shiftInverse(Q, sigma) if n > DENSE_EIGEN and k + 1 < n - 1 \
+        else None
+    values, vectors = slowEigenvalues(Q, k + 1, sigma, OPinv=OPinv)
+    with np.errstate(divide='ignore'):
+        return -1 / values[1:].real
+
+
+def impliedTimescales(uniqueStates, trajs, lagtimes, k=5, timestep=1.0,
+                      reversible=False):
+    """
+    Returns the lag times and implied timescales of
+    ``LagAnalysis.impliedTimescales``.
+    """
+    return LagAnalysis(uniqueStates, trajs, lagtimes, timestep=timestep,
+                       reversible=reversible).impliedTimescales(k=k)
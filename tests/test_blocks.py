@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from ion_kinetics.blocks import BlockNetwork
+
+
+def tiledNetwork():
+    return BlockNetwork(4, 3, intraBlock=np.eye(4, k=1),
+                        couplings={1: np.eye(4, k=-3)})
+
+
+def test_fromMatrix_needs_a_tiling():
+    blockNet = tiledNetwork()
+    tiled = BlockNetwork.fromMatrix(blockNet.adjacency(), 4)
+    assert (tiled.adjacency() != blockNet.adjacency()).nnz == 0
+    broken = blockNet.adjacency().tolil()
+    broken[0, 1] = 2.0
+    with pytest.raises(ValueError):
+        BlockNetwork.fromMatrix(broken, 4)
+
+
+def test_adjacency_of_no_blocks():
+    blockNet = tiledNetwork()
+    assert blockNet.adjacency(blocks=[]).shape == (12, 12)
+    assert blockNet.adjacency(blocks=[]).nnz == 0
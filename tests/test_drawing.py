@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+from ion_kinetics.drawing import network, useBackend
+from ion_kinetics.instrument import MemoryCollector
+from ion_kinetics.svg import SVGDocument
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the drawing path of network_v2.1.2.py in a python without scipy
+WITHOUT_SCIPY = """
+import sys
+sys.modules['scipy'] = None
+import numpy as np
+import ion_kinetics
+from ion_kinetics.drawing import useBackend
+from ion_kinetics.figures import drawCondition
+from ion_kinetics.svg import SVGDocument
+numStates = 3
+model = {'numStates': numStates, 'occuList': ['V K', 'K V', 'K K'],
+         'stationary_dist': np.array([0.2, 0.3, 0.5]),
+         'committor': np.array([0.0, 0.5, 1.0]),
+         'positions': np.arange(18.0).reshape(9, 2) * 10,
+         'major_flux': np.eye(9, k=1) * 0.1}
+doc = SVGDocument()
+useBackend(doc)
+layers, objs = drawCondition(model)
+doc.write(sys.argv[1])
+"""
+
+
+def test_drawing_without_scipy(tmp_path):
+    output = tmp_path / 'network.svg'
+    subprocess.run([sys.executable, '-c', WITHOUT_SCIPY, str(output)],
+                   cwd=ROOT, check=True)
+    assert output.stat().st_size > 0
+
+
+def test_stage_counters():
+    useBackend(SVGDocument())
+    collector = MemoryCollector()
+    network(3, np.ones(3) / 3, np.arange(6.0).reshape(3, 2) * 10,
+            np.eye(3, k=1), collector=collector)
+    records = {r['stage']: r for r in collector.records}
+    assert list(records) == ['circles', 'borders', 'connectors', 'layers']
+    assert set(records['circles']) == {'stage', 'seconds', 'nodes'}
+    assert records['connectors']['edges'] == 2
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from ion_kinetics.estimators import RateNetwork, committor, mfpt
+from ion_kinetics.lumping import lumpModel
+
+# the 3-state chain of markov_chain_stuff.ipynb
+CHAIN = np.array([[-1.0, 1.0, 0.0], [0.5, -1.0, 0.5], [0.0, 0.2, -0.2]])
+
+
+def test_stationary_distribution():
+    pi = RateNetwork(CHAIN).stationaryDistribution()
+    assert np.allclose(pi @ CHAIN, 0)
+    assert np.allclose(pi, [0.125, 0.25, 0.625])
+
+
+def test_committor_and_mfpt():
+    assert np.allclose(committor(CHAIN, 0, 2), [0, 0.5, 1])
+    # t_0 = 1 + t_1, t_1 = 1 + t_0 / 2
+    assert np.allclose(mfpt(CHAIN, 2), [4, 3, 0])
+
+
+@pytest.mark.parametrize('Q', [
+    # the last state is transient, its stationary weight is 0
+    [[-1.0, 1.0, 0.0], [0.5, -0.5, 0.0], [0.0, 0.2, -0.2]],
+    # two closed classes
+    [[-1.0, 1.0, 0.0], [0.5, -0.5, 0.0], [0.0, 0.0, 0.0]]])
+def test_reducible_chains_raise(Q):
+    with pytest.raises(ValueError, match='reducible'):
+        RateNetwork(Q).stationaryDistribution()
+    with pytest.raises(ValueError, match='reducible'):
+        lumpModel(Q, 2)
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import os
+import pickle as pkl
+
+import numpy as np
+import pytest
+import scipy.sparse
+
+from ion_kinetics.bundle import CONDITION_FILES, convertCondition
+from ion_kinetics.drawing import useBackend
+from ion_kinetics.figures import drawCondition, loadCondition, \
+    renderCondition
+from ion_kinetics.microstates import Microstates
+from ion_kinetics.pruning import pruneEdges
+from ion_kinetics.svg import SVGDocument
+
+
+def syntheticCondition(numStates=27, blocks=5, seed=1):
+    """
+    Helper function for a condition whose flux is not a tiling.
+    """
+    rng = np.random.default_rng(seed)
+    numNodes = numStates * blocks
+    flux = scipy.sparse.random(numNodes, numNodes, density=0.05, rng=rng,
+                               format='csr')
+    stationary = rng.random(numStates)
+    return {'numStates': numStates,
+            'occuList': Microstates(3).decode(np.arange(numStates)),
+            'stationary_dist': stationary / stationary.sum(),
+            'rateMatrix': rng.random((numStates, numStates)),
+            'committor': rng.random(numStates),
+            'positions': rng.random((numNodes, 2)) * 100,
+            'major_flux': flux.toarray()}
+
+
+def nonzeroPairs(matrix):
+    i, j = scipy.sparse.csr_matrix(matrix).nonzero()
+    return set(zip(i.tolist(), j.tolist()))
+
+
+@pytest.mark.parametrize('pruning', [None, {'topK': 3},
+                                     {'fluxFraction': 0.9}])
+def test_drawn_edges_are_the_pruned_flux(pruning):
+    model = syntheticCondition()
+    useBackend(SVGDocument())
+    scene = drawCondition(model, pruning=pruning)
+    flux = model['major_flux']
+    if pruning is not None:
+        flux = pruneEdges(flux, **pruning)
+    assert set(scene.edges) == nonzeroPairs(flux)
+
+
+def writePickles(directory, model, mtime):
+    """
+    Helper function to export a condition as the analysis scripts do.
+    """
+    contents = {'model': (model['numStates'], model['occuList'],
+                          model['stationary_dist'], model['rateMatrix'],
+                          model['committor']),
+                'coords': model['positions'], 'flux': model['major_flux']}
+    for key, name in CONDITION_FILES.items():
+        path = os.path.join(directory, name)
+        with open(path, 'wb') as f:
+            pkl.dump(contents[key], f)
+        os.utime(path, (mtime, mtime))
+
+
+def test_reexported_pickles_replace_the_bundle(tmp_path):
+    model = syntheticCondition()
+    writePickles(tmp_path, model, 1000)
+    convertCondition(str(tmp_path))
+    assert np.allclose(loadCondition(str(tmp_path))['stationary_dist'],
+                       model['stationary_dist'])
+    output = str(tmp_path / 'figure.svg')
+    assert renderCondition(str(tmp_path), output)['status'] == 'rendered'
+    assert renderCondition(str(tmp_path), output)['status'] == 'skipped'
+    # re-exported after the figure and the bundle were written
+    model['stationary_dist'] = model['stationary_dist'][::-1]
+    writePickles(tmp_path, model, os.path.getmtime(output) + 10)
+    assert np.allclose(loadCondition(str(tmp_path))['stationary_dist'],
+                       model['stationary_dist'])
+    assert renderCondition(str(tmp_path), output)['status'] == 'rendered'
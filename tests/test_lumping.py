@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from ion_kinetics.estimators import RateNetwork
+from ion_kinetics.lumping import lumpModel
+
+
+@pytest.fixture(scope='module')
+def metastable():
+    # two fully connected blocks of three states joined by slow rates
+    rng = np.random.default_rng(4)
+    Q = np.zeros((6, 6))
+    Q[:3, :3] = rng.uniform(1, 2, (3, 3))
+    Q[3:, 3:] = rng.uniform(1, 2, (3, 3))
+    Q[2, 3], Q[4, 1] = 0.01, 0.03
+    np.fill_diagonal(Q, 0)
+    np.fill_diagonal(Q, -Q.sum(axis=1))
+    return Q
+
+
+@pytest.mark.parametrize('method', ['pcca', 'committor'])
+def test_lumped_rows_and_populations(metastable, method):
+    model = lumpModel(metastable, 2, method=method, source=0, sink=5)
+    pi = RateNetwork(metastable).stationaryDistribution()
+    assert np.allclose(model.memberships.sum(axis=1), 1)
+    assert np.allclose(model.rateMatrix.sum(axis=1), 0)
+    assert (model.rateMatrix - model.rateMatrix.multiply(np.eye(2))).min() \
+        >= 0
+    assert model.populations.sum() == pytest.approx(1)
+    assert np.allclose(model.populations, model.project(pi))
+    # the lumped rates keep the macrostate populations stationary
+    assert np.allclose(model.populations @ model.rateMatrix.toarray(), 0)
+
+
+def test_pcca_finds_the_blocks(metastable):
+    model = lumpModel(metastable, 2)
+    pi = RateNetwork(metastable).stationaryDistribution()
+    assert model.emptyMacrostates == 0
+    assert len(set(model.assignments[:3])) == 1
+    assert len(set(model.assignments[3:])) == 1
+    first = model.assignments[0]
+    assert model.populations[first] == pytest.approx(pi[:3].sum())
+    assert np.allclose(model.projectedRates().sum(axis=1), 0)
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import scipy.sparse
+
+from ion_kinetics.montecarlo import KineticMonteCarlo, monteCarloSim
+
+CHAIN = np.array([[-1.0, 1.0, 0.0], [0.5, -1.0, 0.5], [0.0, 0.2, -0.2]])
+
+
+def test_rare_jump_in_last_row():
+    numStates = 2 ** 20
+    rare = 1e-10
+    rows = np.arange(numStates)
+    Q = scipy.sparse.csr_matrix((np.ones(numStates),
+                                 (rows, (rows + 1) % numStates)),
+                                shape=(numStates, numStates))
+    Q = Q + scipy.sparse.csr_matrix(([rare], ([numStates - 1],
+                                              [numStates - 2])),
+                                    shape=(numStates, numStates))
+    engine = KineticMonteCarlo(Q)
+    last = engine.cumulative[engine.indptr[-2]:]
+    np.testing.assert_allclose(last, [1 / (1 + rare), 1.0], rtol=1e-15)
+    u = np.array([0.5, 1 - 0.5 * rare, 1 - 1.5 * rare])
+    states = np.full(3, numStates - 1)
+    np.testing.assert_array_equal(engine.nextStates(states, u),
+                                  [0, numStates - 2, 0])
+
+
+def test_simulate_matches_batch():
+    engine = KineticMonteCarlo(CHAIN)
+    traj = engine.simulate(500, start=2, seed=3)
+    u = np.random.default_rng(3).random(500)
+    states = [2]
+    for r in u[:-1]:
+        states.append(int(engine.nextStates(np.array([states[-1]]), [r])[0]))
+    np.testing.assert_array_equal(traj[:, 1], states)
+
+
+def test_occupancy_matches_stationary_distribution():
+    traj = monteCarloSim(3, CHAIN, 40000, start=0, seed=1)
+    occupancy = np.bincount(traj[:, 1].astype(int), weights=traj[:, 0])
+    np.testing.assert_allclose(occupancy / occupancy.sum(),
+                               [0.125, 0.25, 0.625], atol=0.02)
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+import scipy.linalg
+import scipy.sparse
+
+from ion_kinetics.propagator import Propagator, propagate
+
+# a driven 4-state cycle, its eigenvalues come in complex conjugate pairs
+CYCLE = np.array([[-3.0, 2.5, 0.0, 0.5], [0.1, -2.6, 2.5, 0.0],
+                  [0.0, 0.1, -2.6, 2.5], [2.5, 0.0, 0.1, -2.6]])
+TIMES = [np.linspace(0, 2, 9), np.array([0.0, 0.05, 0.3, 1.7, 4.0])]
+
+
+@pytest.mark.parametrize('times', TIMES)
+@pytest.mark.parametrize('method', ['eig', 'expm', 'krylov'])
+def test_matrix_matches_expm(method, times):
+    engine = Propagator(scipy.sparse.csr_matrix(CYCLE), method=method)
+    assert engine.method == method
+    P = engine.matrix(times)
+    expected = np.stack([scipy.linalg.expm(CYCLE * t) for t in times])
+    assert np.allclose(P, expected, atol=1e-10)
+    assert np.allclose(engine.diagonal(times),
+                       np.diagonal(expected, axis1=1, axis2=2), atol=1e-10)
+    p0 = np.array([[1.0, 0.0, 0.0, 0.0], [0.25, 0.25, 0.25, 0.25]])
+    assert np.allclose(engine.evolve(p0, times), p0 @ expected, atol=1e-10)
+
+
+def test_complex_pairs_are_used():
+    engine = Propagator(CYCLE)
+    assert engine.method == 'eig'
+    assert engine.pairRates.shape[0] == 1
+
+
+def test_defective_matrix_falls_back_to_expm():
+    # a chain of equal rates, Q is a single Jordan block
+    Q = np.array([[-1.0, 1.0, 0.0], [0.0, -1.0, 1.0], [0.0, 0.0, 0.0]])
+    engine = Propagator(Q)
+    assert engine.method == 'expm' and engine.reason
+    assert np.allclose(propagate(Q, [1.5])[0], scipy.linalg.expm(1.5 * Q))
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from ion_kinetics.counting import countMatrix, stateDurations
+from ion_kinetics.estimators import mfpt
+from ion_kinetics.montecarlo import monteCarloSim
+from ion_kinetics.streaming import StreamingAnalysis
+
+# the 3-state chain of markov_chain_stuff.ipynb
+CHAIN = np.array([[-1.0, 1.0, 0.0], [0.5, -1.0, 0.5], [0.0, 0.2, -0.2]])
+
+
+@pytest.fixture(scope='module')
+def traj():
+    # a discrete-time trajectory of a 3-state transition matrix
+    rng = np.random.default_rng(0)
+    cumulative = np.cumsum([[0.9, 0.1, 0.0], [0.05, 0.9, 0.05],
+                            [0.0, 0.02, 0.98]], axis=1)
+    traj = np.zeros(20000, dtype=np.int64)
+    for k, u in enumerate(rng.random(traj.shape[0] - 1)):
+        traj[k + 1] = np.searchsorted(cumulative[traj[k]], u, side='right')
+    return traj
+
+
+@pytest.mark.parametrize('chunkSize', [7, 1000, 10**6])
+def test_chunks_match_batch_counts(traj, chunkSize):
+    stream = StreamingAnalysis(3).run(traj, chunkSize=chunkSize)
+    assert (stream.counts != countMatrix(3, traj)).nnz == 0
+    assert np.allclose(stream.stateTime, np.bincount(traj, minlength=3))
+    durations, offsets = stateDurations(3, traj)
+    mean, std = stream.dwellTimes()
+    for state in range(3):
+        runs = durations[offsets[state]:offsets[state + 1]]
+        assert mean[state] == pytest.approx(runs.mean())
+        assert std[state] == pytest.approx(runs.std())
+
+
+def test_continuous_time_chunks():
+    traj = monteCarloSim(3, CHAIN, 50000, start=0, seed=1)
+    whole = StreamingAnalysis(3).update(traj)
+    chunked = StreamingAnalysis(3).run(traj, chunkSize=333)
+    assert (whole.counts != chunked.counts).nnz == 0
+    assert np.allclose(whole.stateTime, chunked.stateTime)
+    assert np.allclose(chunked.populations(), [0.125, 0.25, 0.625],
+                       atol=0.02)
+    assert np.allclose(chunked.jumpProbabilities().sum(axis=1), 1)
+    assert np.allclose(chunked.mfpt(2), mfpt(CHAIN, 2), rtol=0.1)
+
+
+def test_mfpt_skips_unvisited_states(traj):
+    # states 3 and 4 were never visited, 5 is only entered at the end
+    stream = StreamingAnalysis(6).run(np.append(traj, 5))
+    tau = stream.mfpt(2)
+    assert np.all(np.isnan(tau[3:]))
+    assert np.all(np.isfinite(tau[:3])) and tau[2] == 0
+    with pytest.raises(ValueError):
+        stream.mfpt(4)
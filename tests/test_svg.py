@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+import io
+
+import numpy as np
+
+from ion_kinetics.svg import SVGDocument
+
+
+def written(doc):
+    stream = io.StringIO()
+    doc.write(stream)
+    return stream.getvalue()
+
+
+def test_viewBox_skips_hidden_elements():
+    doc = SVGDocument(margin=0)
+    g = doc.group([doc.circle((10, 10), 5)])
+    g.append(doc.circle((10, 10), 500, display='none'))
+    assert np.allclose(doc.viewBox(), [5, 5, 10, 10])
+
+
+def test_connectors_follow_moves_after_write():
+    doc = SVGDocument()
+    a = doc.circle((0, 0), 1)
+    b = doc.circle((10, 0), 1)
+    doc.connector(a, b)
+    first = written(doc)
+    assert 'M 1,0 L 9,0' in first
+    assert written(doc) == first
+    b.translate((10, 0))
+    assert 'M 1,0 L 19,0' in written(doc)
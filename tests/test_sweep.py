@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from ion_kinetics.ratematrix import filterRateMatrix
+from ion_kinetics.sweep import SteadyStateSolver, voltageRates, voltageSweep
+
+K_RATES = {'forward': 2.0, 'backward': 1.0, 'enterLeft': 1.5,
+           'exitRight': 1.0, 'exitLeft': 0.2, 'enterRight': 0.1}
+RATES = {'K': K_RATES,
+         'W': {'forward': 1.0, 'backward': 1.0, 'enterLeft': 1.0,
+               'exitRight': 1.0, 'exitLeft': 1.0, 'enterRight': 1.0}}
+
+
+def denseStationary(Q):
+    """
+    Helper function for pi from the dense eigenvector of Q^T at 0.
+    """
+    values, vectors = np.linalg.eig(np.asarray(Q).T)
+    pi = np.real(vectors[:, np.argmin(np.abs(values))])
+    return pi / pi.sum()
+
+
+def exactCurrent(pi, Q, cond):
+    """
+    Helper function for J = sum_ij pi_i Q_ij c_ij.
+    """
+    rows = np.repeat(np.arange(Q.shape[0]), np.diff(Q.indptr))
+    return np.sum(pi[rows] * Q.data * cond)
+
+
+def solver(numSites, rates, **kwargs):
+    return SteadyStateSolver(numSites, {token: list(moves) for token, moves
+                                        in rates.items()}, **kwargs)
+
+
+@pytest.mark.parametrize('voltage', [-4.0, 0.0, 2.5])
+def test_solve_matches_dense(voltage):
+    rates = voltageRates(RATES, voltage, 4)
+    pi, current = solver(4, RATES).solve(rates)
+    Q, cond = filterRateMatrix(4, rates)
+    assert np.allclose(pi, denseStationary(Q.toarray()), atol=1e-12)
+    assert np.isclose(current, exactCurrent(pi, Q, cond), atol=1e-12)
+
+
+def test_unreachable_states_get_no_probability():
+    # W never moves, the states holding W are unreachable
+    model = solver(3, {'K': K_RATES})
+    pi, current = model.solve({'K': K_RATES})
+    Q = filterRateMatrix(3, {'K': K_RATES})[0].toarray()
+    r = model.recurrent
+    assert r.shape[0] == 2**3
+    assert pi.sum() == pytest.approx(1)
+    assert np.all(pi[np.setdiff1d(np.arange(27), r)] == 0)
+    assert np.allclose(pi[r], denseStationary(Q[np.ix_(r, r)]), atol=1e-12)
+    # the same filter without the W token
+    currents, pis = voltageSweep(3, {'K': K_RATES}, [0.0, 1.0])
+    vk = voltageSweep(3, {'K': K_RATES}, [0.0, 1.0], tokens=('V', 'K'))
+    assert np.allclose(currents, vk[0], atol=1e-12)
+    assert np.allclose(pis[:, r], vk[1], atol=1e-12)
+
+
+def test_unclear_steady_states_raise():
+    # an ion that enters first blocks the filter for good
+    with pytest.raises(ValueError):
+        SteadyStateSolver(1, {'K': ['enterLeft'], 'W': ['enterLeft']})
+    model = solver(3, {'K': K_RATES})
+    with pytest.raises(ValueError):
+        model.solve({'K': dict(K_RATES, enterLeft=0.0, enterRight=0.0)})
+
+
+def test_sweep_returns_currents_first():
+    model = solver(3, RATES)
+    rateSets = [voltageRates(RATES, v, 3) for v in (-1.0, 1.0)]
+    currents, pis = model.sweep(rateSets)
+    assert currents.shape == (2,) and pis.shape == (2, 27)
+    for rates, current, pi in zip(rateSets, currents, pis):
+        assert np.allclose(model.solve(rates)[0], pi)
+        assert model.solve(rates)[1] == pytest.approx(current)
+    currents, pis = model.sweep([])
+    assert currents.shape == (0,) and pis.shape == (0, 27)
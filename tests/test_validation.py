@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from ion_kinetics.validation import LagAnalysis, rateTimescales
+
+# a metastable transition matrix, {0, 1} and {2, 3} exchange slowly
+T = np.array([[0.90, 0.09, 0.01, 0.00], [0.10, 0.89, 0.00, 0.01],
+              [0.00, 0.01, 0.90, 0.09], [0.01, 0.00, 0.10, 0.89]])
+
+
+@pytest.fixture(scope='module')
+def analysis():
+    rng = np.random.default_rng(2)
+    cumulative = np.cumsum(T, axis=1)
+    traj = np.zeros(100000, dtype=np.int64)
+    for k, u in enumerate(rng.random(traj.shape[0] - 1)):
+        traj[k + 1] = np.searchsorted(cumulative[traj[k]], u, side='right')
+    return LagAnalysis(4, traj, [1, 2, 4])
+
+
+def test_implied_timescales(analysis):
+    lagtimes, timescales = analysis.impliedTimescales(k=3)
+    values = np.sort(np.abs(np.linalg.eigvals(T)))[::-1][1:]
+    exact = -1 / np.log(values)
+    assert np.allclose(lagtimes, [1, 2, 4])
+    # a Markov chain has the same implied timescales at every lag
+    assert np.allclose(timescales[:, 0], exact[0], rtol=0.1)
+
+
+def test_chapman_kolmogorov_agrees_for_a_markov_chain(analysis):
+    times, predicted, estimated, errors = analysis.chapmanKolmogorov(
+        [[0, 1], [2, 3]], 1, multiples=(1, 3, 10))
+    assert np.allclose(times, [1, 3, 10])
+    # the probability to stay in the set decays from about 0.99
+    assert (np.diff(predicted, axis=0) < 0).all()
+    assert np.allclose(predicted[0], estimated[0])
+    assert (np.abs(predicted - estimated) < 4 * errors + 1e-3).all()
+    # the exact return probabilities, from the powers of T
+    start = np.array([[0.5, 0.5, 0, 0], [0, 0, 0.5, 0.5]])
+    indicator = np.array([[1, 0], [1, 0], [0, 1], [0, 1]])
+    exact = [np.diag(start @ np.linalg.matrix_power(T, k) @ indicator)
+             for k in (1, 3, 10)]
+    assert np.allclose(predicted, exact, atol=0.01)
+
+
+def test_rate_timescales():
+    Q = np.array([[-1.0, 1.0, 0.0], [0.5, -1.0, 0.5], [0.0, 0.2, -0.2]])
+    exact = np.sort(-1 / np.linalg.eigvals(Q)[np.abs(np.linalg.eigvals(Q))
+                                              > 1e-12].real)[::-1]
+    assert np.allclose(rateTimescales(Q, k=2), exact)